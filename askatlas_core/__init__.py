@@ -0,0 +1,25 @@
+"""
+Shared core for the AskAtlas Gemini apps.
+
+The Streamlit apps (chatbot.py, intellichat/, intellichat1/) and the Taipy
+demo (demo-chatbot/) are thin front-ends over these modules:
+
+- config: environment, data directory and API key lookup
+- llm: one configured Gemini client per process (or a fake backend)
+- storage: users / chats / messages in the backend named by STORAGE_BACKEND
+- repository, sqlite_repository, postgres_repository: the storage interface and its backends
+- storage_conformance: checks every storage backend must pass
+- embeddings, vector_store, context_builder, retrieval_gate: retrieval
+- text, vectors: stop words, search terms and float32 vector packing, free of side effects
+- memory: per-user facts and preferences extracted from messages, ranked into prompts
+- personas, answer_cache: shared system instructions and pre-generated answers to popular questions
+- passwords, login_throttle, sessions, streamlit_auth: authentication
+- chat_handler, titler: chat turn processing and auto-titling
+- tracing: sampled per-stage spans exported to JSONL or an OTLP collector
+- metrics: in-process counters and histograms with a Prometheus scrape endpoint
+- profiling: stack sampler, slow-turn cProfile and tracemalloc diffs as collapsed stacks
+- archive: streaming per-user export and import as compressed line-delimited JSON
+- retention: archiving of inactive chats to a cold database, online backups and vacuum
+"""
+
+__version__ = "0.1.0"
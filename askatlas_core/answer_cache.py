@@ -0,0 +1,329 @@
+"""
+Pre-generated answers to the questions a persona is asked most often.
+
+AskAtlas traffic clusters around the same cities and sights, so most
+peak-hour questions have been asked before. Each ask is counted in the
+answer_cache table (in the background, off the request path). An offline
+job answers the most frequent ones, or a supplied list, in rate-limited
+batches. The app then serves those answers from memory instead of calling
+the model.
+
+Answers are keyed by a namespace derived from the model and system
+instruction, so changing either starts a fresh cache. Matching is exact on
+the normalised question, ignoring case, punctuation and spacing. With
+ANSWER_CACHE_MATCH=semantic, a question whose embedding is within
+ANSWER_CACHE_SIMILARITY of a cached one also matches. Answers older than
+ANSWER_CACHE_TTL are not served; the job regenerates them once they are
+ANSWER_CACHE_REFRESH old, so running it daily keeps popular answers fresh.
+
+    python -m askatlas_core.answer_cache prewarm --persona tour-guide              # most asked queries
+    python -m askatlas_core.answer_cache prewarm --persona tour-guide --queries top.txt
+    python -m askatlas_core.answer_cache stats --persona tour-guide
+    python -m askatlas_core.answer_cache prune
+"""
+import os
+import re
+import time
+import hashlib
+import logging
+import argparse
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+from .vectors import pack_vectors, unpack_vectors
+from .llm import get_backend, MODEL_NAME
+from .personas import PERSONAS
+from .storage import (
+    record_cache_queries, get_frequent_queries, get_cached_answers, save_cached_answers, prune_answer_cache
+)
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Serve and record cached answers at all
+ANSWER_CACHE = os.getenv("ANSWER_CACHE", "1") == "1"
+
+# "exact" (normalised text) or "semantic" (exact, then nearest cached question by embedding)
+ANSWER_CACHE_MATCH = os.getenv("ANSWER_CACHE_MATCH", "exact")
+MATCHES = ("exact", "semantic")
+
+# Cosine similarity a question needs to a cached one to share its answer; high, as
+# "museums in Rome" and "museums in Milan" are already close
+ANSWER_CACHE_SIMILARITY = float(os.getenv("ANSWER_CACHE_SIMILARITY", "0.92"))
+
+# Age in seconds after which an answer is no longer served, and after which the job regenerates it
+ANSWER_CACHE_TTL = int(os.getenv("ANSWER_CACHE_TTL", str(7 * 86400)))
+ANSWER_CACHE_REFRESH = int(os.getenv("ANSWER_CACHE_REFRESH", str(5 * 86400)))
+
+# How often a process reloads cached answers from the database, in seconds
+ANSWER_CACHE_RELOAD = int(os.getenv("ANSWER_CACHE_RELOAD", "300"))
+
+# Longer questions are neither counted nor looked up, as they rarely repeat
+ANSWER_CACHE_MAX_QUERY_CHARS = int(os.getenv("ANSWER_CACHE_MAX_QUERY_CHARS", "300"))
+
+# Queries not asked for this many days are dropped by prune
+ANSWER_CACHE_PRUNE_DAYS = int(os.getenv("ANSWER_CACHE_PRUNE_DAYS", "30"))
+
+# Pre-warm job: how many of the most asked queries, and how often each must have been asked
+PREWARM_TOP = int(os.getenv("PREWARM_TOP", "200"))
+PREWARM_MIN_HITS = int(os.getenv("PREWARM_MIN_HITS", "3"))
+
+# Pre-warm job pacing: model calls per minute, calls in flight, answers saved per batch, retries per query
+PREWARM_RPM = float(os.getenv("PREWARM_RPM", "15"))
+PREWARM_CONCURRENCY = int(os.getenv("PREWARM_CONCURRENCY", "2"))
+PREWARM_BATCH_SIZE = int(os.getenv("PREWARM_BATCH_SIZE", "10"))
+PREWARM_RETRIES = int(os.getenv("PREWARM_RETRIES", "3"))
+
+ANSWER_CACHE_LOOKUPS = metrics.counter(
+    "askatlas_answer_cache_lookups_total", "Answer cache lookups by result", ["result"])
+PREWARM_ANSWERS = metrics.counter(
+    "askatlas_prewarm_answers_total", "Answers the pre-warm job generated or failed to", ["result"])
+
+# A single worker keeps ask counting off the Streamlit script thread
+_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="answer-cache")
+_lock = threading.Lock()
+_indexes = {}
+_embedder = None
+
+
+def namespace(system_instruction):
+    """Cache namespace for a persona; answers from another model or instruction never match."""
+    return hashlib.sha256(f"{MODEL_NAME}\0{system_instruction or ''}".encode()).hexdigest()[:16]
+
+
+def query_key(text):
+    """A question reduced to lower-cased words, so "Best food in Rome?" matches "best food in rome"."""
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+def _age(timestamp):
+    """Seconds since a "YYYY-MM-DD HH:MM:SS" UTC timestamp."""
+    then = datetime.fromisoformat(str(timestamp)).replace(tzinfo=timezone.utc)
+    return (datetime.now(timezone.utc) - then).total_seconds()
+
+
+def _embed(texts):
+    """Embed with the shared MiniLM model, loaded on first use and without Chroma."""
+    global _embedder
+    with _lock:
+        if _embedder is None:
+            from .embeddings import load_embedder
+            _embedder = load_embedder()
+    return _embedder.encode(texts).tolist()
+
+
+class _Index:
+    """One namespace's servable answers, by key and, for semantic matching, as a matrix."""
+
+    def __init__(self, entries, semantic):
+        self.expires = time.monotonic() + ANSWER_CACHE_RELOAD
+        self.answers = {entry["query_key"]: (entry["answer"], entry["refreshed_at"]) for entry in entries}
+        self.keys, self.matrix = [], None
+        embedded = [entry for entry in entries if entry["embedding"]] if semantic else []
+        if embedded:
+            import numpy as np
+            self.keys = [entry["query_key"] for entry in embedded]
+            self.matrix = np.array(
+                [unpack_vectors(bytes(entry["embedding"]), len(entry["embedding"]) // 4)[0] for entry in embedded],
+                dtype=np.float32)
+
+    def nearest(self, text):
+        """The key of the most similar cached question, if similar enough."""
+        if self.matrix is None:
+            return None
+        import numpy as np
+        # MiniLM vectors are normalised, so the dot product is the cosine similarity
+        scores = self.matrix @ np.asarray(_embed([text])[0], dtype=np.float32)
+        best = int(scores.argmax())
+        return self.keys[best] if scores[best] >= ANSWER_CACHE_SIMILARITY else None
+
+
+def _index(ns, match):
+    with _lock:
+        index = _indexes.get((ns, match))
+    if index is None or index.expires <= time.monotonic():
+        index = _Index(get_cached_answers(ns), match == "semantic")
+        with _lock:
+            _indexes[(ns, match)] = index
+    return index
+
+
+def invalidate(ns=None):
+    """Drop loaded answers so the next lookup reads the database again."""
+    with _lock:
+        for key in [key for key in _indexes if ns is None or key[0] == ns]:
+            del _indexes[key]
+
+
+def lookup(system_instruction, text, match=ANSWER_CACHE_MATCH):
+    """
+    The cached answer to a question, if there is a fresh one.
+
+    Args:
+        system_instruction: The persona the question is asked of
+        text: The user's question
+        match: "exact" or "semantic"
+
+    Returns:
+        The answer text, or None on a miss
+    """
+    if match not in MATCHES:
+        raise ValueError(f"Unknown answer cache match: {match}")
+    if not ANSWER_CACHE or len(text) > ANSWER_CACHE_MAX_QUERY_CHARS:
+        return None
+
+    with span("answer_cache.lookup", match=match):
+        index = _index(namespace(system_instruction), match)
+        key = query_key(text)
+        result = "exact"
+        if key not in index.answers:
+            key = index.nearest(text)
+            result = "semantic"
+        if key is None:
+            ANSWER_CACHE_LOOKUPS.labels("miss").inc()
+            return None
+
+        answer, refreshed_at = index.answers[key]
+        if _age(refreshed_at) > ANSWER_CACHE_TTL:
+            ANSWER_CACHE_LOOKUPS.labels("expired").inc()
+            return None
+    ANSWER_CACHE_LOOKUPS.labels(result).inc()
+    return answer
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.error("answer cache job failed", exc_info=future.exception())
+
+
+def _submit(fn, *args):
+    _worker.submit(fn, *args).add_done_callback(_log_failure)
+
+
+def record_query(system_instruction, text):
+    """Count an ask of a question in the background, so the pre-warm job knows what is popular."""
+    key = query_key(text)
+    if not ANSWER_CACHE or not key or len(text) > ANSWER_CACHE_MAX_QUERY_CHARS:
+        return
+    _submit(record_cache_queries, namespace(system_instruction), [(key, text.strip())])
+
+
+class RateLimiter:
+    """Spaces calls out to at most `per_minute` a minute, across threads."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute
+        self.next_slot = 0.0
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        time.sleep(slot - now)
+
+
+def _generate(backend, limiter, query):
+    """Answer one query, retrying with backoff; None if every attempt failed."""
+    for attempt in range(PREWARM_RETRIES + 1):
+        limiter.wait()
+        try:
+            return backend.send([], query)
+        except Exception:
+            logger.warning("pre-warm attempt %d failed for %r", attempt + 1, query, exc_info=True)
+            if attempt < PREWARM_RETRIES:
+                time.sleep(min(60, 2 ** attempt))
+    return None
+
+
+def prewarm(system_instruction, queries=None, top=PREWARM_TOP, min_hits=PREWARM_MIN_HITS, force=False,
+            rpm=PREWARM_RPM, concurrency=PREWARM_CONCURRENCY, batch_size=PREWARM_BATCH_SIZE):
+    """
+    Generate and store answers for a persona's frequent queries.
+
+    Queries with an answer younger than ANSWER_CACHE_REFRESH are skipped
+    unless `force`. Each batch is saved as soon as it is answered, so an
+    interrupted run keeps its progress.
+
+    Args:
+        system_instruction: The persona to answer as
+        queries: Questions to answer; the `top` most asked with at least `min_hits` asks if None
+        top: How many of the most asked queries to consider
+        min_hits: Asks a query needs to be considered
+        force: Regenerate answers that are still fresh
+        rpm: Model calls per minute
+        concurrency: Model calls in flight
+        batch_size: Answers generated and saved together
+
+    Returns:
+        Dict with counts of generated, failed and fresh (skipped) queries
+    """
+    ns = namespace(system_instruction)
+    if queries is None:
+        queries = [row["query"] for row in get_frequent_queries(ns, top, min_hits)]
+    queries = list({query_key(query): query.strip() for query in queries if query_key(query)}.items())
+
+    refreshed = {entry["query_key"]: entry["refreshed_at"] for entry in get_cached_answers(ns)}
+    due = [(key, query) for key, query in queries
+           if force or key not in refreshed or _age(refreshed[key]) > ANSWER_CACHE_REFRESH]
+    stats = {"generated": 0, "failed": 0, "fresh": len(queries) - len(due)}
+
+    backend = get_backend(system_instruction)
+    limiter = RateLimiter(rpm)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="prewarm") as pool:
+        for start in range(0, len(due), batch_size):
+            batch = due[start:start + batch_size]
+            with span("answer_cache.prewarm_batch", size=len(batch)):
+                answers = list(pool.map(lambda item: _generate(backend, limiter, item[1]), batch))
+                answered = [(key, query, answer) for (key, query), answer in zip(batch, answers) if answer]
+                if answered:
+                    vectors = _embed([query for _, query, _ in answered])
+                    save_cached_answers(ns, [
+                        {"query_key": key, "query": query, "answer": answer, "embedding": pack_vectors([vector])}
+                        for (key, query, answer), vector in zip(answered, vectors)
+                    ])
+            stats["generated"] += len(answered)
+            stats["failed"] += len(batch) - len(answered)
+            PREWARM_ANSWERS.labels("generated").inc(len(answered))
+            PREWARM_ANSWERS.labels("failed").inc(len(batch) - len(answered))
+            logger.info("pre-warmed %d/%d queries", start + len(batch), len(due))
+
+    invalidate(ns)
+    return stats
+
+
+def read_queries(path):
+    """Questions from a file, one per line; blank lines and # comments are skipped."""
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    parser = argparse.ArgumentParser(description="Pre-generated answers to frequent questions")
+    parser.add_argument("command", choices=["prewarm", "stats", "prune"])
+    parser.add_argument("--persona", choices=sorted(PERSONAS), default="tour-guide")
+    parser.add_argument("--queries", help="file of questions, one per line, instead of the most asked")
+    parser.add_argument("--top", type=int, default=PREWARM_TOP)
+    parser.add_argument("--min-hits", type=int, default=PREWARM_MIN_HITS)
+    parser.add_argument("--rpm", type=float, default=PREWARM_RPM)
+    parser.add_argument("--force", action="store_true", help="regenerate answers that are still fresh")
+    parser.add_argument("--days", type=int, default=ANSWER_CACHE_PRUNE_DAYS)
+    args = parser.parse_args()
+
+    instruction = PERSONAS[args.persona]
+    if args.command == "prewarm":
+        queries = read_queries(args.queries) if args.queries else None
+        print(prewarm(instruction, queries, top=args.top, min_hits=args.min_hits, force=args.force, rpm=args.rpm))
+    elif args.command == "stats":
+        ns = namespace(instruction)
+        answered = get_cached_answers(ns)
+        fresh = sum(_age(entry["refreshed_at"]) <= ANSWER_CACHE_TTL for entry in answered)
+        print(f"namespace {ns}: {len(answered)} answers, {fresh} servable")
+        for row in get_frequent_queries(ns, args.top, args.min_hits):
+            print(f"{row['hits']:>8}  {row['refreshed_at'] or 'unanswered':<19}  {row['query']}")
+    else:
+        print(f"{prune_answer_cache(args.days)} queries pruned")
@@ -0,0 +1,321 @@
+"""
+Streaming per-user export and import of chat history.
+
+An archive is line-delimited JSON, compressed with zstd (".zst", needs the
+optional zstandard package) or gzip (".gz") by file extension:
+
+    {"type": "header", "format": "askatlas-archive", "version": 1, "user": {...}, ...}
+    {"type": "chat", "id": 12, "title": "...", "created_at": "..."}
+    {"type": "message", "id": 340, "chat_id": 12, "is_user": true, "content": "...", "timestamp": "..."}
+    {"type": "embeddings", "dim": 384, "message_ids": [340, ...], "data": "<base64>"}
+    {"type": "end", "chats": 3, "messages": 120, "embeddings": 60}
+
+All chats come first, then messages in id order (those of archived chats
+last, from the archive database). When embeddings are
+included, each page of messages is followed by one block holding their
+vectors as little-endian float32, base64-encoded, so an import does not
+have to recompute them.
+
+Both directions run against a live database. The export reads in keyset
+pages, each on its own short read transaction (WAL lets writers carry on),
+up to the highest ids present when it started. The import writes one
+short transaction per page.
+
+    python -m askatlas_core.archive export alice alice.jsonl.zst --embeddings
+    python -m askatlas_core.archive import alice.jsonl.zst --username alice2
+"""
+import io
+import os
+import json
+import gzip
+import time
+import base64
+import argparse
+
+from . import storage
+from .text import tokenize
+from .vectors import pack_vectors, unpack_vectors
+
+FORMAT = "askatlas-archive"
+VERSION = 1
+
+# Rows read per keyset page and written per import transaction
+PAGE_SIZE = int(os.getenv("ARCHIVE_PAGE_SIZE", "500"))
+
+ZSTD_LEVEL = int(os.getenv("ARCHIVE_ZSTD_LEVEL", "10"))
+
+
+def open_archive(path, mode="r"):
+    """Open an archive as text, compressed according to its extension."""
+    if path.endswith(".zst"):
+        try:
+            import zstandard
+        except ImportError:
+            raise RuntimeError("zstd archives need the zstandard package; use a .gz path instead")
+        raw = open(path, mode + "b")
+        if mode == "w":
+            stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw)
+        return io.TextIOWrapper(stream, encoding="utf-8")
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def encode_vectors(vectors):
+    return base64.b64encode(pack_vectors(vectors)).decode("ascii")
+
+
+def decode_vectors(data, dim):
+    return unpack_vectors(base64.b64decode(data), dim)
+
+
+def _write(f, record):
+    f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+
+def export_user(username, path, include_embeddings=False, page_size=PAGE_SIZE):
+    """
+    Write one user's account, chats and messages to an archive.
+
+    Args:
+        username: The user to export
+        path: Archive path; ".zst" or ".gz" selects the compression
+        include_embeddings: Also write each message's stored vector
+        page_size: Rows read per keyset page
+
+    Returns:
+        Dict with the number of chats, messages and embeddings written,
+        the archive size and the time taken
+    """
+    user = storage.get_user_for_export(username)
+    if user is None:
+        raise ValueError(f"Unknown user: {username}")
+    if include_embeddings:
+        # Loads the embedding model and Chroma, so only when vectors are wanted
+        from .vector_store import get_embeddings
+
+    started = time.perf_counter()
+    user_id = user.pop("id")
+    # Rows added after this point belong to the next export
+    max_chat_id, max_message_id = storage.get_user_max_ids(user_id)
+    counts = {"chats": 0, "messages": 0, "embeddings": 0}
+
+    with open_archive(path, "w") as f:
+        _write(f, {"type": "header", "format": FORMAT, "version": VERSION,
+                   "exported_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                   "user": user, "embeddings": include_embeddings})
+
+        def write_page(messages, vectors):
+            for msg in messages:
+                _write(f, {"type": "message", "id": msg["id"], "chat_id": msg["chat_id"],
+                           "is_user": bool(msg["is_user"]), "content": msg["content"],
+                           "timestamp": msg["timestamp"]})
+            counts["messages"] += len(messages)
+            if include_embeddings:
+                found = [(msg["id"], vectors[msg["id"]]) for msg in messages if msg["id"] in vectors]
+                # Written even when empty, as the import commits a page when its block arrives
+                _write(f, {"type": "embeddings", "dim": len(found[0][1]) if found else 0,
+                           "message_ids": [message_id for message_id, _ in found],
+                           "data": encode_vectors(vector for _, vector in found)})
+                counts["embeddings"] += len(found)
+
+        archived_chats = set()
+        last_id = 0
+        while True:
+            chats = storage.get_user_chats_page(user_id, last_id, max_chat_id, page_size)
+            if not chats:
+                break
+            for chat in chats:
+                if chat.pop("archived_at"):
+                    archived_chats.add(chat["id"])
+                _write(f, {"type": "chat", **chat})
+            counts["chats"] += len(chats)
+            last_id = chats[-1]["id"]
+
+        last_id = 0
+        while True:
+            messages = storage.get_user_messages_page(user_id, last_id, max_message_id, page_size)
+            if not messages:
+                break
+            vectors = {}
+            if include_embeddings:
+                stored = get_embeddings(msg["vector_id"] for msg in messages if msg["vector_id"])
+                vectors = {msg["id"]: stored[msg["vector_id"]] for msg in messages if msg["vector_id"] in stored}
+            write_page(messages, vectors)
+            last_id = messages[-1]["id"]
+
+        # Messages the retention job moved to the archive database, with their saved vectors
+        last_id = 0
+        while archived_chats:
+            messages = storage.get_archived_messages_page(user_id, last_id, page_size)
+            if not messages:
+                break
+            last_id = messages[-1]["id"]
+            messages = [msg for msg in messages if msg["chat_id"] in archived_chats]
+            vectors = {msg["id"]: unpack_vectors(msg["embedding"], len(msg["embedding"]) // 4)[0]
+                       for msg in messages if msg["embedding"]}
+            write_page(messages, vectors)
+
+        _write(f, {"type": "end", **counts})
+
+    counts["bytes"] = os.path.getsize(path)
+    counts["seconds"] = round(time.perf_counter() - started, 2)
+    return counts
+
+
+def read_archive(path):
+    """Yield the records of an archive, checking the header and that the end record is present."""
+    with open_archive(path, "r") as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get("format") != FORMAT:
+            raise ValueError(f"{path} is not an AskAtlas archive")
+        if header.get("version") != VERSION:
+            raise ValueError(f"Unsupported archive version {header.get('version')}")
+        yield header
+        for line in f:
+            record = json.loads(line)
+            yield record
+            if record["type"] == "end":
+                return
+    raise ValueError(f"{path} is truncated: no end record")
+
+
+def verify_archive(path):
+    """Read an archive through and check its record counts against the end record."""
+    counts = {"chats": 0, "messages": 0, "embeddings": 0}
+    for record in read_archive(path):
+        if record["type"] == "chat":
+            counts["chats"] += 1
+        elif record["type"] == "message":
+            counts["messages"] += 1
+        elif record["type"] == "embeddings":
+            counts["embeddings"] += len(record["message_ids"])
+        elif record["type"] == "end":
+            if any(record[key] != counts[key] for key in counts):
+                raise ValueError(f"{path} is corrupt: expected {record}, read {counts}")
+    return counts
+
+
+def import_user(path, username=None, vectors=True, page_size=PAGE_SIZE, verify=True):
+    """
+    Recreate a user from an archive as a new account.
+
+    Chats and messages get new ids; titles, timestamps and the password
+    hash are kept, so the user logs in as before.
+
+    Args:
+        path: Archive written by export_user
+        username: Import under this username instead of the exported one;
+            the email's local part is replaced too, as emails are unique
+        vectors: Add the messages to the vector store, using archived
+            embeddings where present and embedding the rest
+        page_size: Messages written per transaction
+        verify: Read the archive through once first, so a truncated or
+            corrupt file is rejected before anything is written
+
+    Returns:
+        Dict with the new user id and the number of chats, messages and
+        vectors imported
+    """
+    if verify:
+        verify_archive(path)
+    if vectors:
+        from .vector_store import add_messages_to_vector_store
+
+    started = time.perf_counter()
+    records = read_archive(path)
+    header = next(records)
+    user = header["user"]
+    username = username or user["username"]
+    email = user["email"] if username == user["username"] else f"{username}@{user['email'].split('@')[-1]}"
+    user_id = storage.import_user(username, email, user["password_hash"], user["created_at"])
+    if user_id is None:
+        raise ValueError(f"Username {username} or email {email} already exists")
+
+    # New documents are counted into the titler's IDF table only once it has been built
+    track_terms = storage.get_document_frequencies([])[0] > 0
+    counts = {"user_id": user_id, "chats": 0, "messages": 0, "vectors": 0, "skipped": 0}
+    chat_ids = {}
+    chats = []
+    pending = []
+
+    def flush_chats():
+        chat_ids.update(storage.import_chats(user_id, chats))
+        counts["chats"] += len(chats)
+        chats.clear()
+
+    def flush_messages(block=None):
+        new_ids = storage.import_messages(user_id, pending)
+        counts["messages"] += len(pending)
+        if track_terms:
+            storage.add_document_terms([tokenize(msg["content"]) for msg in pending])
+        if vectors:
+            archived = {}
+            if block is not None and block["message_ids"]:
+                archived = dict(zip(block["message_ids"], decode_vectors(block["data"], block["dim"])))
+            rows = [{"message_id": new_id, **msg} for new_id, msg in zip(new_ids, pending)]
+            with_vectors = [row for row in rows if row["id"] in archived]
+            without = [row for row in rows if row["id"] not in archived]
+            doc_ids = add_messages_to_vector_store(
+                with_vectors, user_id, [archived[row["id"]] for row in with_vectors])
+            doc_ids += add_messages_to_vector_store(without, user_id)
+            storage.update_message_vector_ids(
+                zip([row["message_id"] for row in with_vectors + without], doc_ids))
+            counts["vectors"] += len(doc_ids)
+        pending.clear()
+
+    for record in records:
+        kind = record["type"]
+        if kind == "chat":
+            chats.append(record)
+            if len(chats) >= page_size:
+                flush_chats()
+        elif kind == "message":
+            if chats:
+                flush_chats()
+            if record["chat_id"] not in chat_ids:
+                # The chat was deleted while the export was running
+                counts["skipped"] += 1
+                continue
+            # Embedding blocks follow their page, so wait for one before writing
+            if pending and len(pending) >= page_size and not header["embeddings"]:
+                flush_messages()
+            pending.append({"id": record["id"], "chat_id": chat_ids[record["chat_id"]],
+                            "is_user": record["is_user"], "content": record["content"],
+                            "timestamp": record["timestamp"]})
+        elif kind == "embeddings":
+            flush_messages(record)
+        elif kind == "end":
+            if chats:
+                flush_chats()
+            if pending:
+                flush_messages()
+
+    counts["seconds"] = round(time.perf_counter() - started, 2)
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or import one user's chat history")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="write a user's chats to an archive")
+    export_parser.add_argument("username")
+    export_parser.add_argument("path", help="archive path ending in .zst, .gz or .jsonl")
+    export_parser.add_argument("--embeddings", action="store_true", help="include stored vectors")
+    import_parser = subparsers.add_parser("import", help="recreate a user from an archive")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--username", help="import under a different username")
+    import_parser.add_argument("--no-vectors", action="store_true", help="skip the vector store")
+    verify_parser = subparsers.add_parser("verify", help="check an archive is complete")
+    verify_parser.add_argument("path")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        result = export_user(args.username, args.path, include_embeddings=args.embeddings)
+    elif args.command == "import":
+        result = import_user(args.path, username=args.username, vectors=not args.no_vectors)
+    else:
+        result = verify_archive(args.path)
+    print(json.dumps(result, indent=2))
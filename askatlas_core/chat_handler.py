@@ -0,0 +1,219 @@
+import os
+import sys
+from collections import deque
+from datetime import datetime
+from . import metrics
+from .llm import get_backend, MODEL_NAME, LLM_BACKEND
+from .storage import Message, save_message, get_chat_messages, update_message_vector_id
+from .vector_store import add_message_to_vector_store
+from .memory import record_user_message, get_context
+from .retrieval_gate import gated_retrieve, invalidate_corpus_size
+from .tracing import start_trace, span, traced_stream
+from .profiling import profile_turn
+
+TURN_SECONDS = metrics.histogram(
+    "askatlas_turn_seconds", "End-to-end duration of process_message", ["use_context"])
+
+# Approximate bytes of rendered history one session keeps between reruns
+SESSION_HISTORY_MAX_BYTES = int(os.getenv("SESSION_HISTORY_MAX_BYTES", str(256 * 1024)))
+
+# The most recent messages are kept even when they alone exceed the budget
+SESSION_HISTORY_MIN_MESSAGES = int(os.getenv("SESSION_HISTORY_MIN_MESSAGES", "20"))
+
+# Messages fetched when a chat is opened; older ones are paged in on request
+SESSION_HISTORY_INITIAL = int(os.getenv("SESSION_HISTORY_INITIAL", "200"))
+
+# Most recent messages of a chat sent to the model as history; older ones are
+# left to retrieval, which can then find them with RETRIEVAL_SCOPE=chat
+PROMPT_HISTORY_MESSAGES = max(2, int(os.getenv("PROMPT_HISTORY_MESSAGES", "40")))
+
+# Record, parsed timestamp and deque slot; the content string is counted per message
+_MESSAGE_OVERHEAD = sys.getsizeof(Message(0, True, "", None)) + sys.getsizeof(datetime(2000, 1, 1)) + 8
+
+
+def message_nbytes(message):
+    """Approximate memory held by one Message record."""
+    return _MESSAGE_OVERHEAD + sys.getsizeof(message.content)
+
+
+class ChatHistory:
+    """
+    The tail of one chat kept in a session for rendering.
+
+    New messages are appended as they are fetched and the oldest are evicted
+    once the records exceed SESSION_HISTORY_MAX_BYTES, so a session holds at
+    most that much history however long the chat grows.
+    """
+    __slots__ = ("chat_id", "messages", "nbytes", "has_earlier")
+
+    def __init__(self, chat_id):
+        self.chat_id = chat_id
+        self.messages = deque()
+        self.nbytes = 0
+        self.has_earlier = False
+
+    def __len__(self):
+        return len(self.messages)
+
+    def __iter__(self):
+        return iter(self.messages)
+
+    @property
+    def last_id(self):
+        return self.messages[-1].id if self.messages else 0
+
+    @property
+    def first_id(self):
+        return self.messages[0].id if self.messages else None
+
+    def extend(self, messages):
+        for message in messages:
+            self.messages.append(message)
+            self.nbytes += message_nbytes(message)
+        while self.nbytes > SESSION_HISTORY_MAX_BYTES and len(self.messages) > SESSION_HISTORY_MIN_MESSAGES:
+            self.nbytes -= message_nbytes(self.messages.popleft())
+            self.has_earlier = True
+
+
+def load_chat_history(chat_id, cached=None):
+    """
+    Bring a session's rendered history for a chat up to date.
+
+    Args:
+        chat_id: The ID of the chat being displayed
+        cached: The ChatHistory kept from the previous rerun, if any
+
+    Returns:
+        The cached ChatHistory with only the messages it had not seen
+        fetched, or a new one holding the chat's most recent messages
+    """
+    if cached is not None and cached.chat_id == chat_id:
+        cached.extend(get_chat_messages(chat_id, after_id=cached.last_id))
+        return cached
+
+    history = ChatHistory(chat_id)
+    # One extra row tells whether there is anything before the initial page
+    recent = get_chat_messages(chat_id, limit=SESSION_HISTORY_INITIAL + 1)
+    if len(recent) > SESSION_HISTORY_INITIAL:
+        recent = recent[1:]
+        history.has_earlier = True
+    history.extend(recent)
+    return history
+
+
+def get_earlier_messages(history, limit=50):
+    """Fetch the page of messages before a ChatHistory's oldest one; the page is not kept."""
+    if history.first_id is None:
+        return []
+    return get_chat_messages(history.chat_id, before_id=history.first_id, limit=limit)
+
+
+def get_formatted_chat_history(chat_id):
+    """Get the full chat history for display."""
+    return get_chat_messages(chat_id)
+
+
+def process_message(user_id, chat_id, user_message, use_context=False):
+    """
+    Process a user message, save it to the database, and get AI response.
+
+    Args:
+        user_id: The ID of the current user
+        chat_id: The ID of the current chat
+        user_message: The message from the user
+        use_context: Whether to include context from previous chats
+
+    Returns:
+        The AI response text
+    """
+    # One trace per turn; each stage below records its own span when sampled
+    with start_trace("chat.turn", user_id=user_id, chat_id=chat_id, use_context=use_context), \
+            TURN_SECONDS.labels(str(bool(use_context)).lower()).time(), \
+            profile_turn("chat.turn"):
+        return _process_message(user_id, chat_id, user_message, use_context)
+
+
+def _process_message(user_id, chat_id, user_message, use_context):
+    # Save user message to database
+    message_id = save_message(chat_id, user_id, user_message, is_user=True)
+
+    # Add message to vector store
+    vector_id = add_message_to_vector_store(
+        user_message,
+        user_id,
+        message_id,
+        chat_id,
+        is_user=True
+    )
+
+    # Update message with vector ID
+    update_message_vector_id(message_id, vector_id)
+
+    # Remember anything the user said about themselves, in the background
+    record_user_message(user_id, message_id, user_message)
+
+    # Get the recent part of this chat's history
+    messages = get_chat_messages(chat_id, limit=PROMPT_HISTORY_MESSAGES)
+    history = []
+
+    # A chat's first message changes how many chats the user has with content
+    if len(messages) == 1:
+        invalidate_corpus_size(user_id)
+
+    # History sent to Gemini starts with a user turn
+    if not messages[0].is_user:
+        messages = messages[1:]
+
+    # Format messages for Gemini API
+    with span("history.format", messages=len(messages)):
+        for msg in messages:
+            role = "user" if msg.is_user else "model"
+            history.append({"role": role, "parts": [msg.content]})
+
+    # Prepare prompt with context if needed
+    prompt = user_message
+    context = ""
+
+    if use_context:
+        # The recent messages, this one included, go out as history, so
+        # retrieval only looks for messages that are not already in it
+        window = (chat_id, messages[0].id)
+        with span("retrieval.context"):
+            context = gated_retrieve(
+                user_id, user_message,
+                lambda: get_context(user_id, user_message, chat_id=chat_id, history_window=window))
+        if context and context != "No relevant context found in past conversations.":
+            prompt = f"""
+            I need you to answer the following question using the context from my previous conversations where relevant:
+            
+            Question: {user_message}
+            
+            {context}
+            
+            Only use the context if it's relevant to the question. If the context doesn't help, just answer normally.
+            Always respond directly to the question without mentioning that you're using context or previous conversations.
+            """
+
+    # Get AI response, with history excluding the latest message; streamed so
+    # the trace records time to first token as well as the full call
+    chunks = get_backend().stream(history[:-1], prompt)
+    response_text = "".join(traced_stream(
+        "llm.stream", chunks, model=MODEL_NAME, backend=LLM_BACKEND, prompt_chars=len(prompt))).strip()
+
+    # Save AI response to database
+    ai_message_id = save_message(
+        chat_id, user_id, response_text, is_user=False)
+
+    # Add AI response to vector store
+    ai_vector_id = add_message_to_vector_store(
+        response_text,
+        user_id,
+        ai_message_id,
+        chat_id,
+        is_user=False
+    )
+
+    # Update message with vector ID
+    update_message_vector_id(ai_message_id, ai_vector_id)
+
+    return response_text
@@ -0,0 +1,38 @@
+import os
+from dotenv import load_dotenv
+
+# Read .env once, from the working directory of whichever app imports the core
+load_dotenv()
+
+# Directory for the SQLite database, vector index and other local state
+DATA_DIR = os.getenv("ASKATLAS_DATA_DIR", "data")
+
+# SQLite database shared by all front-ends
+DB_PATH = os.getenv("CHAT_DB_PATH", os.path.join(DATA_DIR, "chat_app.db"))
+
+# Cold database that old chats' messages are moved to by the retention job
+ARCHIVE_DB_PATH = os.getenv("ARCHIVE_DB_PATH", os.path.join(DATA_DIR, "chat_archive.db"))
+
+# PostgreSQL database and connection pool size per process, for STORAGE_BACKEND=postgres
+POSTGRES_DSN = os.getenv("POSTGRES_DSN", "postgresql://localhost/askatlas")
+POSTGRES_POOL_MIN = int(os.getenv("POSTGRES_POOL_MIN", "1"))
+POSTGRES_POOL_MAX = int(os.getenv("POSTGRES_POOL_MAX", "10"))
+
+# Ensure the data directories exist
+os.makedirs(DATA_DIR, exist_ok=True)
+os.makedirs(os.path.dirname(DB_PATH) or ".", exist_ok=True)
+os.makedirs(os.path.dirname(ARCHIVE_DB_PATH) or ".", exist_ok=True)
+
+
+# Reverse proxies in front of the apps that append to X-Forwarded-For; with 0 the header is
+# ignored and the connection's peer address is used, as any client can send the header
+TRUSTED_PROXY_COUNT = int(os.getenv("TRUSTED_PROXY_COUNT", "0"))
+
+# Users allowed on admin-only pages such as profiling, comma separated. None by default:
+# every database gets an admin/admin account, so "admin" must not be trusted unless chosen
+ADMIN_USERNAMES = {name.strip() for name in os.getenv("ADMIN_USERNAMES", "").split(",") if name.strip()}
+
+
+def get_api_key():
+    """Gemini API key; GEMINI_API_KEY is preferred, GOOGLE_API_KEY is still accepted."""
+    return os.getenv("GEMINI_API_KEY") or os.getenv("GOOGLE_API_KEY")
@@ -0,0 +1,127 @@
+import os
+import re
+import math
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Hits farther than this (squared L2 on normalized MiniLM vectors) are dropped
+MAX_DISTANCE = float(os.getenv("CONTEXT_MAX_DISTANCE", "1.2"))
+
+# Hits more similar than this to an already kept hit are treated as duplicates
+DUPLICATE_SIMILARITY = float(os.getenv("CONTEXT_DUPLICATE_SIMILARITY", "0.92"))
+
+# Upper bound on the size of the assembled context, in estimated tokens
+TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "600"))
+
+CONTEXT_HEADER = "Relevant information from previous conversations:\n\n"
+NO_CONTEXT = "No relevant context found in past conversations."
+
+
+def estimate_tokens(text):
+    """Cheap token estimate (~4 characters per token for English text)."""
+    return max(1, len(text) // 4)
+
+
+def _cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+def _token_set(text):
+    return set(re.findall(r"\w+", text.lower()))
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def _is_duplicate(hit, kept):
+    """Check a hit against the kept hits by embedding cosine, or word overlap if no embedding."""
+    for other in kept:
+        if hit.get("embedding") is not None and other.get("embedding") is not None:
+            if _cosine(hit["embedding"], other["embedding"]) >= DUPLICATE_SIMILARITY:
+                return True
+        elif _jaccard(hit["_tokens"], other["_tokens"]) >= DUPLICATE_SIMILARITY:
+            return True
+    return False
+
+
+def assemble_context(hits, max_distance=MAX_DISTANCE, token_budget=TOKEN_BUDGET):
+    """
+    Build a compact prompt context from ranked retrieval hits.
+
+    Hits are filtered by distance, near-duplicates are removed, the survivors
+    are trimmed to the token budget in rank order and then grouped by chat.
+
+    Args:
+        hits: Ranked list of dicts with "content" and optionally "is_user",
+            "chat_id", "message_id", "distance" and "embedding"
+        max_distance: Hits with a larger vector distance are dropped; hits
+            without one (messages never embedded, or lexical matches when the
+            vector search was skipped) are kept
+        token_budget: Maximum estimated tokens for the hit lines
+
+    Returns:
+        Tuple of (context string, stats dict). The context is empty when no
+        hit survives filtering.
+    """
+    # What injecting every hit verbatim, one numbered line each, would have cost
+    raw_tokens = estimate_tokens(CONTEXT_HEADER + "".join(
+        f"{i + 1}. [{'User' if hit.get('is_user') else 'AI'}]: {hit['content']}\n\n"
+        for i, hit in enumerate(hits))) if hits else 0
+
+    kept = []
+    used_tokens = 0
+    dropped = {"distance": 0, "duplicate": 0, "budget": 0}
+    for rank, hit in enumerate(hits):
+        distance = hit.get("distance")
+        if distance is not None and distance > max_distance:
+            dropped["distance"] += 1
+            continue
+
+        hit = dict(hit, _rank=rank, _tokens=_token_set(hit["content"]))
+        if _is_duplicate(hit, kept):
+            dropped["duplicate"] += 1
+            continue
+
+        tokens = estimate_tokens(hit["content"])
+        if used_tokens + tokens > token_budget:
+            dropped["budget"] += 1
+            continue
+
+        used_tokens += tokens
+        kept.append(hit)
+
+    # Group by chat, chats ordered by their best hit, messages in chat order
+    groups = {}
+    for hit in kept:
+        groups.setdefault(hit.get("chat_id"), []).append(hit)
+
+    parts = []
+    for chat_id, chat_hits in groups.items():
+        parts.append(f"From chat {chat_id}:\n" if chat_id is not None else "From an earlier chat:\n")
+        chat_hits.sort(key=lambda h: h.get("message_id") or h["_rank"])
+        for hit in chat_hits:
+            role = "User" if hit.get("is_user") else "AI"
+            parts.append(f"- [{role}]: {hit['content']}\n")
+        parts.append("\n")
+
+    context = CONTEXT_HEADER + "".join(parts) if kept else ""
+
+    stats = {
+        "hits": len(hits),
+        "kept": len(kept),
+        "dropped": dropped,
+        "raw_tokens": raw_tokens,
+        "context_tokens": estimate_tokens(context) if context else 0,
+    }
+    stats["tokens_saved"] = max(0, raw_tokens - stats["context_tokens"])
+    logger.info(
+        "context assembled: kept %d/%d hits, %d tokens, %d tokens saved (dropped %s)",
+        stats["kept"], stats["hits"], stats["context_tokens"], stats["tokens_saved"], dropped)
+
+    return context, stats
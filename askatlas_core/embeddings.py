@@ -0,0 +1,242 @@
+import os
+import json
+import argparse
+import numpy as np
+from .config import DATA_DIR
+
+# Sentence-transformers model used for every embedding in the app
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+HF_MODEL_ID = f"sentence-transformers/{EMBEDDING_MODEL}"
+
+# "torch" (SentenceTransformer) or "onnx" (onnxruntime, no PyTorch import)
+EMBEDDING_ENGINE = os.getenv("EMBEDDING_ENGINE", "torch")
+
+# Where export_onnx writes the model and where OnnxEmbedder loads it from
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join(DATA_DIR, "onnx", EMBEDDING_MODEL))
+
+# Use the int8 dynamically quantized graph instead of the fp32 one
+ONNX_QUANTIZED = os.getenv("ONNX_QUANTIZED", "0") == "1"
+
+# onnxruntime intra-op threads; 0 lets onnxruntime pick (one per physical core)
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))
+
+# all-MiniLM-L6-v2 truncates inputs at 256 word pieces
+MAX_SEQ_LENGTH = 256
+
+ONNX_FILE = "model.onnx"
+ONNX_QUANTIZED_FILE = "model.int8.onnx"
+
+# Reference vectors from the torch model, written by export_onnx next to the graphs
+PARITY_FILE = "parity.json"
+
+# Sentences embedded with both engines to check the ONNX graphs against PyTorch
+PARITY_SENTENCES = [
+    "What are the opening hours of the Louvre?",
+    "Suggest a vegetarian restaurant near Shibuya station.",
+    "How long does it take to walk from the Colosseum to the Pantheon?",
+    "I'm allergic to peanuts and travelling with two kids.",
+    "thanks!",
+]
+
+
+def parity_tolerance(quantized):
+    """Lowest per-sentence cosine similarity to the torch vectors an ONNX graph may have."""
+    return 0.98 if quantized else 0.999
+
+
+def _compare(reference, candidate, min_cosine):
+    reference = np.asarray(reference, dtype=np.float32)
+    candidate = np.asarray(candidate, dtype=np.float32)
+    cosines = (reference * candidate).sum(axis=1) / (
+        np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1))
+    worst = float(cosines.min())
+    return {
+        "min_cosine": worst,
+        "max_abs_diff": float(np.abs(reference - candidate).max()),
+        "passed": worst >= min_cosine,
+    }
+
+
+class TorchEmbedder:
+    """The original SentenceTransformer model."""
+
+    def __init__(self):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(EMBEDDING_MODEL)
+
+    def encode(self, texts):
+        return self.model.encode(texts)
+
+
+class OnnxEmbedder:
+    """
+    MiniLM exported to ONNX, with the mean pooling and normalization done in numpy.
+
+    Its vectors go into the same Chroma collection as the torch ones, so by
+    default it refuses to load unless the graph reproduces the reference
+    vectors export_onnx recorded from the torch model.
+    """
+
+    def __init__(self, model_dir=ONNX_MODEL_DIR, quantized=ONNX_QUANTIZED,
+                 intra_op_threads=ONNX_INTRA_OP_THREADS, verify=True):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        model_path = os.path.join(model_dir, ONNX_QUANTIZED_FILE if quantized else ONNX_FILE)
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"{model_path} not found; run `python -m askatlas_core.embeddings export` first")
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding(pad_id=0, pad_token="[PAD]")
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        if verify:
+            self._verify_parity(model_dir, quantized)
+
+    def _verify_parity(self, model_dir, quantized):
+        parity_path = os.path.join(model_dir, PARITY_FILE)
+        if not os.path.exists(parity_path):
+            raise RuntimeError(
+                f"{parity_path} not found; re-run `python -m askatlas_core.embeddings export` "
+                "to record the torch reference vectors")
+        with open(parity_path, encoding="utf-8") as f:
+            recorded = json.load(f)
+
+        result = _compare(recorded["vectors"], self.encode(recorded["sentences"]), parity_tolerance(quantized))
+        if not result["passed"]:
+            raise RuntimeError(
+                f"ONNX embeddings do not match the torch model (min cosine {result['min_cosine']:.4f}, "
+                f"need {parity_tolerance(quantized)}); keep EMBEDDING_ENGINE=torch")
+
+    def encode(self, texts):
+        single = isinstance(texts, str)
+        encodings = self.tokenizer.encode_batch([texts] if single else list(texts))
+
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # Mean pooling over real tokens, then L2 normalization (as the ST pipeline does)
+        mask = attention_mask[..., None].astype(np.float32)
+        pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+
+        return pooled[0] if single else pooled
+
+
+def load_embedder(engine=EMBEDDING_ENGINE):
+    """Create the embedding engine selected by EMBEDDING_ENGINE."""
+    if engine == "onnx":
+        return OnnxEmbedder()
+    if engine == "torch":
+        return TorchEmbedder()
+    raise ValueError(f"Unknown embedding engine: {engine}")
+
+
+def export_onnx(output_dir=ONNX_MODEL_DIR, quantize=True):
+    """
+    Export MiniLM to ONNX, optionally with an int8 dynamically quantized copy.
+
+    Needs torch and transformers, so run it once at build time rather than on
+    the serving hosts. It also records the torch model's vectors for
+    PARITY_SENTENCES, which OnnxEmbedder checks itself against on load.
+
+    Args:
+        output_dir: Directory for model.onnx, model.int8.onnx, tokenizer.json and parity.json
+        quantize: Whether to also write the quantized graph
+
+    Returns:
+        Dict of check_parity results per exported graph ("fp32", "int8")
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(HF_MODEL_ID)
+    model = AutoModel.from_pretrained(HF_MODEL_ID).eval()
+    tokenizer.save_pretrained(output_dir)
+
+    sample = tokenizer(["An example sentence"], return_tensors="pt")
+    model_path = os.path.join(output_dir, ONNX_FILE)
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in sample}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in ("input_ids", "attention_mask", "token_type_ids")),
+            model_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=18,
+        )
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(model_path, os.path.join(output_dir, ONNX_QUANTIZED_FILE),
+                         weight_type=QuantType.QInt8)
+
+    reference = np.asarray(TorchEmbedder().encode(PARITY_SENTENCES))
+    results = {}
+    for name, quantized in (("fp32", False), ("int8", True)):
+        if quantized and not quantize:
+            continue
+        candidate = OnnxEmbedder(output_dir, quantized=quantized, verify=False).encode(PARITY_SENTENCES)
+        results[name] = _compare(reference, candidate, parity_tolerance(quantized))
+
+    with open(os.path.join(output_dir, PARITY_FILE), "w", encoding="utf-8") as f:
+        json.dump({"model": HF_MODEL_ID, "sentences": PARITY_SENTENCES,
+                   "vectors": reference.tolist(), "results": results}, f)
+    return results
+
+
+def check_parity(texts, quantized=ONNX_QUANTIZED, min_cosine=None):
+    """
+    Compare ONNX embeddings with the SentenceTransformer reference.
+
+    Args:
+        texts: Sentences to embed with both engines
+        quantized: Check the int8 graph instead of the fp32 one
+        min_cosine: Required per-sentence cosine similarity; defaults to
+            parity_tolerance(quantized)
+
+    Returns:
+        Dict with the worst cosine similarity, max absolute difference and
+        whether the tolerance was met
+    """
+    if min_cosine is None:
+        min_cosine = parity_tolerance(quantized)
+
+    reference = TorchEmbedder().encode(texts)
+    candidate = OnnxEmbedder(quantized=quantized, verify=False).encode(texts)
+    return _compare(reference, candidate, min_cosine)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="ONNX embedding engine tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="export MiniLM to ONNX")
+    export_parser.add_argument("--output-dir", default=ONNX_MODEL_DIR)
+    export_parser.add_argument("--no-quantize", action="store_true")
+    parity_parser = subparsers.add_parser("parity", help="compare ONNX output with PyTorch")
+    parity_parser.add_argument("--quantized", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "export":
+        for name, result in export_onnx(args.output_dir, quantize=not args.no_quantize).items():
+            print(name, result)
+    else:
+        print(check_parity(PARITY_SENTENCES, quantized=args.quantized))
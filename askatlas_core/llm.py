@@ -0,0 +1,124 @@
+import os
+import time
+import threading
+from . import metrics
+from .config import get_api_key
+from .context_builder import estimate_tokens
+
+# Model used by every front-end
+MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+
+# "gemini" for the real API, "fake" for a local stand-in used in tests and load tests
+LLM_BACKEND = os.getenv("LLM_BACKEND", "gemini")
+
+# Fake backend pacing: time to first chunk and between chunks, in seconds
+FAKE_LLM_FIRST_CHUNK_DELAY = float(os.getenv("FAKE_LLM_FIRST_CHUNK_DELAY", "0.3"))
+FAKE_LLM_CHUNK_DELAY = float(os.getenv("FAKE_LLM_CHUNK_DELAY", "0.05"))
+
+_lock = threading.Lock()
+_backends = {}
+
+LLM_SECONDS = metrics.histogram(
+    "askatlas_llm_seconds", "Duration of an LLM call, to the last chunk", ["backend"])
+LLM_FIRST_CHUNK_SECONDS = metrics.histogram(
+    "askatlas_llm_first_chunk_seconds", "Time to the first streamed chunk of an LLM answer", ["backend"])
+LLM_TOKENS = metrics.counter(
+    "askatlas_llm_tokens_total", "Estimated tokens (characters / 4) sent to and received from the LLM",
+    ["backend", "direction"])
+LLM_ERRORS = metrics.counter("askatlas_llm_errors_total", "LLM calls that raised", ["backend"])
+
+
+def _prompt_tokens(history, prompt):
+    return estimate_tokens(prompt) + sum(estimate_tokens(part) for turn in history for part in turn["parts"])
+
+
+def _metered(backend, history, prompt, chunks):
+    """Yield the chunks of an answer while recording latency, errors and token counts."""
+    started = time.perf_counter()
+    LLM_TOKENS.labels(backend, "prompt").inc(_prompt_tokens(history, prompt))
+    first = True
+    answer_chars = 0
+    try:
+        for chunk in chunks:
+            if first:
+                LLM_FIRST_CHUNK_SECONDS.labels(backend).observe(time.perf_counter() - started)
+                first = False
+            answer_chars += len(chunk)
+            yield chunk
+    except Exception:
+        LLM_ERRORS.labels(backend).inc()
+        raise
+    finally:
+        LLM_SECONDS.labels(backend).observe(time.perf_counter() - started)
+        LLM_TOKENS.labels(backend, "completion").inc(answer_chars // 4)
+
+
+class GeminiBackend:
+    """Gemini chat model, configured and constructed once per system instruction."""
+
+    _configured = False
+
+    def __init__(self, system_instruction=None):
+        import google.generativeai as genai
+
+        with _lock:
+            if not GeminiBackend._configured:
+                genai.configure(api_key=get_api_key())
+                GeminiBackend._configured = True
+        self.model = genai.GenerativeModel(MODEL_NAME, system_instruction=system_instruction)
+
+    def _start_chat(self, history):
+        return self.model.start_chat(history=history)
+
+    def send(self, history, prompt):
+        """Send a prompt after the given history and return the full answer text."""
+        def answer():
+            yield self._start_chat(history).send_message(prompt).text
+        return "".join(_metered("gemini", history, prompt, answer()))
+
+    def stream(self, history, prompt):
+        """Send a prompt after the given history and yield the answer as it streams."""
+        def chunks():
+            for chunk in self._start_chat(history).send_message(prompt, stream=True):
+                yield chunk.text
+        return _metered("gemini", history, prompt, chunks())
+
+
+class FakeBackend:
+    """Deterministic stand-in that sleeps like a remote model, without network or API key."""
+
+    def __init__(self, system_instruction=None):
+        self.system_instruction = system_instruction
+
+    def _words(self, history, prompt):
+        return f"You said: {prompt}. This is turn {len(history) // 2 + 1}.".split()
+
+    def send(self, history, prompt):
+        return "".join(self.stream(history, prompt)).strip()
+
+    def _chunks(self, history, prompt):
+        time.sleep(FAKE_LLM_FIRST_CHUNK_DELAY)
+        for i, word in enumerate(self._words(history, prompt)):
+            if i:
+                time.sleep(FAKE_LLM_CHUNK_DELAY)
+            yield word + " "
+
+    def stream(self, history, prompt):
+        return _metered("fake", history, prompt, self._chunks(history, prompt))
+
+
+def get_backend(system_instruction=None):
+    """
+    Return the process-wide backend for a system instruction, creating it on first use.
+
+    Args:
+        system_instruction: Optional persona/instructions for the model
+
+    Returns:
+        A GeminiBackend, or a FakeBackend when LLM_BACKEND=fake
+    """
+    backend = _backends.get(system_instruction)
+    if backend is None:
+        backend_class = FakeBackend if LLM_BACKEND == "fake" else GeminiBackend
+        backend = _backends.setdefault(system_instruction, backend_class(system_instruction))
+    return backend
@@ -0,0 +1,81 @@
+import os
+import time
+import threading
+from collections import OrderedDict, deque
+
+# Failed logins allowed per username within USER_WINDOW seconds
+USER_MAX_FAILURES = int(os.getenv("LOGIN_USER_MAX_FAILURES", "5"))
+USER_WINDOW = int(os.getenv("LOGIN_USER_WINDOW", "900"))
+
+# Login attempts (successful or not) allowed per client IP within IP_WINDOW seconds
+IP_MAX_ATTEMPTS = int(os.getenv("LOGIN_IP_MAX_ATTEMPTS", "20"))
+IP_WINDOW = int(os.getenv("LOGIN_IP_WINDOW", "60"))
+
+# Keys tracked per table; the least recently seen are evicted beyond this
+MAX_TRACKED_KEYS = 100_000
+
+_lock = threading.Lock()
+_user_failures = OrderedDict()
+_ip_attempts = OrderedDict()
+
+
+def _recent(table, key, window, now):
+    """Return the key's timestamps inside the window, dropping expired ones."""
+    events = table.get(key)
+    if events is None:
+        return None
+    while events and events[0] <= now - window:
+        events.popleft()
+    if not events:
+        del table[key]
+        return None
+    table.move_to_end(key)
+    return events
+
+
+def _record(table, key, now):
+    events = table.get(key)
+    if events is None:
+        events = table[key] = deque()
+        if len(table) > MAX_TRACKED_KEYS:
+            table.popitem(last=False)
+    events.append(now)
+    table.move_to_end(key)
+
+
+def check_login_allowed(username, client_ip):
+    """
+    Decide whether a login attempt may proceed to password verification.
+
+    Counts the attempt against the client IP, so it must be called once per
+    submitted login form.
+
+    Args:
+        username: The username being logged into
+        client_ip: The client's address, or None if unknown
+
+    Returns:
+        Tuple of (allowed, retry_after_seconds)
+    """
+    now = time.monotonic()
+    with _lock:
+        failures = _recent(_user_failures, username.lower(), USER_WINDOW, now)
+        if failures is not None and len(failures) >= USER_MAX_FAILURES:
+            return False, int(failures[0] + USER_WINDOW - now) + 1
+
+        if client_ip:
+            attempts = _recent(_ip_attempts, client_ip, IP_WINDOW, now)
+            if attempts is not None and len(attempts) >= IP_MAX_ATTEMPTS:
+                return False, int(attempts[0] + IP_WINDOW - now) + 1
+            _record(_ip_attempts, client_ip, now)
+
+    return True, 0
+
+
+def record_login_result(username, success):
+    """Track a failed login, or clear the username's failures after a success."""
+    with _lock:
+        if success:
+            _user_failures.pop(username.lower(), None)
+        else:
+            _record(_user_failures, username.lower(), time.monotonic())
@@ -0,0 +1,488 @@
+"""
+Per-user memory: facts and preferences distilled from what users tell the bot.
+
+Each user message is scanned for what a tour guide should remember: where
+the user lives, what they can eat, where and when they are travelling, who
+with, and what they like. Matches are kept as short items in user_memory,
+one per key, so a later mention replaces an earlier one ("I moved to Porto"
+replaces "Lives in Lisbon", "I hate museums" replaces "Likes museums").
+Items are embedded once, when they change, by a background worker.
+
+Answering ranks the user's items (at most MEMORY_MAX_ITEMS) against the
+question in-process, instead of searching every past message. MEMORY_MODE
+decides how that combines with raw past-message retrieval:
+
+- ahead (default): memory items first, then the raw hits; raw retrieval is
+  skipped when an item is close enough to the question to answer it
+- replace: memory items only; raw hits when no item is pinned or relevant
+- off: raw hits only, and nothing is extracted
+
+    python -m askatlas_core.memory backfill alice   # build from existing history
+    python -m askatlas_core.memory show alice
+    python -m askatlas_core.memory forget alice
+    python -m askatlas_core.memory check             # run the extraction examples
+"""
+import os
+import re
+import time
+import logging
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from . import metrics
+from .vectors import pack_vectors, unpack_vectors
+from .context_builder import NO_CONTEXT
+from .storage import (
+    get_memory_items, upsert_memory_items, delete_memory_items,
+    get_user_for_export, get_user_max_ids, get_user_messages_page, get_archived_messages_page
+)
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+MEMORY_MODE = os.getenv("MEMORY_MODE", "ahead")
+MODES = ("ahead", "replace", "off")
+
+# Items kept per user; the least recently updated are dropped first
+MEMORY_MAX_ITEMS = int(os.getenv("MEMORY_MAX_ITEMS", "50"))
+
+# Ranked items added to a prompt, and the cosine similarity they need to the question
+MEMORY_TOP_K = int(os.getenv("MEMORY_TOP_K", "5"))
+MEMORY_MIN_SIMILARITY = float(os.getenv("MEMORY_MIN_SIMILARITY", "0.2"))
+
+# In "ahead" mode, an item this similar to the question answers it and past messages are not searched
+MEMORY_ANSWER_SIMILARITY = float(os.getenv("MEMORY_ANSWER_SIMILARITY", "0.5"))
+
+# How long a user's items stay cached in this process, in seconds
+MEMORY_CACHE_TTL = int(os.getenv("MEMORY_CACHE_TTL", "60"))
+
+# Kinds that matter to almost any travel question, so they are always included
+PINNED_KINDS = frozenset({"home", "diet", "allergy", "avoids", "companions", "budget"})
+
+MEMORY_HEADER = "What the user has told you about themselves before:\n"
+
+MEMORY_ITEMS_WRITTEN = metrics.counter(
+    "askatlas_memory_items_written_total", "Memory items added or changed", ["kind"])
+MEMORY_LOOKUPS = metrics.counter(
+    "askatlas_memory_lookups_total", "Prompts built with per-user memory", ["result"])
+RAW_RETRIEVAL_SKIPPED = metrics.counter(
+    "askatlas_memory_raw_retrieval_skipped_total", "Prompts answered from memory without searching past messages")
+
+# A single worker keeps each user's updates in message order and off the script thread
+_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="memory")
+_lock = threading.Lock()
+_cache = {}
+
+# A capitalised place name of one or more words, e.g. "Lisbon", "New York", "Rio de Janeiro"
+PLACE = r"([A-Z][\w'-]*(?:[ -](?:[A-Z][\w'-]*|(?:de|del|da|do|la|le|am|upon)(?= [A-Z])))*)"
+
+DIETS = (r"vegetarian|vegan|pescatarian|gluten[- ]free|dairy[- ]free|lactose[- ]intolerant|"
+         r"coeliac|celiac|halal|kosher|diabetic|keto")
+
+# One or more diets in a row: "vegan", "vegetarian and gluten-free", "halal, dairy-free and keto"
+DIET_LIST = rf"((?:{DIETS})(?:(?:\s*,\s*(?:and\s+)?|\s+and\s+|\s*&\s*)(?:{DIETS}))*)"
+
+MONTHS = r"jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?"
+
+# A travel date or span: "on 12 May", "in June", "from July 3 to 10", "next week", "for 5 days"
+DATE = re.compile(
+    r"\b(?:(?:on|in|from|between|over|around|until|by|for)\s+)?(?:"
+    rf"(?:\d{{1,2}}(?:st|nd|rd|th)?\s+)?(?:{MONTHS})\b(?:\s+\d{{1,2}}(?:st|nd|rd|th)?\b)?"
+    r"(?:\s*(?:-|to|until)\s*\d{1,2}(?:st|nd|rd|th)?\b)?(?:,?\s*\d{4})?"
+    r"|\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}(?:/\d{2,4})?"
+    r"|tomorrow|tonight|(?:next|this)\s+(?:week(?:end)?|month|year|summer|winter|spring|autumn|fall|"
+    r"monday|tuesday|wednesday|thursday|friday|saturday|sunday)"
+    r"|\d+\s+(?:days?|nights?|weeks?))",
+    re.IGNORECASE,
+)
+
+# Ends a captured phrase at the end of its clause
+CLAUSE_END = re.compile(
+    r"\s*(?:[.,;:!?()]|\b(?:and|but|because|so|since|which|who|when|where|if|though|with|as)\b).*$",
+    re.IGNORECASE | re.DOTALL)
+
+# The same for lists of people, which run on over "and" and "with"
+LIST_END = re.compile(r"\s*(?:[.,;:!?()]|\b(?:but|because|so|since|which|who|when|where|if|though|to|for)\b).*$",
+                      re.IGNORECASE | re.DOTALL)
+
+# The same for enumerations of foods, which are then split into one item per value
+ENUM_END = re.compile(r"\s*(?:[.;:!?()]|\b(?:but|because|so|since|which|who|when|where|if|though|as|except)\b).*$",
+                      re.IGNORECASE | re.DOTALL)
+ENUM_SEPARATOR = re.compile(r"\s*(?:,|&|/|\band\b|\bor\b|\bnor\b)\s*", re.IGNORECASE)
+
+# Kinds whose value may list several things, each kept as its own item so none is lost
+ENUMERATED = frozenset({"diet", "allergy", "avoids"})
+
+# Start of a lower-case "place" that is not a place: "i moved to a new flat"
+NOT_A_PLACE = re.compile(r"(?i)(?:a|an|the|my|our|this|that|here|there|it|work|school)\b")
+
+# Objects of "I like ..." that say nothing about the user
+VAGUE = re.compile(r"^(?:to\s+(?:know|ask|see|go|have|get)\b|it\b|that\b|this\b|them\b|you\b|your\b|the idea\b)",
+                   re.IGNORECASE)
+
+# (kind, pattern, content template); the first group is the value, the key is kind:value
+# unless the kind holds a single value per user
+PATTERNS = [
+    ("home", re.compile(r"\b(?i:i live in|i'm living in|i am living in|i'm based in|i am based in|"
+                        r"i(?:'ve| have)? (?:just )?moved to|my home ?(?:town|city)? is)\s+" + PLACE),
+     "Lives in {}"),
+    ("origin", re.compile(r"\b(?i:i'm from|i am from|i come from|i was born in)\s+" + PLACE), "Is from {}"),
+    ("diet", re.compile(r"(?i)\b(?:i'm|i am|we're|we are|i eat|i follow a|i'm on a|i am on a)\s+"
+                        r"(?:a\s+|strictly\s+|mostly\s+|strict\s+)?" + DIET_LIST + r"\b"), "Diet: {}"),
+    ("allergy", re.compile(r"(?i)\b(?:i'm|i am|we're|we are)\s+(?:severely\s+|very\s+)?allergic to\s+(.+)"),
+     "Allergic to {}"),
+    ("avoids", re.compile(r"(?i)\b(?:i|we) (?:don't|do not|can't|cannot|never) eat\s+(.+)"), "Does not eat {}"),
+    ("companions", re.compile(r"(?i)\b(?:travel(?:l)?ing|going|coming|flying|visiting|on holiday|on vacation)\b"
+                              r"[^.!?\n]*?\bwith\s+((?:my|our)\s+.+|\d+\s+(?:kids|children|friends).*)"),
+     "Travels with {}"),
+    ("budget", re.compile(r"(?i)\b(?:my|our) budget is\s+(?:about\s+|around\s+|roughly\s+)?(.+)"), "Budget: {}"),
+    ("pref", re.compile(r"(?i)\bi (?:really |absolutely |much )?(?:love|like|enjoy|prefer|am into|'m into)\s+(.+)"),
+     "Likes {}"),
+    ("pref", re.compile(r"(?i)\bi (?:really )?(?:hate|dislike|don't like|do not like|can't stand|avoid)\s+(.+)"),
+     "Dislikes {}"),
+]
+
+# Travel plans: a place, and the dates if the sentence gives them
+TRIP = re.compile(r"\b(?i:i'm|i am|we're|we are|i'll be|we'll be|i will be|we will be|i plan on|we plan on)\s+"
+                  r"(?i:going|travel(?:l)?ing|flying|heading|visiting|driving|off)\s+(?:(?i:to)\s+)?" + PLACE)
+
+# Kinds with one value per user, so a new one replaces the old whatever it says
+SINGLE_VALUED = frozenset({"home", "origin", "companions", "budget"})
+
+
+def _clause(text, max_words=5, end=CLAUSE_END):
+    """The start of a captured phrase, cut at the end of its clause."""
+    text = end.sub("", text).strip(" '\"")
+    words = text.split()
+    if not words or len(words) > max_words * 2:
+        return None
+    return " ".join(words[:max_words])
+
+
+def _enumeration(text, max_words=5):
+    """The values of a captured list ("peanuts, shellfish and tree nuts"), each cut to a phrase."""
+    values = []
+    for part in ENUM_SEPARATOR.split(ENUM_END.sub("", text)):
+        value = _clause(part, max_words=max_words)
+        if value:
+            values.append(value)
+    return values
+
+
+def _capitalised(sentence):
+    """A lower-case sentence with each word capitalised, so PLACE finds "paris" in "i live in paris"."""
+    return re.sub(r"\b[a-z]", lambda m: m.group(0).upper(), sentence)
+
+
+def _lower_case_place(value):
+    """A place captured from a capitalised lower-case sentence, or None if it is not one."""
+    value = _clause(value, max_words=3)
+    if not value or NOT_A_PLACE.match(value):
+        return None
+    return re.sub(r"(?<= )(?:De|Del|Da|Do|La|Le|Am|Upon)(?= )", lambda m: m.group(0).lower(), value)
+
+
+def _normalise(value):
+    return re.sub(r"^(?:a|an|the|my|our|to)\s+", "", " ".join(value.lower().split()))
+
+
+def extract_facts(text):
+    """
+    Find memorable facts in one user message.
+
+    Questions and hypotheticals ("what if I'm vegan?") are skipped, so only
+    statements about the user are kept.
+
+    Returns:
+        List of dicts with kind, key and content; later facts with the same
+        key replace earlier ones
+    """
+    facts = {}
+    for sentence in re.split(r"(?<=[.!?\n])\s*", text):
+        sentence = sentence.strip()
+        if not sentence or sentence.endswith("?") or re.match(r"(?i)(?:if|what if|suppose)\b", sentence):
+            continue
+
+        lower_case = sentence == sentence.lower()
+        for kind, pattern, template in PATTERNS:
+            if kind in ("home", "origin") and lower_case:
+                match = pattern.search(_capitalised(sentence))
+                values = [_lower_case_place(match.group(1))] if match else []
+            else:
+                match = pattern.search(sentence)
+                if not match:
+                    continue
+                if kind in ("home", "origin"):
+                    values = [match.group(1)]
+                elif kind == "companions":
+                    values = [_clause(match.group(1), max_words=8, end=LIST_END)]
+                elif kind in ENUMERATED:
+                    values = _enumeration(match.group(1))
+                else:
+                    values = [_clause(match.group(1))]
+            for value in values:
+                if not value or (kind == "pref" and VAGUE.match(value)):
+                    continue
+                key = kind if kind in SINGLE_VALUED else f"{kind}:{_normalise(value)}"
+                facts[key] = {"kind": kind, "key": key, "content": template.format(value)}
+
+        match = TRIP.search(sentence)
+        if match:
+            place = match.group(1)
+            date = DATE.search(sentence, match.end())
+            content = f"Travelling to {place}" + (f" {date.group(0).strip()}" if date else "")
+            key = f"trip:{_normalise(place)}"
+            facts[key] = {"kind": "trip", "key": key, "content": content}
+
+    return list(facts.values())
+
+
+# Messages and the items extract_facts must find in them, run by `memory check`
+EXTRACTION_CHECKS = [
+    ("I am allergic to peanuts and shellfish.", {"Allergic to peanuts", "Allergic to shellfish"}),
+    ("I'm allergic to peanuts, shellfish and tree nuts, so no satay please.",
+     {"Allergic to peanuts", "Allergic to shellfish", "Allergic to tree nuts"}),
+    ("We don't eat pork or beef.", {"Does not eat pork", "Does not eat beef"}),
+    ("I'm vegetarian and gluten-free.", {"Diet: vegetarian", "Diet: gluten-free"}),
+    ("I live in New York.", {"Lives in New York"}),
+    ("i live in paris", {"Lives in Paris"}),
+    ("i live in rio de janeiro and love it", {"Lives in Rio de Janeiro"}),
+    ("i moved to a new flat", set()),
+    ("What if I'm vegan?", set()),
+    ("We're travelling to Lisbon on 12 May with my wife and two kids.",
+     {"Travelling to Lisbon on 12 May", "Travels with my wife and two kids"}),
+]
+
+
+def check_extraction():
+    """
+    Run extract_facts over EXTRACTION_CHECKS.
+
+    Returns:
+        List of (message, expected, found) for the examples that differ
+    """
+    failures = []
+    for message, expected in EXTRACTION_CHECKS:
+        found = {fact["content"] for fact in extract_facts(message)}
+        if found != expected:
+            failures.append((message, expected, found))
+    return failures
+
+
+def _load(user_id):
+    """The user's items with their vectors unpacked, cached for MEMORY_CACHE_TTL seconds."""
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(user_id)
+    if cached and cached[0] > now:
+        return cached[1]
+
+    items = get_memory_items(user_id)
+    for item in items:
+        embedding = item.pop("embedding")
+        item["vector"] = unpack_vectors(bytes(embedding), len(embedding) // 4)[0] if embedding else None
+    with _lock:
+        _cache[user_id] = (now + MEMORY_CACHE_TTL, items)
+    return items
+
+
+def invalidate(user_id):
+    """Forget a user's cached items, e.g. after they change."""
+    with _lock:
+        _cache.pop(user_id, None)
+
+
+def _store(user_id, message_id, facts):
+    """Embed the facts that are new or changed and write them."""
+    current = {item["key"]: item["content"] for item in _load(user_id)}
+    changed = [fact for fact in facts if current.get(fact["key"]) != fact["content"]]
+    if not changed:
+        return 0
+
+    from .vector_store import generate_embedding
+    vectors = generate_embedding([fact["content"] for fact in changed])
+    items = [dict(fact, embedding=pack_vectors([vector]), source_message_id=message_id)
+             for fact, vector in zip(changed, vectors)]
+    upsert_memory_items(user_id, items, MEMORY_MAX_ITEMS)
+    invalidate(user_id)
+    for item in items:
+        MEMORY_ITEMS_WRITTEN.labels(item["kind"]).inc()
+    return len(items)
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.error("memory update failed", exc_info=future.exception())
+
+
+def _submit(fn, *args):
+    _worker.submit(fn, *args).add_done_callback(_log_failure)
+
+
+def record_user_message(user_id, message_id, text):
+    """Extract facts from a user message and, if there are any, store them in the background."""
+    if MEMORY_MODE == "off":
+        return
+    facts = extract_facts(text)
+    if facts:
+        _submit(_store, user_id, message_id, facts)
+
+
+def _lookup(user_id, query_text, top_k, query_embedding=None):
+    """
+    Rank the user's memory items against a question.
+
+    Returns:
+        Tuple of (prompt section or "", similarity of the best ranked item or
+        None, the query's vector or None if it was not needed)
+    """
+    items = _load(user_id)
+    if not items:
+        MEMORY_LOOKUPS.labels("empty").inc()
+        return "", None, query_embedding
+
+    pinned = [item for item in items if item["kind"] in PINNED_KINDS]
+    ranked = [item for item in items if item["kind"] not in PINNED_KINDS and item["vector"] is not None]
+    chosen = []
+    if ranked and top_k:
+        if query_embedding is None:
+            from .vector_store import generate_embedding
+            query_embedding = generate_embedding(query_text)
+        with span("memory.rank", items=len(ranked)):
+            # MiniLM vectors are normalised, so the dot product is the cosine similarity
+            scored = sorted(((sum(a * b for a, b in zip(query_embedding, item["vector"])), item) for item in ranked),
+                            key=lambda pair: pair[0], reverse=True)
+        chosen = [(score, item) for score, item in scored[:top_k] if score >= MEMORY_MIN_SIMILARITY]
+
+    if not pinned and not chosen:
+        MEMORY_LOOKUPS.labels("miss").inc()
+        return "", None, query_embedding
+    MEMORY_LOOKUPS.labels("used").inc()
+    section = MEMORY_HEADER + "".join(f"- {item['content']}\n" for item in pinned + [item for _, item in chosen])
+    return section, (chosen[0][0] if chosen else None), query_embedding
+
+
+def get_memory_context(user_id, query_text, top_k=MEMORY_TOP_K, query_embedding=None):
+    """
+    The user's memory items relevant to a question, as a prompt section.
+
+    Pinned kinds (home, diet, companions, ...) are always included; the rest
+    are ranked by similarity to the question, best top_k kept.
+
+    Args:
+        query_embedding: The question's vector, if already computed
+
+    Returns:
+        The section, or "" if no item is pinned or relevant enough
+    """
+    return _lookup(user_id, query_text, top_k, query_embedding)[0]
+
+
+def get_context(user_id, query_text, chat_id=None, history_window=None, mode=MEMORY_MODE):
+    """
+    Context for a prompt from the user's memory and past messages, per MEMORY_MODE.
+
+    The question is embedded at most once: the vector computed to rank
+    memory items is reused by the dense retrieval leg.
+
+    Args:
+        user_id: The ID of the user
+        query_text: The current query text
+        chat_id: The chat being answered in, passed on to get_chat_context
+        history_window: The history already in the prompt, passed on to get_chat_context
+        mode: "ahead", "replace" or "off"
+
+    Returns:
+        A formatted string, NO_CONTEXT if there is nothing relevant
+    """
+    if mode not in MODES:
+        raise ValueError(f"Unknown memory mode: {mode}")
+    memory, best, query_embedding = "", None, None
+    if mode != "off":
+        memory, best, query_embedding = _lookup(user_id, query_text, MEMORY_TOP_K)
+    if memory and (mode == "replace" or (best is not None and best >= MEMORY_ANSWER_SIMILARITY)):
+        if mode == "ahead":
+            RAW_RETRIEVAL_SKIPPED.inc()
+        return memory
+
+    from .vector_store import get_chat_context
+    context = get_chat_context(user_id, query_text, chat_id=chat_id, history_window=history_window,
+                               query_embedding=query_embedding)
+    if not memory:
+        return context
+    return memory if context == NO_CONTEXT else f"{memory}\n{context}"
+
+
+def backfill_user(username, page_size=500):
+    """
+    Build a user's memory from their whole history, archived chats included.
+
+    Returns:
+        The number of items written
+    """
+    user = get_user_for_export(username)
+    if user is None:
+        raise ValueError(f"Unknown user: {username}")
+    user_id = user["id"]
+    _, max_message_id = get_user_max_ids(user_id)
+
+    # Newest mention of each key wins, whichever database it was read from
+    latest = {}
+
+    def scan(messages):
+        for msg in messages:
+            if not msg["is_user"]:
+                continue
+            for fact in extract_facts(msg["content"]):
+                if fact["key"] not in latest or latest[fact["key"]][0] < msg["id"]:
+                    latest[fact["key"]] = (msg["id"], fact)
+
+    last_id = 0
+    while True:
+        messages = get_user_messages_page(user_id, last_id, max_message_id, page_size)
+        if not messages:
+            break
+        scan(messages)
+        last_id = messages[-1]["id"]
+    last_id = 0
+    while True:
+        messages = get_archived_messages_page(user_id, last_id, page_size)
+        if not messages:
+            break
+        scan(messages)
+        last_id = messages[-1]["id"]
+
+    written = 0
+    # Oldest first, so when over MEMORY_MAX_ITEMS the most recent mentions are the ones kept
+    for message_id, fact in sorted(latest.values(), key=lambda pair: pair[0]):
+        written += _store(user_id, message_id, [fact])
+    return written
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-user memory of facts and preferences")
+    parser.add_argument("command", choices=["backfill", "show", "forget", "check"])
+    parser.add_argument("username", nargs="?")
+    args = parser.parse_args()
+
+    if args.command == "check":
+        failures = check_extraction()
+        for message, expected, found in failures:
+            print(f"FAIL {message!r}: expected {sorted(expected)}, found {sorted(found)}")
+        print(f"{len(EXTRACTION_CHECKS) - len(failures)}/{len(EXTRACTION_CHECKS)} extraction checks passed")
+        raise SystemExit(1 if failures else 0)
+    if not args.username:
+        parser.error(f"{args.command} needs a username")
+
+    user = get_user_for_export(args.username)
+    if user is None:
+        raise SystemExit(f"Unknown user: {args.username}")
+    if args.command == "backfill":
+        print(f"{backfill_user(args.username)} items written")
+    elif args.command == "show":
+        for item in get_memory_items(user["id"]):
+            print(f"{item['updated_at']}  {item['key']:<30}  {item['content']}")
+    else:
+        delete_memory_items(user["id"])
+        print("memory deleted")
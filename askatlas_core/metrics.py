@@ -0,0 +1,287 @@
+import os
+import time
+import bisect
+import logging
+import weakref
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+# Local scrape endpoint started by start_metrics_server; 0 disables it
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Latency buckets in seconds, from a fast SQLite read up to a slow LLM answer
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+# Reentrant, as a dead thread's cell may be retired by a finalizer on a thread holding it
+_lock = threading.RLock()
+_registry = {}
+_server = None
+
+
+class _Owner:
+    """Held only by a thread's locals, so it is freed when the thread exits."""
+    __slots__ = ("__weakref__",)
+
+
+class _Child:
+    """
+    One labelled series. Each thread writes to its own cell, so recording
+    never takes a lock; cells are only summed when the endpoint is scraped.
+    When a thread exits its cell is folded into a base total and dropped,
+    so Streamlit's thread per rerun does not grow the series.
+    """
+
+    def __init__(self, size):
+        self._size = size
+        self._local = threading.local()
+        self._cells = []
+        self._base = [0] * size
+
+    def _cell(self):
+        cell = [0] * self._size
+        owner = _Owner()
+        with _lock:
+            self._cells.append(cell)
+        weakref.finalize(owner, self._retire, cell)
+        self._local.owner = owner
+        self._local.cell = cell
+        return cell
+
+    def _retire(self, cell):
+        with _lock:
+            # By identity: another thread's cell may hold equal values
+            self._cells = [c for c in self._cells if c is not cell]
+            self._base = [a + b for a, b in zip(self._base, cell)]
+
+    def _sum(self):
+        with _lock:
+            cells = [self._base] + self._cells
+        return [sum(values) for values in zip(*cells)]
+
+
+class _CounterChild(_Child):
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount=1):
+        cell = getattr(self._local, "cell", None) or self._cell()
+        cell[0] += amount
+
+
+class _HistogramChild(_Child):
+    def __init__(self, buckets):
+        # One count per bucket plus +Inf, then the sum of observations
+        super().__init__(len(buckets) + 2)
+        self._buckets = buckets
+
+    def observe(self, value):
+        cell = getattr(self._local, "cell", None) or self._cell()
+        cell[bisect.bisect_left(self._buckets, value)] += 1
+        cell[-1] += value
+
+    def time(self):
+        return _Timer(self)
+
+
+class _Timer:
+    def __init__(self, child):
+        self._child = child
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._child.observe(time.perf_counter() - self._started)
+        return False
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        if not self.labelnames:
+            self._default = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *labelvalues):
+        """The series for these label values, created on first use."""
+        child = self._children.get(labelvalues)
+        if child is None:
+            if len(labelvalues) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}")
+            with _lock:
+                child = self._children.setdefault(labelvalues, self._new_child())
+        return child
+
+    def _label_text(self, labelvalues, extra=()):
+        pairs = list(zip(self.labelnames, labelvalues)) + list(extra)
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+    def render(self):
+        lines = self._header()
+        for labelvalues, child in sorted(self._children.items()):
+            lines.append(f"{self.name}{self._label_text(labelvalues)} {_number(child._sum()[0])}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def time(self):
+        return self._default.time()
+
+    def render(self):
+        lines = self._header()
+        for labelvalues, child in sorted(self._children.items()):
+            values = child._sum()
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values[:-1]):
+                cumulative += count
+                le = (("le", bound if bound == "+Inf" else _number(bound)),)
+                lines.append(f"{self.name}_bucket{self._label_text(labelvalues, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._label_text(labelvalues)} {_number(values[-1])}")
+            lines.append(f"{self.name}_count{self._label_text(labelvalues)} {cumulative}")
+        return lines
+
+
+class Gauge(_Metric):
+    """A value read when scraped, from a callable (e.g. the size of a cache)."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, function):
+        self._function = function
+        super().__init__(name, documentation)
+
+    def _new_child(self):
+        return None
+
+    def render(self):
+        try:
+            value = self._function()
+        except Exception as e:
+            logger.warning("Gauge %s failed: %s", self.name, e)
+            return []
+        return self._header() + [f"{self.name} {_number(value)}"]
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _register(metric):
+    with _lock:
+        existing = _registry.get(metric.name)
+        if existing is not None:
+            return existing
+        _registry[metric.name] = metric
+        return metric
+
+
+def counter(name, documentation, labelnames=()):
+    """Register (or return the already registered) counter."""
+    return _register(Counter(name, documentation, labelnames))
+
+
+def histogram(name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+    """Register (or return the already registered) histogram."""
+    return _register(Histogram(name, documentation, labelnames, buckets))
+
+
+def gauge(name, documentation, function):
+    """Register a gauge whose value is computed by function() at scrape time."""
+    return _register(Gauge(name, documentation, function))
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    with _lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port=METRICS_PORT, host=METRICS_HOST):
+    """
+    Serve /metrics on a background thread, once per process.
+
+    Safe to call on every Streamlit rerun. If the port is taken (another
+    app process already serves it) the endpoint is skipped with a warning.
+
+    Returns:
+        The bound port, or None if the endpoint is disabled or unavailable
+    """
+    global _server
+    if not port:
+        return None
+    with _lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                logger.warning("Metrics endpoint not started on %s:%s: %s", host, port, e)
+                _server = False
+                return None
+            _server.daemon_threads = True
+            threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server.server_address[1] if _server else None
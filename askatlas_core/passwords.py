@@ -0,0 +1,48 @@
+import os
+import threading
+import bcrypt
+from concurrent.futures import ThreadPoolExecutor
+
+# bcrypt cost factor for new hashes; existing hashes keep the cost they were made with
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+# Threads dedicated to hashing; bcrypt releases the GIL, so these run in parallel
+BCRYPT_WORKERS = int(os.getenv("BCRYPT_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Hash jobs allowed to wait for a worker before new ones are rejected
+BCRYPT_MAX_PENDING = int(os.getenv("BCRYPT_MAX_PENDING", str(BCRYPT_WORKERS * 8)))
+
+_executor = ThreadPoolExecutor(max_workers=BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+_slots = threading.BoundedSemaphore(BCRYPT_WORKERS + BCRYPT_MAX_PENDING)
+
+
+class PasswordPoolBusy(Exception):
+    """Raised when the hashing pool is saturated and the request is shed."""
+
+
+def _run(fn, *args):
+    """Run fn on the hashing pool, failing fast instead of queueing without bound."""
+    if not _slots.acquire(blocking=False):
+        raise PasswordPoolBusy("password hashing pool is saturated")
+    try:
+        return _executor.submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+
+def _hash(password):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode('utf-8')
+
+
+def _check(password, password_hash):
+    return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+
+
+def hash_password(password):
+    """Hash a password on the bcrypt pool."""
+    return _run(_hash, password)
+
+
+def check_password(password, password_hash):
+    """Check a password against a stored hash on the bcrypt pool."""
+    return _run(_check, password, password_hash)
@@ -0,0 +1,915 @@
+"""
+PostgreSQL storage backend: one database shared by any number of app replicas.
+
+Each process keeps a psycopg connection pool (POSTGRES_POOL_MIN to
+POSTGRES_POOL_MAX connections), and every call borrows a connection for one
+short transaction. Full chat histories are streamed through server-side
+cursors, so a long chat is never buffered in the server's result set or
+held twice in the client. Archived chats live in archived_messages in the
+same database.
+
+Needs the postgres extra: pip install askatlas-core[postgres]
+"""
+try:
+    from psycopg import sql
+    from psycopg.rows import dict_row, tuple_row
+    from psycopg_pool import ConnectionPool
+except ImportError:
+    raise ImportError("STORAGE_BACKEND=postgres needs the postgres extra: pip install askatlas-core[postgres]") from None
+
+from .config import POSTGRES_DSN, POSTGRES_POOL_MIN, POSTGRES_POOL_MAX
+from .passwords import hash_password, check_password
+from .repository import Repository, Message, instrumented, split_chat_title, search_terms
+
+# Rows fetched per round trip from a server-side cursor
+CURSOR_ITERSIZE = 500
+
+# Same wait as the SQLite backend's busy timeout before a lock error is raised
+LOCK_TIMEOUT = "10s"
+
+# Serialises schema creation between replicas starting at the same time
+SCHEMA_LOCK_KEY = 0x41736B41
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        username TEXT UNIQUE NOT NULL,
+        email TEXT UNIQUE NOT NULL,
+        password_hash TEXT NOT NULL,
+        created_at TIMESTAMP(0) NOT NULL DEFAULT (now() AT TIME ZONE 'utc')
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS chats (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        user_id BIGINT NOT NULL REFERENCES users (id),
+        title TEXT DEFAULT 'New Chat',
+        created_at TIMESTAMP(0) NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+        archived_at TIMESTAMP(0),
+        archived_message_count INTEGER
+    )
+    """,
+    # content_tsv replaces the SQLite FTS5 table; being generated, it needs no triggers
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        chat_id BIGINT NOT NULL REFERENCES chats (id),
+        user_id BIGINT NOT NULL REFERENCES users (id),
+        is_user BOOLEAN NOT NULL,
+        content TEXT NOT NULL,
+        timestamp TIMESTAMP(0) NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+        vector_id TEXT,
+        content_tsv TSVECTOR GENERATED ALWAYS AS (to_tsvector('simple', content)) STORED
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_messages_user_id ON messages (user_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_messages_chat_id ON messages (chat_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_messages_content_tsv ON messages USING GIN (content_tsv)",
+    "CREATE INDEX IF NOT EXISTS idx_chats_user_title ON chats (user_id, title)",
+    # Next free "(n)" suffix per user and base title, so create_chat never probes
+    """
+    CREATE TABLE IF NOT EXISTS chat_title_counters (
+        user_id BIGINT NOT NULL,
+        base_title TEXT NOT NULL,
+        next_suffix INTEGER NOT NULL,
+        PRIMARY KEY (user_id, base_title)
+    )
+    """,
+    # Denylist of revoked session tokens, by their 8-byte token id
+    """
+    CREATE TABLE IF NOT EXISTS revoked_tokens (
+        token_id BYTEA PRIMARY KEY,
+        expires_at BIGINT NOT NULL
+    )
+    """,
+    # Corpus-level document frequencies for auto-titling
+    """
+    CREATE TABLE IF NOT EXISTS term_document_frequency (
+        term TEXT PRIMARY KEY,
+        df BIGINT NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS corpus_stats (
+        name TEXT PRIMARY KEY,
+        value BIGINT NOT NULL
+    )
+    """,
+    # Messages of chats the retention job archived, keeping their ids and embeddings
+    """
+    CREATE TABLE IF NOT EXISTS archived_messages (
+        id BIGINT PRIMARY KEY,
+        chat_id BIGINT NOT NULL,
+        user_id BIGINT NOT NULL,
+        is_user BOOLEAN NOT NULL,
+        content TEXT NOT NULL,
+        timestamp TIMESTAMP(0),
+        vector_id TEXT,
+        embedding BYTEA
+    )
+    """,
+    # Facts and preferences distilled from each user's messages, one row per key
+    """
+    CREATE TABLE IF NOT EXISTS user_memory (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        user_id BIGINT NOT NULL REFERENCES users (id),
+        kind TEXT NOT NULL,
+        key TEXT NOT NULL,
+        content TEXT NOT NULL,
+        embedding BYTEA,
+        source_message_id BIGINT,
+        updated_at TIMESTAMP(0) NOT NULL DEFAULT (now() AT TIME ZONE 'utc'),
+        UNIQUE (user_id, key)
+    )
+    """,
+    # Queries asked of a persona (namespace), how often, and their pre-generated answers
+    """
+    CREATE TABLE IF NOT EXISTS answer_cache (
+        id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        namespace TEXT NOT NULL,
+        query_key TEXT NOT NULL,
+        query TEXT NOT NULL,
+        hits BIGINT NOT NULL DEFAULT 0,
+        answer TEXT,
+        embedding BYTEA,
+        last_asked_at TIMESTAMP(0) DEFAULT (now() AT TIME ZONE 'utc'),
+        refreshed_at TIMESTAMP(0),
+        UNIQUE (namespace, query_key)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_answer_cache_hits ON answer_cache (namespace, hits)",
+    "CREATE INDEX IF NOT EXISTS idx_archived_chat_id ON archived_messages (chat_id, id)",
+    "CREATE INDEX IF NOT EXISTS idx_archived_user_id ON archived_messages (user_id, id)",
+]
+
+
+def build_tsquery(text):
+    """Turn free text into a to_tsquery expression that ORs its quoted terms."""
+    return " | ".join(f"'{term}'" for term in search_terms(text))
+
+
+class PostgresRepository(Repository):
+    name = "postgres"
+
+    def __init__(self, dsn=POSTGRES_DSN, min_size=POSTGRES_POOL_MIN, max_size=POSTGRES_POOL_MAX, schema=None):
+        """
+        Args:
+            dsn: libpq connection string or URI
+            min_size: Connections the pool keeps open
+            max_size: Most connections the pool opens
+            schema: Keep the tables in this schema instead of the default
+                search path, created if missing
+        """
+        self.schema = schema
+        options = f"-c lock_timeout={LOCK_TIMEOUT}"
+        if schema:
+            options += f" -c search_path={schema}"
+        self.pool = ConnectionPool(
+            dsn, min_size=min_size, max_size=max_size, name="askatlas", open=True,
+            kwargs={"row_factory": dict_row, "options": options},
+            check=ConnectionPool.check_connection,
+        )
+        self.init_db()
+        self.ensure_default_admin()
+
+    def connect(self):
+        """Borrow a pooled connection; use as a context manager, which commits on exit."""
+        return self.pool.connection()
+
+    def close(self):
+        """Close the pool's connections."""
+        self.pool.close()
+
+    def ping(self):
+        """Run a trivial query, raising if the database is unreachable."""
+        with self.connect() as conn:
+            conn.execute("SELECT 1")
+
+    def init_db(self):
+        """Create the schema if it does not exist."""
+        with self.connect() as conn:
+            conn.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_LOCK_KEY,))
+            if self.schema:
+                conn.execute(sql.SQL("CREATE SCHEMA IF NOT EXISTS {}").format(sql.Identifier(self.schema)))
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    def create_user(self, username, email, password):
+        """Create a new user in the database."""
+        # Hash the password (on the bcrypt pool) before borrowing a connection
+        password_hash = hash_password(password)
+
+        with self.connect() as conn:
+            row = conn.execute("""
+                INSERT INTO users (username, email, password_hash) VALUES (%s, %s, %s)
+                ON CONFLICT DO NOTHING
+                RETURNING id
+            """, (username, email, password_hash)).fetchone()
+
+        return row["id"] if row else None
+
+    def verify_user(self, username, password):
+        """Verify user credentials and return user_id if valid."""
+        with self.connect() as conn:
+            user = conn.execute(
+                "SELECT id, password_hash FROM users WHERE username = %s", (username,)).fetchone()
+
+        if user and check_password(password, user["password_hash"]):
+            return user["id"]
+        return None
+
+    def get_user_by_id(self, user_id):
+        """Get user details by ID."""
+        with self.connect() as conn:
+            return conn.execute(
+                "SELECT id, username, email, created_at::text AS created_at FROM users WHERE id = %s",
+                (user_id,)
+            ).fetchone()
+
+    def get_or_create_service_user(self, username):
+        """
+        Get the id of an account that owns app-level data, creating it if needed.
+
+        Service accounts have no usable password, so they cannot log in.
+        """
+        with self.connect() as conn:
+            conn.execute("""
+                INSERT INTO users (username, email, password_hash) VALUES (%s, %s, '!')
+                ON CONFLICT DO NOTHING
+            """, (username, f"{username}@localhost"))
+            return conn.execute("SELECT id FROM users WHERE username = %s", (username,)).fetchone()["id"]
+
+    def ensure_default_admin(self):
+        """Ensure an admin user with username=admin and password=admin exists."""
+        with self.connect() as conn:
+            if conn.execute("SELECT id FROM users WHERE username = 'admin'").fetchone():
+                return
+        self.create_user("admin", "admin@example.com", "admin")
+
+    def revoke_token_id(self, token_id, expires_at):
+        """Record a revoked session token id and purge entries that have expired."""
+        with self.connect() as conn:
+            conn.execute("""
+                INSERT INTO revoked_tokens (token_id, expires_at) VALUES (%s, %s)
+                ON CONFLICT (token_id) DO UPDATE SET expires_at = excluded.expires_at
+            """, (token_id, expires_at))
+            conn.execute("DELETE FROM revoked_tokens WHERE expires_at <= extract(epoch FROM now())")
+
+    def get_revoked_token_ids(self, now):
+        """Get revoked token ids that have not expired yet, mapped to their expiry."""
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT token_id, expires_at FROM revoked_tokens WHERE expires_at > %s", (now,)).fetchall()
+
+        return {bytes(row["token_id"]): row["expires_at"] for row in rows}
+
+    def _unique_title(self, conn, user_id, title):
+        """
+        Allocate a title no other chat of the user has, with a single upsert.
+
+        Suffixes for a base title only ever increase, so a requested "Base (5)"
+        keeps its suffix unless a higher one was already handed out.
+        """
+        base_title, suffix = split_chat_title(title or "New Chat")
+        suffix = conn.execute("""
+            INSERT INTO chat_title_counters (user_id, base_title, next_suffix)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (user_id, base_title)
+            DO UPDATE SET next_suffix = GREATEST(chat_title_counters.next_suffix, excluded.next_suffix - 1) + 1
+            RETURNING next_suffix
+        """, (user_id, base_title, suffix + 1)).fetchone()["next_suffix"] - 1
+        return f"{base_title} ({suffix})" if suffix else base_title
+
+    @instrumented("create_chat")
+    def create_chat(self, user_id, title=None):
+        """Create a new chat for a user with a unique title."""
+        with self.connect() as conn:
+            unique_title = self._unique_title(conn, user_id, title)
+            return conn.execute(
+                "INSERT INTO chats (user_id, title) VALUES (%s, %s) RETURNING id",
+                (user_id, unique_title)
+            ).fetchone()["id"]
+
+    def delete_chat(self, chat_id):
+        """Delete a chat, its messages and any archived copy of them."""
+        with self.connect() as conn:
+            conn.execute("DELETE FROM messages WHERE chat_id = %s", (chat_id,))
+            conn.execute("DELETE FROM archived_messages WHERE chat_id = %s", (chat_id,))
+            conn.execute("DELETE FROM chats WHERE id = %s", (chat_id,))
+
+    def update_chat_title(self, chat_id, title):
+        """Rename a chat, adding a "(n)" suffix if another chat of the user has the title."""
+        with self.connect() as conn:
+            chat = conn.execute("SELECT user_id, title FROM chats WHERE id = %s", (chat_id,)).fetchone()
+            if chat and chat["title"] != title:
+                conn.execute("UPDATE chats SET title = %s WHERE id = %s",
+                             (self._unique_title(conn, chat["user_id"], title), chat_id))
+
+    @instrumented("get_user_chats")
+    def get_user_chats(self, user_id):
+        """Get all chats for a user."""
+        with self.connect() as conn:
+            return conn.execute("""
+                SELECT c.id, c.title, c.created_at::text AS created_at, c.archived_at IS NOT NULL AS archived,
+                       CASE WHEN c.archived_at IS NULL
+                            THEN (SELECT COUNT(*) FROM messages WHERE chat_id = c.id)
+                            ELSE c.archived_message_count END AS message_count
+                FROM chats c
+                WHERE c.user_id = %s
+                ORDER BY c.created_at DESC, c.id DESC
+            """, (user_id,)).fetchall()
+
+    @instrumented("get_chat_titles")
+    def get_chat_titles(self, user_id, limit=100):
+        """Get [id, title] pairs for a user's most recent chats, without message counts."""
+        with self.connect() as conn:
+            rows = conn.execute(
+                "SELECT id, title FROM chats WHERE user_id = %s ORDER BY id DESC LIMIT %s",
+                (user_id, limit)
+            ).fetchall()
+
+        return [[row["id"], row["title"]] for row in rows]
+
+    @instrumented("save_message")
+    def save_message(self, chat_id, user_id, content, is_user=True, vector_id=None):
+        """Save a message to the database."""
+        with self.connect() as conn:
+            return conn.execute(
+                "INSERT INTO messages (chat_id, user_id, content, is_user, vector_id) "
+                "VALUES (%s, %s, %s, %s, %s) RETURNING id",
+                (chat_id, user_id, content, bool(is_user), vector_id)
+            ).fetchone()["id"]
+
+    @instrumented("get_chat_messages")
+    def get_chat_messages(self, chat_id, after_id=None, before_id=None, limit=None):
+        """
+        Get the messages of a chat, oldest first, rehydrating it if archived.
+
+        A bounded page is a plain query; a full history is read through a
+        server-side cursor, CURSOR_ITERSIZE rows per round trip.
+
+        Args:
+            chat_id: The ID of the chat
+            after_id: Only return messages with a higher ID
+            before_id: Only return messages with a lower ID
+            limit: Only return the most recent `limit` of the matching messages
+
+        Returns:
+            List of Message records
+        """
+        conditions = ["chat_id = %s"]
+        params = [chat_id]
+        if after_id is not None:
+            conditions.append("id > %s")
+            params.append(after_id)
+        if before_id is not None:
+            conditions.append("id < %s")
+            params.append(before_id)
+
+        query = f"""
+            SELECT id, is_user, content, timestamp, vector_id
+            FROM messages
+            WHERE {" AND ".join(conditions)}
+        """
+
+        if after_id is None:
+            # Opening an archived chat brings its messages back first
+            with self.connect() as conn:
+                chat = conn.execute("SELECT archived_at FROM chats WHERE id = %s", (chat_id,)).fetchone()
+            if chat and chat["archived_at"]:
+                from .retention import rehydrate_chat
+                rehydrate_chat(chat_id, self)
+
+        with self.connect() as conn:
+            if limit is not None:
+                cursor = conn.cursor(row_factory=tuple_row)
+                cursor.execute(query + " ORDER BY id DESC LIMIT %s", params + [limit])
+                messages = [Message.from_row(row) for row in cursor]
+                messages.reverse()
+                return messages
+
+            with conn.cursor(name=f"chat_messages_{chat_id}", row_factory=tuple_row) as cursor:
+                cursor.itersize = CURSOR_ITERSIZE
+                cursor.execute(query + " ORDER BY id", params)
+                return [Message.from_row(row) for row in cursor]
+
+    def get_all_user_messages(self, user_id):
+        """Get all messages across all chats for a user, streamed through a server-side cursor."""
+        with self.connect() as conn:
+            with conn.cursor(name=f"user_messages_{user_id}") as cursor:
+                cursor.itersize = CURSOR_ITERSIZE
+                cursor.execute("""
+                    SELECT m.id, m.chat_id, m.content, m.is_user, m.timestamp::text AS timestamp, m.vector_id
+                    FROM messages m
+                    JOIN chats c ON m.chat_id = c.id
+                    WHERE c.user_id = %s
+                    ORDER BY m.timestamp, m.id
+                """, (user_id,))
+                return list(cursor)
+
+    @instrumented("search_messages_fts")
+    def search_messages_fts(self, user_id, query_text, limit=10, chat_ids=None, history_window=None):
+        """
+        Lexical search over a user's messages using the GIN-indexed tsvector.
+
+        Args:
+            user_id: The ID of the user whose messages to search
+            query_text: Free text; every word is matched as a separate term
+            limit: Maximum number of results to return
+            chat_ids: Only search these chats (None for all of them)
+            history_window: (chat_id, first message id) of the history already
+                in the prompt; those messages are skipped
+
+        Returns:
+            List of message dicts ordered by relevance (best first); the
+            score is the negated ts_rank, so lower is better as with BM25
+        """
+        tsquery = build_tsquery(query_text)
+        if not tsquery:
+            return []
+
+        conditions = ["m.content_tsv @@ q", "m.user_id = %s"]
+        params = [tsquery, user_id]
+        if chat_ids is not None:
+            conditions.append("m.chat_id = ANY(%s)")
+            params.append(list(chat_ids))
+        if history_window is not None:
+            conditions.append("NOT (m.chat_id = %s AND m.id >= %s)")
+            params.extend(history_window)
+
+        with self.connect() as conn:
+            return conn.execute(f"""
+                SELECT m.id AS message_id, m.chat_id, m.is_user, m.content,
+                       -ts_rank(m.content_tsv, q) AS score
+                FROM messages m, to_tsquery('simple', %s) q
+                WHERE {" AND ".join(conditions)}
+                ORDER BY score, m.id
+                LIMIT %s
+            """, params + [limit]).fetchall()
+
+    @instrumented("get_messages_by_ids")
+    def get_messages_by_ids(self, message_ids):
+        """
+        Fetch several messages in one query.
+
+        Args:
+            message_ids: Iterable of message IDs
+
+        Returns:
+            Dict mapping message ID to message dict; unknown IDs are omitted
+        """
+        message_ids = list(message_ids)
+        if not message_ids:
+            return {}
+
+        with self.connect() as conn:
+            rows = conn.execute("""
+                SELECT id, chat_id, is_user, content, timestamp::text AS timestamp
+                FROM messages
+                WHERE id = ANY(%s)
+            """, (message_ids,)).fetchall()
+
+        return {row["id"]: row for row in rows}
+
+    @instrumented("count_user_chats_with_messages")
+    def count_user_chats_with_messages(self, user_id):
+        """Count how many of a user's chats contain at least one message, archived chats included."""
+        with self.connect() as conn:
+            return conn.execute("""
+                SELECT COUNT(*) AS count FROM chats c
+                WHERE c.user_id = %s
+                  AND (c.archived_message_count > 0
+                       OR EXISTS (SELECT 1 FROM messages m WHERE m.chat_id = c.id))
+            """, (user_id,)).fetchone()["count"]
+
+    @instrumented("update_message_vector_id")
+    def update_message_vector_id(self, message_id, vector_id):
+        """Update the vector_id for a message."""
+        with self.connect() as conn:
+            conn.execute("UPDATE messages SET vector_id = %s WHERE id = %s", (vector_id, message_id))
+
+    def update_message_vector_ids(self, pairs):
+        """Set vector_id for many messages; pairs are (message_id, vector_id)."""
+        rows = [(vector_id, message_id) for message_id, vector_id in pairs]
+        if not rows:
+            return
+        with self.connect() as conn:
+            conn.cursor().executemany("UPDATE messages SET vector_id = %s WHERE id = %s", rows)
+
+    def add_document_terms(self, documents):
+        """
+        Count each document's distinct terms into the corpus document frequencies.
+
+        Args:
+            documents: List of term lists, one per document
+        """
+        counts = {}
+        for terms in documents:
+            for term in set(terms):
+                counts[term] = counts.get(term, 0) + 1
+
+        with self.connect() as conn:
+            # Sorted, so two replicas updating overlapping terms lock rows in the same order
+            conn.cursor().executemany("""
+                INSERT INTO term_document_frequency (term, df) VALUES (%s, %s)
+                ON CONFLICT (term) DO UPDATE SET df = term_document_frequency.df + excluded.df
+            """, sorted(counts.items()))
+            conn.execute("""
+                INSERT INTO corpus_stats (name, value) VALUES ('documents', %s)
+                ON CONFLICT (name) DO UPDATE SET value = corpus_stats.value + excluded.value
+            """, (len(documents),))
+
+    def get_document_frequencies(self, terms):
+        """Return (number of documents, {term: df}) for the given terms."""
+        terms = list(terms)
+        with self.connect() as conn:
+            row = conn.execute("SELECT value FROM corpus_stats WHERE name = 'documents'").fetchone()
+            frequencies = {}
+            if terms:
+                rows = conn.execute(
+                    "SELECT term, df FROM term_document_frequency WHERE term = ANY(%s)", (terms,)).fetchall()
+                frequencies = {r["term"]: r["df"] for r in rows}
+
+        return (row["value"] if row else 0), frequencies
+
+    def get_max_message_id(self):
+        """Get the highest message id, or 0 if there are no messages."""
+        with self.connect() as conn:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) AS max_id FROM messages").fetchone()["max_id"]
+
+    def iter_message_contents(self, max_id, batch_size=500):
+        """
+        Yield batches of message contents up to max_id, in id order, without loading them all.
+
+        Keyset pages rather than a cursor, so a slow consumer does not hold
+        a transaction (and back vacuum up) for the whole scan.
+        """
+        last_id = 0
+        while True:
+            with self.connect() as conn:
+                rows = conn.execute(
+                    "SELECT id, content FROM messages WHERE id > %s AND id <= %s ORDER BY id LIMIT %s",
+                    (last_id, max_id, batch_size)
+                ).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1]["id"]
+            yield [r["content"] for r in rows]
+
+    def get_memory_items(self, user_id):
+        """Get a user's memory items, most recently updated first."""
+        with self.connect() as conn:
+            return conn.execute("""
+                SELECT id, kind, key, content, embedding, source_message_id, updated_at::text AS updated_at
+                FROM user_memory
+                WHERE user_id = %s
+                ORDER BY updated_at DESC, id DESC
+            """, (user_id,)).fetchall()
+
+    def upsert_memory_items(self, user_id, items, max_items):
+        """
+        Insert or replace memory items by key, keeping the user's newest `max_items`.
+
+        Args:
+            user_id: The ID of the user the items describe
+            items: Dicts with kind, key, content, embedding and source_message_id
+            max_items: Items kept per user; the least recently updated go first
+        """
+        with self.connect() as conn:
+            if items:
+                conn.cursor().executemany("""
+                    INSERT INTO user_memory (user_id, kind, key, content, embedding, source_message_id, updated_at)
+                    VALUES (%(user_id)s, %(kind)s, %(key)s, %(content)s, %(embedding)s, %(source_message_id)s,
+                            now() AT TIME ZONE 'utc')
+                    ON CONFLICT (user_id, key) DO UPDATE SET
+                        -- A new id orders writes made within the same second
+                        id = DEFAULT, kind = excluded.kind, content = excluded.content, embedding = excluded.embedding,
+                        source_message_id = excluded.source_message_id, updated_at = excluded.updated_at
+                """, [dict(item, user_id=user_id) for item in items])
+            conn.execute("""
+                DELETE FROM user_memory
+                WHERE user_id = %s AND id NOT IN (
+                    SELECT id FROM user_memory WHERE user_id = %s ORDER BY updated_at DESC, id DESC LIMIT %s
+                )
+            """, (user_id, user_id, max_items))
+
+    def delete_memory_items(self, user_id, keys=None):
+        """Delete the user's memory items with these keys, or all of them."""
+        with self.connect() as conn:
+            if keys is None:
+                conn.execute("DELETE FROM user_memory WHERE user_id = %s", (user_id,))
+            else:
+                conn.execute("DELETE FROM user_memory WHERE user_id = %s AND key = ANY(%s)", (user_id, list(keys)))
+
+    def record_cache_queries(self, namespace, queries):
+        """Count one ask of each (query_key, query) pair."""
+        with self.connect() as conn:
+            conn.cursor().executemany("""
+                INSERT INTO answer_cache (namespace, query_key, query, hits, last_asked_at)
+                VALUES (%s, %s, %s, 1, now() AT TIME ZONE 'utc')
+                ON CONFLICT (namespace, query_key) DO UPDATE SET
+                    hits = answer_cache.hits + 1, last_asked_at = excluded.last_asked_at
+            """, [(namespace, key, query) for key, query in queries])
+
+    def get_frequent_queries(self, namespace, limit, min_hits=1):
+        """Get the most asked queries of a namespace, answered or not."""
+        with self.connect() as conn:
+            return conn.execute("""
+                SELECT query_key, query, hits, refreshed_at::text AS refreshed_at
+                FROM answer_cache
+                WHERE namespace = %s AND hits >= %s
+                ORDER BY hits DESC, id
+                LIMIT %s
+            """, (namespace, min_hits, limit)).fetchall()
+
+    def get_cached_answers(self, namespace):
+        """Get every answered query of a namespace."""
+        with self.connect() as conn:
+            return conn.execute("""
+                SELECT query_key, query, answer, embedding, refreshed_at::text AS refreshed_at
+                FROM answer_cache
+                WHERE namespace = %s AND answer IS NOT NULL
+            """, (namespace,)).fetchall()
+
+    def save_cached_answers(self, namespace, entries):
+        """
+        Store generated answers, keeping the ask counts of queries already recorded.
+
+        Args:
+            namespace: The persona the answers were generated for
+            entries: Dicts with query_key, query, answer and embedding
+        """
+        with self.connect() as conn:
+            conn.cursor().executemany("""
+                INSERT INTO answer_cache (namespace, query_key, query, answer, embedding, refreshed_at)
+                VALUES (%(namespace)s, %(query_key)s, %(query)s, %(answer)s, %(embedding)s,
+                        now() AT TIME ZONE 'utc')
+                ON CONFLICT (namespace, query_key) DO UPDATE SET
+                    answer = excluded.answer, embedding = excluded.embedding, refreshed_at = excluded.refreshed_at
+            """, [dict(entry, namespace=namespace) for entry in entries])
+
+    def prune_answer_cache(self, days):
+        """Delete cached queries not asked for in `days`, returning how many were deleted."""
+        with self.connect() as conn:
+            return conn.execute("""
+                DELETE FROM answer_cache
+                WHERE last_asked_at < (now() AT TIME ZONE 'utc') - make_interval(days => %s)
+            """, (int(days),)).rowcount
+
+    def get_user_for_export(self, username):
+        """Get a user's full row, password hash included, or None."""
+        with self.connect() as conn:
+            return conn.execute("""
+                SELECT id, username, email, password_hash, created_at::text AS created_at
+                FROM users WHERE username = %s
+            """, (username,)).fetchone()
+
+    def get_user_chats_page(self, user_id, after_id, max_id, limit):
+        """Get up to `limit` of a user's chats with after_id < id <= max_id, in id order."""
+        with self.connect() as conn:
+            return conn.execute("""
+                SELECT id, title, created_at::text AS created_at, archived_at::text AS archived_at
+                FROM chats
+                WHERE user_id = %s AND id > %s AND id <= %s
+                ORDER BY id
+                LIMIT %s
+            """, (user_id, after_id, max_id, limit)).fetchall()
+
+    def get_user_messages_page(self, user_id, after_id, max_id, limit):
+        """Get up to `limit` of a user's messages with after_id < id <= max_id, in id order."""
+        with self.connect() as conn:
+            return conn.execute("""
+                SELECT id, chat_id, is_user, content, timestamp::text AS timestamp, vector_id
+                FROM messages
+                WHERE user_id = %s AND id > %s AND id <= %s
+                ORDER BY id
+                LIMIT %s
+            """, (user_id, after_id, max_id, limit)).fetchall()
+
+    def get_user_max_ids(self, user_id):
+        """Get the highest chat id and message id of a user, 0 where there are none."""
+        with self.connect() as conn:
+            row = conn.execute("""
+                SELECT (SELECT COALESCE(MAX(id), 0) FROM chats WHERE user_id = %s) AS max_chat_id,
+                       (SELECT COALESCE(MAX(id), 0) FROM messages WHERE user_id = %s) AS max_message_id
+            """, (user_id, user_id)).fetchone()
+
+        return row["max_chat_id"], row["max_message_id"]
+
+    def import_user(self, username, email, password_hash, created_at):
+        """Insert a user exactly as exported, or return None if the username or email is taken."""
+        with self.connect() as conn:
+            row = conn.execute("""
+                INSERT INTO users (username, email, password_hash, created_at) VALUES (%s, %s, %s, %s)
+                ON CONFLICT DO NOTHING
+                RETURNING id
+            """, (username, email, password_hash, created_at)).fetchone()
+
+        return row["id"] if row else None
+
+    def import_chats(self, user_id, chats):
+        """
+        Insert exported chats for a user in one transaction.
+
+        Args:
+            user_id: The ID of the user who owns the chats
+            chats: Dicts with the exported id, title and created_at
+
+        Returns:
+            Dict mapping each exported chat ID to its new ID
+        """
+        if not chats:
+            return {}
+
+        counters = {}
+        for chat in chats:
+            base_title, suffix = split_chat_title(chat["title"])
+            counters[base_title] = max(counters.get(base_title, 0), suffix + 1)
+
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "INSERT INTO chats (user_id, title, created_at) VALUES (%s, %s, %s) RETURNING id",
+                [(user_id, chat["title"], chat["created_at"]) for chat in chats],
+                returning=True,
+            )
+            new_ids = {}
+            for chat in chats:
+                new_ids[chat["id"]] = cursor.fetchone()["id"]
+                cursor.nextset()
+
+            # Keep create_chat from handing out a title an imported chat already has
+            cursor.executemany("""
+                INSERT INTO chat_title_counters (user_id, base_title, next_suffix) VALUES (%s, %s, %s)
+                ON CONFLICT (user_id, base_title)
+                DO UPDATE SET next_suffix = GREATEST(chat_title_counters.next_suffix, excluded.next_suffix)
+            """, [(user_id, base_title, next_suffix) for base_title, next_suffix in sorted(counters.items())])
+
+        return new_ids
+
+    def import_messages(self, user_id, messages):
+        """
+        Insert exported messages in one transaction.
+
+        Args:
+            user_id: The ID of the user who owns the messages
+            messages: Dicts with the new chat_id, is_user, content and timestamp
+
+        Returns:
+            List of the new message IDs, in the same order
+        """
+        if not messages:
+            return []
+
+        with self.connect() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                "INSERT INTO messages (chat_id, user_id, is_user, content, timestamp) "
+                "VALUES (%s, %s, %s, %s, %s) RETURNING id",
+                [(msg["chat_id"], user_id, bool(msg["is_user"]), msg["content"], msg["timestamp"])
+                 for msg in messages],
+                returning=True,
+            )
+            new_ids = []
+            for _ in messages:
+                new_ids.append(cursor.fetchone()["id"])
+                cursor.nextset()
+
+        return new_ids
+
+    def find_inactive_chats(self, days, after_id=0, limit=100):
+        """
+        Get ids of unarchived chats whose last message is older than `days`.
+
+        Chats are scanned in id order from after_id; the newest message of each
+        is found through the (chat_id, id) index.
+        """
+        with self.connect() as conn:
+            rows = conn.execute("""
+                SELECT c.id
+                FROM chats c
+                WHERE c.id > %s AND c.archived_at IS NULL
+                  AND (SELECT timestamp FROM messages WHERE chat_id = c.id ORDER BY id DESC LIMIT 1)
+                      < (now() AT TIME ZONE 'utc') - make_interval(days => %s)
+                ORDER BY c.id
+                LIMIT %s
+            """, (after_id, int(days), limit)).fetchall()
+
+        return [row["id"] for row in rows]
+
+    def get_messages_for_archive(self, chat_id):
+        """Get every column of a chat's messages, in id order."""
+        with self.connect() as conn:
+            return conn.execute("""
+                SELECT id, chat_id, user_id, is_user, content, timestamp::text AS timestamp, vector_id
+                FROM messages
+                WHERE chat_id = %s
+                ORDER BY id
+            """, (chat_id,)).fetchall()
+
+    def save_archived_messages(self, messages):
+        """Write message rows, each with an embedding (bytes or None), to archived_messages."""
+        if not messages:
+            return
+        with self.connect() as conn:
+            conn.cursor().executemany("""
+                INSERT INTO archived_messages
+                    (id, chat_id, user_id, is_user, content, timestamp, vector_id, embedding)
+                VALUES (%(id)s, %(chat_id)s, %(user_id)s, %(is_user)s, %(content)s, %(timestamp)s,
+                        %(vector_id)s, %(embedding)s)
+                ON CONFLICT (id) DO UPDATE SET
+                    chat_id = excluded.chat_id, user_id = excluded.user_id, is_user = excluded.is_user,
+                    content = excluded.content, timestamp = excluded.timestamp,
+                    vector_id = excluded.vector_id, embedding = excluded.embedding
+            """, messages)
+
+    def mark_chat_archived(self, chat_id, last_message_id, message_count):
+        """
+        Remove an archived chat's messages from the hot tables.
+
+        Fails, changing nothing, if a message newer than last_message_id
+        arrived since the chat was copied to the archive. The chat row is
+        locked first, so a message being saved concurrently either commits
+        before the check or waits until the chat is archived.
+
+        Returns:
+            True if the chat is now archived
+        """
+        with self.connect() as conn:
+            conn.execute("SELECT 1 FROM chats WHERE id = %s FOR UPDATE", (chat_id,))
+            if conn.execute("SELECT 1 FROM messages WHERE chat_id = %s AND id > %s LIMIT 1",
+                            (chat_id, last_message_id)).fetchone():
+                return False
+
+            conn.execute("DELETE FROM messages WHERE chat_id = %s", (chat_id,))
+            conn.execute("""
+                UPDATE chats SET archived_at = now() AT TIME ZONE 'utc', archived_message_count = %s
+                WHERE id = %s
+            """, (message_count, chat_id))
+
+        return True
+
+    def get_archived_messages(self, chat_id):
+        """Get a chat's archived rows, in id order."""
+        with self.connect() as conn:
+            return conn.execute("""
+                SELECT id, chat_id, user_id, is_user, content, timestamp::text AS timestamp, vector_id, embedding
+                FROM archived_messages
+                WHERE chat_id = %s
+                ORDER BY id
+            """, (chat_id,)).fetchall()
+
+    def get_archived_messages_page(self, user_id, after_id, limit):
+        """Get up to `limit` of a user's archived rows with id > after_id, in id order."""
+        with self.connect() as conn:
+            return conn.execute("""
+                SELECT id, chat_id, is_user, content, timestamp::text AS timestamp, embedding
+                FROM archived_messages
+                WHERE user_id = %s AND id > %s
+                ORDER BY id
+                LIMIT %s
+            """, (user_id, after_id, limit)).fetchall()
+
+    def restore_archived_messages(self, chat_id, messages):
+        """
+        Put an archived chat's messages back in the hot tables, keeping their ids.
+
+        Returns:
+            True if this call restored the chat, False if it was not archived
+            (for example because another replica restored it first)
+        """
+        with self.connect() as conn:
+            chat = conn.execute("SELECT archived_at FROM chats WHERE id = %s FOR UPDATE", (chat_id,)).fetchone()
+            if not chat or not chat["archived_at"]:
+                return False
+
+            if messages:
+                conn.cursor().executemany("""
+                    INSERT INTO messages (id, chat_id, user_id, is_user, content, timestamp, vector_id)
+                    VALUES (%(id)s, %(chat_id)s, %(user_id)s, %(is_user)s, %(content)s, %(timestamp)s, %(vector_id)s)
+                    ON CONFLICT (id) DO NOTHING
+                """, messages)
+            conn.execute(
+                "UPDATE chats SET archived_at = NULL, archived_message_count = NULL WHERE id = %s", (chat_id,))
+
+        return True
+
+    def delete_archived_messages(self, chat_id):
+        """Delete a chat's archived rows."""
+        with self.connect() as conn:
+            conn.execute("DELETE FROM archived_messages WHERE chat_id = %s", (chat_id,))
+
+    def get_restored_chats_with_archive_rows(self, limit=100):
+        """Get ids of chats that are back in the hot tables but still have archive rows."""
+        with self.connect() as conn:
+            rows = conn.execute("""
+                SELECT DISTINCT a.chat_id
+                FROM archived_messages a
+                JOIN chats c ON c.id = a.chat_id
+                WHERE c.archived_at IS NULL
+                ORDER BY a.chat_id
+                LIMIT %s
+            """, (limit,)).fetchall()
+
+        return [row["chat_id"] for row in rows]
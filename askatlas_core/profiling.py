@@ -0,0 +1,335 @@
+import os
+import sys
+import time
+import pstats
+import random
+import logging
+import cProfile
+import threading
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from .config import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Where collapsed stacks, .prof files and allocation diffs are written
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(DATA_DIR, "profiles"))
+
+# Start the sampling profiler at import; it can also be toggled from the admin page
+PROFILE_SAMPLER = os.getenv("PROFILE_SAMPLER", "0") == "1"
+
+# Seconds between stack samples (20 Hz by default, cheap enough to leave on)
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.05"))
+
+# How often accumulated samples are written out as one collapsed-stack file
+PROFILE_FLUSH_SECONDS = int(os.getenv("PROFILE_FLUSH_SECONDS", "300"))
+
+# Fraction of chat turns run under cProfile; the profile is kept only if the turn is slow
+SLOW_TURN_PROFILE_RATE = float(os.getenv("SLOW_TURN_PROFILE_RATE", "0"))
+SLOW_TURN_MS = int(os.getenv("SLOW_TURN_MS", "3000"))
+
+# Track allocations with tracemalloc and diff a snapshot every PROFILE_SNAPSHOT_SECONDS
+PROFILE_TRACEMALLOC = os.getenv("PROFILE_TRACEMALLOC", "0") == "1"
+TRACEMALLOC_FRAMES = int(os.getenv("TRACEMALLOC_FRAMES", "16"))
+PROFILE_SNAPSHOT_SECONDS = int(os.getenv("PROFILE_SNAPSHOT_SECONDS", "600"))
+
+# Oldest files are deleted beyond this many
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+_lock = threading.Lock()
+_samples = Counter()
+_sample_count = 0
+_sampler = None
+_stop = None
+_labels = {}
+_last_snapshot = None
+_snapshotter = None
+_snapshot_stop = None
+
+# cProfile allows one active profiler per process, so slow-turn captures never overlap
+_cprofile_lock = threading.Lock()
+
+
+def _code_label(code):
+    label = _labels.get(code)
+    if label is None:
+        label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+        _labels[code] = label
+    return label
+
+
+def _write(prefix, lines, suffix=".collapsed"):
+    """Write a profile file named after the process and time, pruning the oldest files."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{prefix}-{os.getpid()}-{time.strftime('%Y%m%dT%H%M%S')}{suffix}")
+    with open(path, "w", encoding="utf-8") as f:
+        f.writelines(f"{line}\n" for line in lines)
+    _prune()
+    return path
+
+
+def _prune():
+    files = list_profiles()
+    for name in files[PROFILE_MAX_FILES:]:
+        try:
+            os.remove(os.path.join(PROFILE_DIR, name))
+        except OSError:
+            pass
+
+
+def list_profiles():
+    """Profile files in PROFILE_DIR, newest first."""
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+    names = os.listdir(PROFILE_DIR)
+    return sorted(names, key=lambda n: os.path.getmtime(os.path.join(PROFILE_DIR, n)), reverse=True)
+
+
+def _take_sample(own_ident):
+    global _sample_count
+    names = {t.ident: t.name for t in threading.enumerate()}
+    stacks = []
+    for ident, frame in sys._current_frames().items():
+        if ident == own_ident:
+            continue
+        stack = []
+        while frame is not None:
+            stack.append(_code_label(frame.f_code))
+            frame = frame.f_back
+        stack.append(names.get(ident, f"thread-{ident}"))
+        stacks.append(";".join(reversed(stack)))
+    with _lock:
+        _samples.update(stacks)
+        _sample_count += 1
+
+
+def _sample_loop(interval, stop):
+    own_ident = threading.get_ident()
+    next_flush = time.monotonic() + PROFILE_FLUSH_SECONDS
+    while not stop.wait(interval):
+        try:
+            _take_sample(own_ident)
+            now = time.monotonic()
+            if now >= next_flush:
+                flush_samples()
+                next_flush = now + PROFILE_FLUSH_SECONDS
+        except Exception:
+            logger.exception("Profiler sample failed")
+
+
+def start_sampler(interval=PROFILE_INTERVAL):
+    """Start the background stack sampler if it is not already running."""
+    global _sampler, _stop
+    with _lock:
+        if _sampler is not None and _sampler.is_alive():
+            return False
+        _stop = threading.Event()
+        _sampler = threading.Thread(target=_sample_loop, args=(interval, _stop),
+                                    name="profiler", daemon=True)
+        _sampler.start()
+    logger.info("Sampling profiler started at %.0f Hz", 1 / interval)
+    return True
+
+
+def stop_sampler():
+    """Stop the sampler and write out what it collected."""
+    global _sampler
+    with _lock:
+        sampler, _sampler = _sampler, None
+    if sampler is None:
+        return None
+    _stop.set()
+    sampler.join()
+    return flush_samples()
+
+
+def sampler_running():
+    return _sampler is not None and _sampler.is_alive()
+
+
+def flush_samples():
+    """
+    Write the samples collected so far as a collapsed-stack file and reset them.
+
+    Each line is "thread;outer;...;inner count", the input format of
+    flamegraph.pl and speedscope.
+
+    Returns:
+        The file path, or None if there were no samples
+    """
+    global _sample_count
+    with _lock:
+        samples = _samples.copy()
+        _samples.clear()
+        _sample_count = 0
+    if not samples:
+        return None
+    return _write("samples", (f"{stack} {count}" for stack, count in samples.most_common()))
+
+
+def get_profiler_status():
+    """State of every profiling hook, for the admin page."""
+    return {
+        "sampler_running": sampler_running(),
+        "pending_samples": _sample_count,
+        "interval_seconds": PROFILE_INTERVAL,
+        "slow_turn_rate": SLOW_TURN_PROFILE_RATE,
+        "slow_turn_ms": SLOW_TURN_MS,
+        "tracemalloc": tracemalloc.is_tracing(),
+        "profile_dir": PROFILE_DIR,
+    }
+
+
+def _pstats_to_collapsed(stats, max_depth=64, min_seconds=1e-5):
+    """
+    Approximate collapsed stacks from a cProfile call graph.
+
+    cProfile only records caller -> callee edges, so each function's own
+    time is split across the paths reaching it in proportion to the time
+    spent under each caller, as flameprof does.
+    """
+    callees = defaultdict(list)
+    for func, (_, _, _, _, callers) in stats.items():
+        for caller, edge in callers.items():
+            callees[caller].append((func, edge[3]))
+
+    def label(func):
+        filename, line, name = func
+        return f"{name} ({os.path.basename(filename)}:{line})"
+
+    lines = Counter()
+
+    def walk(func, stack, share):
+        own = stats[func][2]
+        stack = stack + [label(func)]
+        lines[";".join(stack)] += own * share
+        if len(stack) >= max_depth:
+            return
+        for callee, edge_cumulative in callees.get(func, ()):
+            callee_cumulative = stats[callee][3]
+            if label(callee) in stack or not callee_cumulative:
+                continue
+            child_share = share * edge_cumulative / callee_cumulative
+            # Paths under min_seconds are dropped, which keeps the walk from exploding
+            if child_share * callee_cumulative >= min_seconds:
+                walk(callee, stack, child_share)
+
+    for func, (_, _, _, _, callers) in stats.items():
+        if not callers:
+            walk(func, [], 1.0)
+
+    # Weights in microseconds, as flamegraph tools expect integers
+    return [f"{stack} {round(seconds * 1e6)}" for stack, seconds in lines.most_common()
+            if seconds * 1e6 >= 1]
+
+
+@contextmanager
+def profile_turn(name="turn"):
+    """
+    Run a block under cProfile for a sampled fraction of calls and keep the
+    profile (.prof plus collapsed stacks) only when the block was slow.
+    """
+    if not SLOW_TURN_PROFILE_RATE or random.random() >= SLOW_TURN_PROFILE_RATE:
+        yield
+        return
+    if not _cprofile_lock.acquire(blocking=False):
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    try:
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+    finally:
+        _cprofile_lock.release()
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if elapsed_ms >= SLOW_TURN_MS:
+            stats = pstats.Stats(profiler)
+            path = _write(f"{name}-{round(elapsed_ms)}ms", _pstats_to_collapsed(stats.stats))
+            stats.dump_stats(path[:-len(".collapsed")] + ".prof")
+            logger.warning("Slow %s took %.0f ms; profile written to %s", name, elapsed_ms, path)
+
+
+def _snapshot_loop(seconds, stop):
+    while not stop.wait(seconds):
+        try:
+            snapshot_allocations()
+        except Exception:
+            logger.exception("Allocation snapshot failed")
+
+
+def start_allocation_tracking(frames=TRACEMALLOC_FRAMES, seconds=PROFILE_SNAPSHOT_SECONDS):
+    """
+    Start tracemalloc and take the baseline snapshot that later ones are diffed against.
+
+    A timer thread of its own writes a diff every `seconds`, whether or not
+    the stack sampler is running.
+    """
+    global _last_snapshot, _snapshotter, _snapshot_stop
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+    _last_snapshot = tracemalloc.take_snapshot()
+    with _lock:
+        if _snapshotter is not None and _snapshotter.is_alive():
+            return
+        _snapshot_stop = threading.Event()
+        _snapshotter = threading.Thread(target=_snapshot_loop, args=(seconds, _snapshot_stop),
+                                        name="allocation-snapshots", daemon=True)
+        _snapshotter.start()
+
+
+def stop_allocation_tracking():
+    global _last_snapshot, _snapshotter
+    with _lock:
+        snapshotter, _snapshotter = _snapshotter, None
+    if snapshotter is not None:
+        _snapshot_stop.set()
+        snapshotter.join()
+    _last_snapshot = None
+    tracemalloc.stop()
+
+
+def snapshot_allocations(limit=200):
+    """
+    Diff a new tracemalloc snapshot against the previous one.
+
+    Writes the allocation sites that grew as collapsed stacks weighted by
+    bytes, so a flamegraph shows where memory was added since the last
+    snapshot.
+
+    Returns:
+        The file path, or None if tracking is off or nothing grew
+    """
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    previous, _last_snapshot = _last_snapshot, snapshot
+    if previous is None:
+        return None
+
+    # Traceback frames run oldest first, the order collapsed stacks use
+    lines = []
+    for diff in snapshot.compare_to(previous, "traceback")[:limit]:
+        if diff.size_diff <= 0:
+            continue
+        stack = ";".join(f"{os.path.basename(frame.filename)}:{frame.lineno}"
+                         for frame in diff.traceback)
+        lines.append(f"{stack} {diff.size_diff}")
+    if not lines:
+        return None
+    return _write("allocs", lines)
+
+
+if PROFILE_TRACEMALLOC:
+    start_allocation_tracking()
+if PROFILE_SAMPLER:
+    start_sampler()
@@ -0,0 +1,334 @@
+"""
+The storage interface shared by the SQLite and PostgreSQL backends.
+
+storage.py picks a backend with STORAGE_BACKEND and exposes its methods as
+module-level functions, so callers never name a backend. A new backend
+subclasses Repository, implements every method, and is checked with
+storage_conformance.
+"""
+import re
+import time
+import functools
+from dataclasses import dataclass
+from datetime import datetime
+from . import metrics
+from .tracing import traced
+from .text import STOP_WORDS
+
+# Matches titles of the form "Base title (3)"
+TITLE_SUFFIX = re.compile(r"^(.*) \((\d+)\)$")
+
+DB_SECONDS = metrics.histogram(
+    "askatlas_db_seconds", "Database call duration, including time spent waiting for locks", ["op"])
+DB_LOCK_ERRORS = metrics.counter(
+    "askatlas_db_lock_errors_total", "Database calls that gave up waiting for a lock", ["op"])
+
+# Exception class names meaning a lock wait gave up (psycopg's, by name, as psycopg is optional)
+_LOCK_ERRORS = {"LockNotAvailable", "DeadlockDetected", "SerializationFailure"}
+
+
+@dataclass(slots=True)
+class Message:
+    """
+    One chat message as returned by get_chat_messages.
+
+    Slots make a record about a third the size of the equivalent dict, and
+    the timestamp is parsed once here rather than on every render.
+    """
+    id: int
+    is_user: bool
+    content: str
+    timestamp: datetime | None
+    vector_id: str | None = None
+
+    @property
+    def role(self):
+        return "user" if self.is_user else "assistant"
+
+    @classmethod
+    def from_row(cls, row):
+        timestamp = row[3]
+        if isinstance(timestamp, str):
+            timestamp = datetime.fromisoformat(timestamp)
+        return cls(row[0], bool(row[1]), row[2], timestamp or None, row[4])
+
+
+def instrumented(op):
+    """Trace a storage call and record its latency and lock timeouts."""
+    def decorator(func):
+        func = traced(f"db.{op}")(func)
+        seconds = DB_SECONDS.labels(op)
+        lock_errors = DB_LOCK_ERRORS.labels(op)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if type(e).__name__ in _LOCK_ERRORS or "locked" in str(e):
+                    lock_errors.inc()
+                raise
+            finally:
+                seconds.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def split_chat_title(title):
+    """Split "Base (n)" into ("Base", n); titles without a suffix get n = 0."""
+    match = TITLE_SUFFIX.match(title)
+    if match:
+        return match.group(1), int(match.group(2))
+    return title, 0
+
+
+def search_terms(text):
+    """
+    The distinct lower-cased words of a search, in order, without stop words
+    and single characters, which match nearly every message once ORed.
+    """
+    words = re.findall(r"\w+", text.lower())
+    return list(dict.fromkeys(word for word in words if len(word) > 1 and word not in STOP_WORDS))
+
+
+class Repository:
+    """
+    Users, chats and messages, plus the auto-titling corpus, revoked
+    tokens, and the cold archive the retention job moves old chats to.
+
+    Timestamps are returned as "YYYY-MM-DD HH:MM:SS" UTC strings, except in
+    Message records, which hold datetimes. Row dicts use the column names
+    documented on each method.
+    """
+    name = None
+
+    def close(self):
+        """Release any connections the backend holds open."""
+
+    def ping(self):
+        """Run a trivial query, raising if the database is unreachable."""
+        raise NotImplementedError
+
+    # Users
+
+    def create_user(self, username, email, password):
+        """Create a user; returns the new id, or None if the username or email is taken."""
+        raise NotImplementedError
+
+    def verify_user(self, username, password):
+        """Return the user's id if the password matches, else None."""
+        raise NotImplementedError
+
+    def get_user_by_id(self, user_id):
+        """Dict with id, username, email and created_at, or None."""
+        raise NotImplementedError
+
+    def get_or_create_service_user(self, username):
+        """Id of an account that owns app-level data and cannot log in, created if needed."""
+        raise NotImplementedError
+
+    def ensure_default_admin(self):
+        """Ensure an admin user with username=admin and password=admin exists."""
+        raise NotImplementedError
+
+    def revoke_token_id(self, token_id, expires_at):
+        """Record a revoked session token id and purge entries that have expired."""
+        raise NotImplementedError
+
+    def get_revoked_token_ids(self, now):
+        """Revoked token ids that have not expired yet, mapped to their expiry."""
+        raise NotImplementedError
+
+    # Chats
+
+    def create_chat(self, user_id, title=None):
+        """Create a chat titled `title` (default "New Chat") with a "(n)" suffix if taken; returns its id."""
+        raise NotImplementedError
+
+    def delete_chat(self, chat_id):
+        """Delete a chat, its messages and any archived copy of them."""
+        raise NotImplementedError
+
+    def update_chat_title(self, chat_id, title):
+        """Rename a chat, with a "(n)" suffix if another chat of the user has the title."""
+        raise NotImplementedError
+
+    def get_user_chats(self, user_id):
+        """Dicts with id, title, created_at, archived and message_count, newest first."""
+        raise NotImplementedError
+
+    def get_chat_titles(self, user_id, limit=100):
+        """[id, title] pairs of the user's most recent chats."""
+        raise NotImplementedError
+
+    # Messages
+
+    def save_message(self, chat_id, user_id, content, is_user=True, vector_id=None):
+        """Save a message; returns its id."""
+        raise NotImplementedError
+
+    def get_chat_messages(self, chat_id, after_id=None, before_id=None, limit=None):
+        """
+        Message records of a chat, oldest first, rehydrating the chat if archived.
+
+        after_id / before_id bound the ids; limit keeps the most recent
+        `limit` of the matching messages.
+        """
+        raise NotImplementedError
+
+    def get_all_user_messages(self, user_id):
+        """Dicts with id, chat_id, content, is_user, timestamp and vector_id across all chats."""
+        raise NotImplementedError
+
+    def search_messages_fts(self, user_id, query_text, limit=10, chat_ids=None, history_window=None):
+        """
+        Lexical search of a user's messages, any word matching.
+
+        chat_ids limits the search to those chats; history_window is a
+        (chat_id, first message id) pair whose messages from that id on are
+        skipped, being already in the prompt.
+
+        Returns dicts with message_id, chat_id, is_user, content and score,
+        best first; lower scores are better.
+        """
+        raise NotImplementedError
+
+    def get_messages_by_ids(self, message_ids):
+        """{id: dict with id, chat_id, is_user, content, timestamp}; unknown ids are omitted."""
+        raise NotImplementedError
+
+    def count_user_chats_with_messages(self, user_id):
+        """Chats of the user holding at least one message, hot or archived."""
+        raise NotImplementedError
+
+    def update_message_vector_id(self, message_id, vector_id):
+        raise NotImplementedError
+
+    def update_message_vector_ids(self, pairs):
+        """Set vector_id for many messages; pairs are (message_id, vector_id)."""
+        raise NotImplementedError
+
+    def get_max_message_id(self):
+        """The highest message id, or 0."""
+        raise NotImplementedError
+
+    def iter_message_contents(self, max_id, batch_size=500):
+        """Yield lists of message contents with id <= max_id, in id order."""
+        raise NotImplementedError
+
+    # Auto-titling corpus
+
+    def add_document_terms(self, documents):
+        """Count each document's distinct terms (a list per document) into the corpus frequencies."""
+        raise NotImplementedError
+
+    def get_document_frequencies(self, terms):
+        """(number of documents, {term: df}) for the given terms."""
+        raise NotImplementedError
+
+    # User memory
+
+    def get_memory_items(self, user_id):
+        """Dicts with id, kind, key, content, embedding (bytes or None), source_message_id and updated_at, newest first."""
+        raise NotImplementedError
+
+    def upsert_memory_items(self, user_id, items, max_items):
+        """
+        Insert or replace memory items by (user, key), then keep only the
+        user's `max_items` most recently updated ones.
+
+        Items are dicts with kind, key, content, embedding and source_message_id.
+        """
+        raise NotImplementedError
+
+    def delete_memory_items(self, user_id, keys=None):
+        """Delete the user's memory items with these keys, or all of them."""
+        raise NotImplementedError
+
+    # Answer cache
+
+    def record_cache_queries(self, namespace, queries):
+        """Count one ask of each (query_key, query) pair, adding queries not seen before."""
+        raise NotImplementedError
+
+    def get_frequent_queries(self, namespace, limit, min_hits=1):
+        """Dicts with query_key, query, hits and refreshed_at (None if never answered), most asked first."""
+        raise NotImplementedError
+
+    def get_cached_answers(self, namespace):
+        """Dicts with query_key, query, answer, embedding (bytes or None) and refreshed_at of answered queries."""
+        raise NotImplementedError
+
+    def save_cached_answers(self, namespace, entries):
+        """Store answers, dicts with query_key, query, answer and embedding, stamping refreshed_at."""
+        raise NotImplementedError
+
+    def prune_answer_cache(self, days):
+        """Delete cached queries and answers not asked for in `days`; returns how many."""
+        raise NotImplementedError
+
+    # Export and import
+
+    def get_user_for_export(self, username):
+        """Dict with id, username, email, password_hash and created_at, or None."""
+        raise NotImplementedError
+
+    def get_user_chats_page(self, user_id, after_id, max_id, limit):
+        """Up to `limit` chat dicts (id, title, created_at, archived_at) with after_id < id <= max_id."""
+        raise NotImplementedError
+
+    def get_user_messages_page(self, user_id, after_id, max_id, limit):
+        """Up to `limit` message dicts (id, chat_id, is_user, content, timestamp, vector_id), keyset by id."""
+        raise NotImplementedError
+
+    def get_user_max_ids(self, user_id):
+        """(highest chat id, highest message id) of a user, 0 where there are none."""
+        raise NotImplementedError
+
+    def import_user(self, username, email, password_hash, created_at):
+        """Insert a user as exported; None if the username or email is taken."""
+        raise NotImplementedError
+
+    def import_chats(self, user_id, chats):
+        """Insert exported chats in one transaction; returns {exported id: new id}."""
+        raise NotImplementedError
+
+    def import_messages(self, user_id, messages):
+        """Insert messages (chat_id, is_user, content, timestamp) in one transaction; returns the new ids."""
+        raise NotImplementedError
+
+    # Retention
+
+    def find_inactive_chats(self, days, after_id=0, limit=100):
+        """Ids of unarchived chats whose newest message is older than `days`, from after_id in id order."""
+        raise NotImplementedError
+
+    def get_messages_for_archive(self, chat_id):
+        """Every column of a chat's messages, in id order."""
+        raise NotImplementedError
+
+    def save_archived_messages(self, messages):
+        """Write message rows, each with an embedding (bytes or None), to the archive."""
+        raise NotImplementedError
+
+    def mark_chat_archived(self, chat_id, last_message_id, message_count):
+        """Drop an archived chat's hot messages unless one newer than last_message_id arrived; True if archived."""
+        raise NotImplementedError
+
+    def get_archived_messages(self, chat_id):
+        raise NotImplementedError
+
+    def get_archived_messages_page(self, user_id, after_id, limit):
+        raise NotImplementedError
+
+    def restore_archived_messages(self, chat_id, messages):
+        """Put archived messages back with their ids; True if this call restored the chat."""
+        raise NotImplementedError
+
+    def delete_archived_messages(self, chat_id):
+        raise NotImplementedError
+
+    def get_restored_chats_with_archive_rows(self, limit=100):
+        """Ids of chats back in the hot tables that still have archive rows."""
+        raise NotImplementedError
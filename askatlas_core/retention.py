@@ -0,0 +1,297 @@
+"""
+Retention: archiving inactive chats, online backups and incremental vacuum.
+
+Chats with no message for RETENTION_DAYS have their messages moved to the
+archive database (ARCHIVE_DB_PATH) and their vectors removed from Chroma,
+so the hot database and index hold only live conversations. The chat row
+stays, marked archived, and the first get_chat_messages call for it puts
+everything back. Vectors are kept in the archive as float32 and re-added
+without re-embedding.
+
+Backups copy both databases with the SQLite backup API. In WAL mode a
+one-step backup only holds a read transaction, so writers carry on and
+the copy is a consistent snapshot.
+
+The worker is opt-in so that only one app process runs it:
+
+    RETENTION_WORKER=1 streamlit run intellichat/app.py
+    python -m askatlas_core.retention archive|backup|vacuum|convert-vacuum
+"""
+import os
+import time
+import sqlite3
+import logging
+import argparse
+import threading
+
+from . import metrics, storage
+from .vectors import pack_vectors, unpack_vectors
+from .config import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# Chats whose newest message is older than this many days are archived
+RETENTION_DAYS = int(os.getenv("RETENTION_DAYS", "180"))
+
+# Run the retention worker in this process, every RETENTION_INTERVAL seconds
+RETENTION_WORKER = os.getenv("RETENTION_WORKER", "0") == "1"
+RETENTION_INTERVAL = int(os.getenv("RETENTION_INTERVAL", "3600"))
+
+# Chats archived per worker run, so one run never holds the database for long
+RETENTION_BATCH = int(os.getenv("RETENTION_BATCH", "200"))
+
+# Backups of both databases, taken by the worker every BACKUP_INTERVAL seconds (0 disables)
+BACKUP_DIR = os.getenv("BACKUP_DIR", os.path.join(DATA_DIR, "backups"))
+BACKUP_INTERVAL = int(os.getenv("BACKUP_INTERVAL", "86400"))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+
+# Free pages returned to the filesystem per run
+VACUUM_PAGES = int(os.getenv("VACUUM_PAGES", "2000"))
+
+ARCHIVED_CHATS = metrics.counter(
+    "askatlas_chats_archived_total", "Chats moved to the archive database")
+REHYDRATED_CHATS = metrics.counter(
+    "askatlas_chats_rehydrated_total", "Archived chats brought back when opened")
+BACKUP_SECONDS = metrics.histogram(
+    "askatlas_backup_seconds", "Time to back up one database", ["database"])
+
+# Serialises rehydration within a process; across processes restore_archived_messages decides
+_rehydrate_lock = threading.Lock()
+_worker = None
+_stop = None
+
+
+def _vector_store():
+    """The vector store module, or None where the retrieval extra is not installed."""
+    try:
+        from . import vector_store
+    except ImportError:
+        return None
+    return vector_store
+
+
+def archive_chat(chat_id, vector_store=None):
+    """
+    Move one chat's messages, and their vectors, to the archive database.
+
+    Returns:
+        True if the chat was archived, False if a new message arrived meanwhile
+    """
+    messages = storage.get_messages_for_archive(chat_id)
+    if not messages:
+        return False
+
+    vectors = {}
+    if vector_store is not None:
+        vectors = vector_store.get_embeddings(msg["vector_id"] for msg in messages if msg["vector_id"])
+    for msg in messages:
+        vector = vectors.get(msg["vector_id"])
+        msg["embedding"] = pack_vectors([vector]) if vector is not None else None
+        # A saved vector gets a new document id when it is re-added
+        if vector is not None:
+            msg["vector_id"] = None
+
+    # Copy first, then delete: a crash in between leaves the chat hot and the copy is redone
+    storage.save_archived_messages(messages)
+    if not storage.mark_chat_archived(chat_id, messages[-1]["id"], len(messages)):
+        storage.delete_archived_messages(chat_id)
+        return False
+
+    if vectors:
+        vector_store.delete_vectors(vectors)
+    ARCHIVED_CHATS.inc()
+    return True
+
+
+def archive_inactive_chats(days=RETENTION_DAYS, limit=RETENTION_BATCH):
+    """Archive up to `limit` chats inactive for `days`; returns how many were archived."""
+    vector_store = _vector_store()
+    archived = 0
+    after_id = 0
+    while archived < limit:
+        chat_ids = storage.find_inactive_chats(days, after_id, min(100, limit - archived))
+        if not chat_ids:
+            break
+        for chat_id in chat_ids:
+            try:
+                archived += archive_chat(chat_id, vector_store)
+            except Exception:
+                logger.exception("Archiving chat %s failed", chat_id)
+        after_id = chat_ids[-1]
+    return archived
+
+
+def _restore_vectors(chat_id, messages, repository):
+    """Re-add archived vectors to Chroma, then drop the chat's archive rows."""
+    saved = [msg for msg in messages if msg["embedding"]]
+    if saved:
+        vector_store = _vector_store()
+        if vector_store is None:
+            # Kept in the archive until a process with the vector store runs the worker
+            logger.info("Chat %s restored without vectors; the retention worker will re-add them", chat_id)
+            return
+        embeddings = [unpack_vectors(msg["embedding"], len(msg["embedding"]) // 4)[0] for msg in saved]
+        rows = [{"message_id": msg["id"], "chat_id": chat_id, "is_user": msg["is_user"],
+                 "content": msg["content"]} for msg in saved]
+        doc_ids = vector_store.add_messages_to_vector_store(rows, saved[0]["user_id"], embeddings)
+        repository.update_message_vector_ids(zip([msg["id"] for msg in saved], doc_ids))
+    repository.delete_archived_messages(chat_id)
+
+
+def rehydrate_chat(chat_id, repository=None):
+    """
+    Bring an archived chat's messages back into the hot tables.
+
+    Args:
+        chat_id: The archived chat
+        repository: The storage backend holding it; the configured one by default
+
+    Returns:
+        True if this call restored the chat
+    """
+    repository = repository or storage.repository
+    with _rehydrate_lock:
+        messages = repository.get_archived_messages(chat_id)
+        if not repository.restore_archived_messages(chat_id, messages):
+            return False
+        REHYDRATED_CHATS.inc()
+        _restore_vectors(chat_id, messages, repository)
+    return True
+
+
+def restore_pending_vectors(limit=100):
+    """Finish chats that were restored, or half archived, without their vectors being handled."""
+    for chat_id in storage.get_restored_chats_with_archive_rows(limit):
+        try:
+            # Messages whose original vector was never removed (an archive run that
+            # stopped before deleting them) still have their vector_id
+            hot = {msg["id"]: msg["vector_id"] for msg in storage.get_messages_for_archive(chat_id)}
+            messages = [msg for msg in storage.get_archived_messages(chat_id)
+                        if msg["id"] in hot and hot[msg["id"]] is None]
+            _restore_vectors(chat_id, messages, storage.repository)
+        except Exception:
+            logger.exception("Restoring vectors of chat %s failed", chat_id)
+
+
+def list_backups():
+    """Backup files in BACKUP_DIR, newest first."""
+    if not os.path.isdir(BACKUP_DIR):
+        return []
+    names = [name for name in os.listdir(BACKUP_DIR) if name.endswith(".db")]
+    return sorted(names, key=lambda n: os.path.getmtime(os.path.join(BACKUP_DIR, n)), reverse=True)
+
+
+def backup_databases():
+    """
+    Copy the hot and archive SQLite databases into BACKUP_DIR and prune old copies.
+
+    PostgreSQL deployments are backed up with the server's own tools
+    (pg_basebackup or pg_dump), so nothing is written for them.
+
+    Returns:
+        The paths written
+    """
+    if storage.STORAGE_BACKEND != "sqlite":
+        return []
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    stamp = time.strftime("%Y%m%dT%H%M%S")
+    written = []
+    for name, path in storage.repository.database_files().items():
+        if not os.path.exists(path):
+            continue
+        target = os.path.join(BACKUP_DIR, f"{name}-{stamp}.db")
+        with BACKUP_SECONDS.labels(name).time():
+            source = sqlite3.connect(path, timeout=10)
+            copy = sqlite3.connect(target + ".tmp")
+            try:
+                source.backup(copy)
+            finally:
+                copy.close()
+                source.close()
+        os.replace(target + ".tmp", target)
+        written.append(target)
+
+    # BACKUP_KEEP copies of each database
+    for prefix in ("chat_app-", "chat_archive-"):
+        for name in [n for n in list_backups() if n.startswith(prefix)][BACKUP_KEEP:]:
+            os.remove(os.path.join(BACKUP_DIR, name))
+    return written
+
+
+def _backup_due():
+    if not BACKUP_INTERVAL or storage.STORAGE_BACKEND != "sqlite":
+        return False
+    backups = list_backups()
+    if not backups:
+        return True
+    return time.time() - os.path.getmtime(os.path.join(BACKUP_DIR, backups[0])) >= BACKUP_INTERVAL
+
+
+def vacuum(pages=VACUUM_PAGES):
+    """Return free pages of both databases to the filesystem; None where not in incremental mode."""
+    if storage.STORAGE_BACKEND != "sqlite":
+        # PostgreSQL's autovacuum does this
+        return {}
+    return storage.repository.incremental_vacuum(pages)
+
+
+def convert_to_incremental_vacuum():
+    """
+    Switch an existing SQLite database to incremental auto-vacuum.
+
+    Needs a full VACUUM, which blocks writers while it rewrites the file,
+    so it is a one-off maintenance step rather than part of the worker.
+    """
+    if storage.STORAGE_BACKEND != "sqlite":
+        return False
+    return storage.repository.convert_to_incremental_vacuum()
+
+
+def run_maintenance():
+    """One worker pass: archive, finish pending vector restores, vacuum, and back up if due."""
+    report = {"archived": archive_inactive_chats()}
+    restore_pending_vectors()
+    report["vacuumed_pages"] = vacuum()
+    if _backup_due():
+        report["backups"] = backup_databases()
+    logger.info("Retention run: %s", report)
+    return report
+
+
+def _worker_loop(stop):
+    while not stop.wait(RETENTION_INTERVAL):
+        try:
+            run_maintenance()
+        except Exception:
+            logger.exception("Retention run failed")
+
+
+def start_retention_worker():
+    """Start the background retention worker if RETENTION_WORKER=1 and it is not running."""
+    global _worker, _stop
+    if not RETENTION_WORKER or (_worker is not None and _worker.is_alive()):
+        return False
+    _stop = threading.Event()
+    _worker = threading.Thread(target=_worker_loop, args=(_stop,), name="retention", daemon=True)
+    _worker.start()
+    logger.info("Retention worker started: archiving after %d days, every %d s", RETENTION_DAYS, RETENTION_INTERVAL)
+    return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chat retention and database maintenance")
+    parser.add_argument("command", choices=["archive", "backup", "vacuum", "convert-vacuum", "run"])
+    parser.add_argument("--days", type=int, default=RETENTION_DAYS)
+    parser.add_argument("--limit", type=int, default=RETENTION_BATCH)
+    args = parser.parse_args()
+
+    if args.command == "archive":
+        print(f"archived {archive_inactive_chats(args.days, args.limit)} chats")
+    elif args.command == "backup":
+        print("\n".join(backup_databases()))
+    elif args.command == "vacuum":
+        print(vacuum())
+    elif args.command == "convert-vacuum":
+        print("incremental auto-vacuum enabled" if convert_to_incremental_vacuum() else "conversion failed")
+    else:
+        print(run_maintenance())
@@ -0,0 +1,176 @@
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from . import metrics
+from .storage import count_user_chats_with_messages
+
+logger = logging.getLogger(__name__)
+
+# Messages that never benefit from past-conversation context
+SMALL_TALK = re.compile(
+    r"^\s*(hi|hello|hey|yo|thanks|thank you|thx|ty|ok|okay|k|cool|nice|great|"
+    r"awesome|bye|goodbye|yes|no|yep|nope|sure|good (morning|afternoon|evening|night))"
+    r"[\s!.?,]*$",
+    re.IGNORECASE,
+)
+
+# Phrases that refer back to earlier conversations. Bare "my", "before" and "again" also
+# start ordinary new questions ("my flight lands at 6"), so they only count in recall phrases
+RECALL_HINTS = re.compile(
+    r"\b(remember|remind me|last time|earlier|previous|previously|"
+    r"(told|asked|said|mentioned|discussed|talked about) "
+    r"(you |me |this |that |it )?(before|earlier|again)|(ask|tell me|say that|explain that) again|"
+    r"we (talked|discussed|spoke)|you (said|told|suggested|recommended)|i (told|said|mentioned))\b",
+    re.IGNORECASE,
+)
+
+# Queries with fewer meaningful words than this are skipped unless they hint at recall
+MIN_CONTENT_WORDS = 2
+
+# How long a per-user corpus size stays cached, in seconds
+CORPUS_CACHE_TTL = int(os.getenv("RETRIEVAL_GATE_CACHE_TTL", "300"))
+
+# Users whose corpus size is cached; the least recently used are evicted beyond this
+CORPUS_CACHE_SIZE = 10_000
+
+# Emit a summary log line every this many decisions
+LOG_EVERY = 50
+
+_lock = threading.Lock()
+_corpus_cache = OrderedDict()
+_classifier = None
+CACHE_REQUESTS = metrics.counter(
+    "askatlas_cache_requests_total", "In-process cache lookups", ["cache", "result"])
+GATE_DECISIONS = metrics.counter(
+    "askatlas_retrieval_gate_decisions_total", "Retrieval gate decisions", ["decision", "reason"])
+
+_stats = {
+    "decisions": 0,
+    "skipped": 0,
+    "retrieval_runs": 0,
+    "retrieval_seconds": 0.0,
+    "saved_seconds": 0.0,
+}
+
+
+def set_classifier(classifier):
+    """
+    Install an optional classifier for messages the heuristics cannot decide.
+
+    Args:
+        classifier: Callable taking the message text and returning the
+            probability that retrieval will help, or None to remove it
+    """
+    global _classifier
+    _classifier = classifier
+
+
+def get_user_corpus_size(user_id):
+    """Return the number of the user's chats that contain messages, cached per user."""
+    now = time.monotonic()
+    with _lock:
+        cached = _corpus_cache.get(user_id)
+        if cached and cached[0] > now:
+            _corpus_cache.move_to_end(user_id)
+            CACHE_REQUESTS.labels("corpus_size", "hit").inc()
+            return cached[1]
+
+    CACHE_REQUESTS.labels("corpus_size", "miss").inc()
+    size = count_user_chats_with_messages(user_id)
+    with _lock:
+        _corpus_cache[user_id] = (now + CORPUS_CACHE_TTL, size)
+        _corpus_cache.move_to_end(user_id)
+        while len(_corpus_cache) > CORPUS_CACHE_SIZE:
+            _corpus_cache.popitem(last=False)
+    return size
+
+
+def invalidate_corpus_size(user_id):
+    """Forget the cached corpus size, e.g. after a chat receives its first message."""
+    with _lock:
+        _corpus_cache.pop(user_id, None)
+
+
+def should_retrieve(user_id, text):
+    """
+    Decide whether retrieving past-conversation context is worth it.
+
+    Args:
+        user_id: The ID of the current user
+        text: The user's message
+
+    Returns:
+        Tuple of (decision, reason)
+    """
+    if SMALL_TALK.match(text):
+        return False, "small_talk"
+
+    # The current chat is always in the corpus, so one chat means no past chats
+    if get_user_corpus_size(user_id) <= 1:
+        return False, "no_past_chats"
+
+    if RECALL_HINTS.search(text):
+        return True, "recall_hint"
+
+    content_words = [w for w in re.findall(r"\w+", text) if len(w) > 2]
+    if len(content_words) < MIN_CONTENT_WORDS:
+        return False, "too_short"
+
+    if _classifier is not None:
+        return _classifier(text) >= 0.5, "classifier"
+
+    return True, "default"
+
+
+def gated_retrieve(user_id, text, retrieve):
+    """
+    Run a retrieval function only when the gate allows it.
+
+    Args:
+        user_id: The ID of the current user
+        text: The user's message
+        retrieve: Zero-argument callable performing the retrieval
+
+    Returns:
+        The result of retrieve(), or None when retrieval was skipped
+    """
+    decision, reason = should_retrieve(user_id, text)
+    GATE_DECISIONS.labels("retrieve" if decision else "skip", reason).inc()
+
+    result = None
+    elapsed = 0.0
+    if decision:
+        started = time.perf_counter()
+        result = retrieve()
+        elapsed = time.perf_counter() - started
+
+    with _lock:
+        _stats["decisions"] += 1
+        if decision:
+            _stats["retrieval_runs"] += 1
+            _stats["retrieval_seconds"] += elapsed
+        else:
+            _stats["skipped"] += 1
+            # Credit each skip with the average cost of a retrieval we did run
+            if _stats["retrieval_runs"]:
+                _stats["saved_seconds"] += _stats["retrieval_seconds"] / _stats["retrieval_runs"]
+        snapshot = dict(_stats)
+
+    logger.debug("retrieval gate: %s (%s)", "retrieve" if decision else "skip", reason)
+    if snapshot["decisions"] % LOG_EVERY == 0:
+        logger.info(
+            "retrieval gate: skipped %d/%d (%.0f%%), ~%.1f ms saved",
+            snapshot["skipped"], snapshot["decisions"],
+            100.0 * snapshot["skipped"] / snapshot["decisions"],
+            snapshot["saved_seconds"] * 1000)
+
+    return result
+
+
+def get_gate_stats():
+    """Return a copy of the gate's decision and latency counters."""
+    with _lock:
+        return dict(_stats)
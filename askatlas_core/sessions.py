@@ -0,0 +1,199 @@
+import os
+import hmac
+import time
+import base64
+import struct
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+from . import metrics
+from .config import DATA_DIR
+from .storage import get_user_by_id, revoke_token_id, get_revoked_token_ids
+
+# Lifetime of a session token, in seconds; restoring a session issues a new one
+SESSION_TTL = int(os.getenv("SESSION_TTL", str(12 * 3600)))
+
+# How long a cached user profile is trusted before re-reading it
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "300"))
+PROFILE_CACHE_SIZE = 10_000
+
+# How often the revocation denylist is re-read, so other processes' logouts apply
+DENYLIST_REFRESH = int(os.getenv("SESSION_DENYLIST_REFRESH", "30"))
+
+# A logged-in user counts as an active session for this long after their last request
+ACTIVE_SESSION_WINDOW = int(os.getenv("ACTIVE_SESSION_WINDOW", "300"))
+
+SECRET_FILE = os.path.join(DATA_DIR, "session_secret")
+
+# Payload: user id (uint64), expiry (uint32 unix time), 8-byte random token id
+_PAYLOAD = struct.Struct(">QI8s")
+
+_lock = threading.Lock()
+_profiles = OrderedDict()
+_denylist = {}
+_denylist_loaded_at = 0.0
+_last_seen = {}
+
+CACHE_REQUESTS = metrics.counter(
+    "askatlas_cache_requests_total", "In-process cache lookups", ["cache", "result"])
+
+
+def _active_sessions():
+    cutoff = time.monotonic() - ACTIVE_SESSION_WINDOW
+    with _lock:
+        for user_id in [u for u, seen in _last_seen.items() if seen < cutoff]:
+            del _last_seen[user_id]
+        return len(_last_seen)
+
+
+metrics.gauge("askatlas_active_sessions",
+              "Logged-in users seen within ACTIVE_SESSION_WINDOW seconds", _active_sessions)
+
+
+def _load_secret():
+    """Signing key from SESSION_SECRET, or one generated once and kept in the data directory."""
+    secret = os.getenv("SESSION_SECRET")
+    if secret:
+        return secret.encode("utf-8")
+    if not os.path.exists(SECRET_FILE):
+        # Written in full under a private name, then linked into place: a process starting
+        # at the same time either wins the link or reads the complete file, never an empty one
+        tmp_path = f"{SECRET_FILE}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(secrets.token_bytes(32))
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.link(tmp_path, SECRET_FILE)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(tmp_path)
+    with open(SECRET_FILE, "rb") as f:
+        secret = f.read()
+    if not secret:
+        raise RuntimeError(f"{SECRET_FILE} is empty; delete it or set SESSION_SECRET")
+    return secret
+
+
+_secret = _load_secret()
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _b64decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+def _sign(payload):
+    return hmac.new(_secret, payload, hashlib.sha256).digest()
+
+
+def _decode(token):
+    """Return (user_id, expires_at, token_id) for a well-signed token, else None."""
+    try:
+        payload_part, signature_part = token.split(".")
+        payload = _b64decode(payload_part)
+        signature = _b64decode(signature_part)
+    except (ValueError, AttributeError):
+        return None
+    if len(payload) != _PAYLOAD.size or not hmac.compare_digest(signature, _sign(payload)):
+        return None
+    return _PAYLOAD.unpack(payload)
+
+
+def _refresh_denylist(now):
+    global _denylist_loaded_at
+    if now - _denylist_loaded_at < DENYLIST_REFRESH:
+        return
+    revoked = get_revoked_token_ids(int(now))
+    with _lock:
+        _denylist.clear()
+        _denylist.update(revoked)
+        _denylist_loaded_at = now
+
+
+def issue_token(user_id):
+    """Create a signed session token for a user who just authenticated."""
+    payload = _PAYLOAD.pack(user_id, int(time.time()) + SESSION_TTL, secrets.token_bytes(8))
+    return f"{_b64encode(payload)}.{_b64encode(_sign(payload))}"
+
+
+def verify_token(token):
+    """
+    Check a session token without touching bcrypt.
+
+    Args:
+        token: A token produced by issue_token
+
+    Returns:
+        The user ID, or None if the token is malformed, expired or revoked
+    """
+    decoded = _decode(token)
+    if decoded is None:
+        return None
+    user_id, expires_at, token_id = decoded
+    now = time.time()
+    if expires_at <= now:
+        return None
+    _refresh_denylist(now)
+    if token_id in _denylist:
+        return None
+    return user_id
+
+
+def revoke_token(token):
+    """Add a token to the denylist until it would have expired anyway."""
+    decoded = _decode(token)
+    if decoded is None:
+        return
+    _, expires_at, token_id = decoded
+    revoke_token_id(token_id, expires_at)
+    with _lock:
+        _denylist[token_id] = expires_at
+
+
+def get_cached_user(user_id):
+    """get_user_by_id behind a small in-memory TTL/LRU cache."""
+    now = time.monotonic()
+    with _lock:
+        cached = _profiles.get(user_id)
+        if cached and cached[0] > now:
+            _profiles.move_to_end(user_id)
+            CACHE_REQUESTS.labels("user_profile", "hit").inc()
+            return cached[1]
+
+    CACHE_REQUESTS.labels("user_profile", "miss").inc()
+    user = get_user_by_id(user_id)
+    if user is not None:
+        with _lock:
+            _profiles[user_id] = (now + PROFILE_CACHE_TTL, user)
+            _profiles.move_to_end(user_id)
+            if len(_profiles) > PROFILE_CACHE_SIZE:
+                _profiles.popitem(last=False)
+    return user
+
+
+def mark_active(user_id):
+    """Record a request from a logged-in user, for the active sessions gauge."""
+    with _lock:
+        _last_seen[user_id] = time.monotonic()
+
+
+def authenticate_token(token):
+    """
+    Resolve a session token to a user profile.
+
+    Used both for Streamlit reconnects and for headless API callers.
+
+    Returns:
+        The user dict (id, username, email, created_at), or None
+    """
+    user_id = verify_token(token)
+    if user_id is None:
+        return None
+    return get_cached_user(user_id)
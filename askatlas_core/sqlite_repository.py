@@ -0,0 +1,1229 @@
+"""
+SQLite storage backend: one database file shared by every app process on a host.
+
+WAL mode lets readers in other processes proceed while one writes; archived
+chats live in a second file (ARCHIVE_DB_PATH) so the hot one stays small.
+"""
+import sqlite3
+from .config import DB_PATH, ARCHIVE_DB_PATH
+from .passwords import hash_password, check_password
+from .repository import Repository, Message, instrumented, split_chat_title, search_terms
+
+
+def build_fts_query(text):
+    """Turn free text into an FTS5 MATCH expression that ORs its quoted terms."""
+    return " OR ".join(f'"{term}"' for term in search_terms(text))
+
+
+class SQLiteRepository(Repository):
+    name = "sqlite"
+
+    def __init__(self, db_path=DB_PATH, archive_path=ARCHIVE_DB_PATH):
+        self.db_path = db_path
+        self.archive_path = archive_path
+        self._archive_initialized = False
+        self.init_db()
+        self.ensure_default_admin()
+
+    def connect(self):
+        """Create a connection to the SQLite database."""
+        conn = sqlite3.connect(self.db_path, timeout=10)
+        conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+        return conn
+
+    def ping(self):
+        """Run a trivial query, raising if the database is unreachable."""
+        conn = self.connect()
+        try:
+            conn.execute("SELECT 1")
+        finally:
+            conn.close()
+
+    def connect_archive(self):
+        """Create a connection to the cold archive database, creating its schema on first use."""
+        conn = sqlite3.connect(self.archive_path, timeout=10)
+        conn.row_factory = sqlite3.Row
+        if not self._archive_initialized:
+            self._init_archive_db(conn)
+            self._archive_initialized = True
+        return conn
+
+    def _init_archive_db(self, conn):
+        """Create the archive schema: archived messages keep their ids and embeddings."""
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archived_messages (
+            id INTEGER PRIMARY KEY,
+            chat_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            is_user BOOLEAN NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TIMESTAMP,
+            vector_id TEXT,
+            embedding BLOB
+        )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_archived_chat_id ON archived_messages (chat_id, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_archived_user_id ON archived_messages (user_id)")
+        conn.commit()
+
+    def init_db(self):
+        """Initialize the database with required tables."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        # Lets freed pages be returned a batch at a time; only takes effect on a new
+        # database, existing ones are converted once with retention's convert-vacuum
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+
+        # WAL lets readers in other app processes proceed while one writes
+        cursor.execute("PRAGMA journal_mode=WAL")
+
+        # Users table
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+
+        # Chats table
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            title TEXT DEFAULT 'New Chat',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''')
+
+        # Messages table
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chat_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            is_user BOOLEAN NOT NULL,
+            content TEXT NOT NULL,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            vector_id TEXT,
+            FOREIGN KEY (chat_id) REFERENCES chats (id),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''')
+
+        # Chats whose messages the retention job moved to the archive database
+        cursor.execute("PRAGMA table_info(chats)")
+        if "archived_at" not in {row["name"] for row in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE chats ADD COLUMN archived_at TIMESTAMP")
+            cursor.execute("ALTER TABLE chats ADD COLUMN archived_message_count INTEGER")
+
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_user_id ON messages (user_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_messages_chat_id ON messages (chat_id, id)")
+
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chats_user_title ON chats (user_id, title)")
+
+        # Next free "(n)" suffix per user and base title, so create_chat never probes
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'chat_title_counters'")
+        counters_exist = cursor.fetchone() is not None
+
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS chat_title_counters (
+            user_id INTEGER NOT NULL,
+            base_title TEXT NOT NULL,
+            next_suffix INTEGER NOT NULL,
+            PRIMARY KEY (user_id, base_title)
+        ) WITHOUT ROWID
+        ''')
+
+        if not counters_exist:
+            self._backfill_chat_title_counters(cursor)
+
+        # Denylist of revoked session tokens, by their 8-byte token id
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS revoked_tokens (
+            token_id BLOB PRIMARY KEY,
+            expires_at INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''')
+
+        # Corpus-level document frequencies for auto-titling
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS term_document_frequency (
+            term TEXT PRIMARY KEY,
+            df INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''')
+
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS corpus_stats (
+            name TEXT PRIMARY KEY,
+            value INTEGER NOT NULL
+        ) WITHOUT ROWID
+        ''')
+
+        # Facts and preferences distilled from each user's messages, one row per key
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_memory (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            content TEXT NOT NULL,
+            embedding BLOB,
+            source_message_id INTEGER,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, key),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+        ''')
+
+        # Queries asked of a persona (namespace), how often, and their pre-generated answers
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS answer_cache (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            namespace TEXT NOT NULL,
+            query_key TEXT NOT NULL,
+            query TEXT NOT NULL,
+            hits INTEGER NOT NULL DEFAULT 0,
+            answer TEXT,
+            embedding BLOB,
+            last_asked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            refreshed_at TIMESTAMP,
+            UNIQUE (namespace, query_key)
+        )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_answer_cache_hits ON answer_cache (namespace, hits)")
+
+        # Full-text index over message content, kept in sync with triggers
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages_fts'")
+        fts_exists = cursor.fetchone() is not None
+
+        cursor.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS messages_fts USING fts5(
+            content,
+            content='messages',
+            content_rowid='id'
+        )
+        ''')
+
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_insert AFTER INSERT ON messages BEGIN
+            INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+        END
+        ''')
+
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_delete AFTER DELETE ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+        END
+        ''')
+
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS messages_fts_update AFTER UPDATE OF content ON messages BEGIN
+            INSERT INTO messages_fts (messages_fts, rowid, content) VALUES ('delete', old.id, old.content);
+            INSERT INTO messages_fts (rowid, content) VALUES (new.id, new.content);
+        END
+        ''')
+
+        # Index messages that were written before the FTS table existed
+        if not fts_exists:
+            cursor.execute("INSERT INTO messages_fts (messages_fts) VALUES ('rebuild')")
+
+        conn.commit()
+        conn.close()
+
+    def _backfill_chat_title_counters(self, cursor):
+        """Seed chat_title_counters from chats created before the table existed."""
+        cursor.execute("SELECT user_id, title FROM chats")
+        counters = {}
+        for row in cursor.fetchall():
+            base_title, suffix = split_chat_title(row["title"])
+            key = (row["user_id"], base_title)
+            counters[key] = max(counters.get(key, 0), suffix + 1)
+
+        cursor.executemany(
+            "INSERT INTO chat_title_counters (user_id, base_title, next_suffix) VALUES (?, ?, ?)",
+            [(user_id, base_title, next_suffix) for (user_id, base_title), next_suffix in counters.items()]
+        )
+
+    def create_user(self, username, email, password):
+        """Create a new user in the database."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        # Hash the password (on the bcrypt pool, not the script thread)
+        password_hash = hash_password(password)
+
+        try:
+            cursor.execute(
+                "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
+                (username, email, password_hash)
+            )
+            conn.commit()
+            user_id = cursor.lastrowid
+            conn.close()
+            return user_id
+        except sqlite3.IntegrityError:
+            conn.close()
+            return None
+
+    def verify_user(self, username, password):
+        """Verify user credentials and return user_id if valid."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT id, password_hash FROM users WHERE username = ?", (username,))
+        user = cursor.fetchone()
+        conn.close()
+
+        if user and check_password(password, user['password_hash']):
+            return user['id']
+        return None
+
+    def get_user_by_id(self, user_id):
+        """Get user details by ID."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT id, username, email, created_at FROM users WHERE id = ?", (user_id,))
+        user = cursor.fetchone()
+        conn.close()
+
+        return dict(user) if user else None
+
+    def get_or_create_service_user(self, username):
+        """
+        Get the id of an account that owns app-level data, creating it if needed.
+
+        Service accounts have no usable password, so they cannot log in.
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute(
+            "INSERT OR IGNORE INTO users (username, email, password_hash) VALUES (?, ?, '!')",
+            (username, f"{username}@localhost")
+        )
+        conn.commit()
+        cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
+        user_id = cursor.fetchone()["id"]
+        conn.close()
+
+        return user_id
+
+    def revoke_token_id(self, token_id, expires_at):
+        """Record a revoked session token id and purge entries that have expired."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute(
+            "INSERT OR REPLACE INTO revoked_tokens (token_id, expires_at) VALUES (?, ?)",
+            (token_id, expires_at)
+        )
+        cursor.execute("DELETE FROM revoked_tokens WHERE expires_at <= strftime('%s', 'now')")
+        conn.commit()
+        conn.close()
+
+    def get_revoked_token_ids(self, now):
+        """Get revoked token ids that have not expired yet, mapped to their expiry."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT token_id, expires_at FROM revoked_tokens WHERE expires_at > ?", (now,))
+        revoked = {row["token_id"]: row["expires_at"] for row in cursor.fetchall()}
+        conn.close()
+
+        return revoked
+
+    def _unique_title(self, cursor, user_id, title):
+        """
+        Allocate a title no other chat of the user has, with a single upsert.
+
+        Suffixes for a base title only ever increase, so a requested "Base (5)"
+        keeps its suffix unless a higher one was already handed out.
+        """
+        base_title, suffix = split_chat_title(title or "New Chat")
+        cursor.execute("""
+            INSERT INTO chat_title_counters (user_id, base_title, next_suffix)
+            VALUES (?, ?, ?)
+            ON CONFLICT (user_id, base_title) DO UPDATE SET next_suffix = MAX(next_suffix, excluded.next_suffix - 1) + 1
+            RETURNING next_suffix
+        """, (user_id, base_title, suffix + 1))
+        suffix = cursor.fetchone()[0] - 1
+        return f"{base_title} ({suffix})" if suffix else base_title
+
+    @instrumented("create_chat")
+    def create_chat(self, user_id, title=None):
+        """Create a new chat for a user with a unique title."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        unique_title = self._unique_title(cursor, user_id, title)
+        cursor.execute(
+            "INSERT INTO chats (user_id, title) VALUES (?, ?)",
+            (user_id, unique_title)
+        )
+        conn.commit()
+        chat_id = cursor.lastrowid
+        conn.close()
+
+        return chat_id
+
+    def delete_chat(self, chat_id):
+        """Delete a chat and its messages."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT archived_at FROM chats WHERE id = ?", (chat_id,))
+        chat = cursor.fetchone()
+        cursor.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+        cursor.execute("DELETE FROM chats WHERE id = ?", (chat_id,))
+        conn.commit()
+        conn.close()
+
+        if chat and chat["archived_at"]:
+            self.delete_archived_messages(chat_id)
+
+    def update_chat_title(self, chat_id, title):
+        """Rename a chat, adding a "(n)" suffix if another chat of the user has the title."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT user_id, title FROM chats WHERE id = ?", (chat_id,))
+        chat = cursor.fetchone()
+        if chat and chat["title"] != title:
+            cursor.execute("UPDATE chats SET title = ? WHERE id = ?",
+                           (self._unique_title(cursor, chat["user_id"], title), chat_id))
+            conn.commit()
+        conn.close()
+
+
+    @instrumented("get_user_chats")
+    def get_user_chats(self, user_id):
+        """Get all chats for a user."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT c.id, c.title, c.created_at, c.archived_at IS NOT NULL AS archived,
+                   CASE WHEN c.archived_at IS NULL
+                        THEN (SELECT COUNT(*) FROM messages WHERE chat_id = c.id)
+                        ELSE c.archived_message_count END AS message_count
+            FROM chats c
+            WHERE c.user_id = ?
+            ORDER BY c.created_at DESC, c.id DESC
+        """, (user_id,))
+
+        chats = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return chats
+
+    @instrumented("get_chat_titles")
+    def get_chat_titles(self, user_id, limit=100):
+        """Get [id, title] pairs for a user's most recent chats, without message counts."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute(
+            "SELECT id, title FROM chats WHERE user_id = ? ORDER BY id DESC LIMIT ?",
+            (user_id, limit)
+        )
+        titles = [[row["id"], row["title"]] for row in cursor.fetchall()]
+        conn.close()
+
+        return titles
+
+    @instrumented("save_message")
+    def save_message(self, chat_id, user_id, content, is_user=True, vector_id=None):
+        """Save a message to the database."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute(
+            "INSERT INTO messages (chat_id, user_id, content, is_user, vector_id) VALUES (?, ?, ?, ?, ?)",
+            (chat_id, user_id, content, is_user, vector_id)
+        )
+        conn.commit()
+        message_id = cursor.lastrowid
+        conn.close()
+
+        return message_id
+
+    @instrumented("get_chat_messages")
+    def get_chat_messages(self, chat_id, after_id=None, before_id=None, limit=None):
+        """
+        Get the messages of a chat, oldest first, rehydrating it if archived.
+
+        Args:
+            chat_id: The ID of the chat
+            after_id: Only return messages with a higher ID
+            before_id: Only return messages with a lower ID
+            limit: Only return the most recent `limit` of the matching messages
+
+        Returns:
+            List of Message records
+        """
+        conditions = ["chat_id = ?"]
+        params = [chat_id]
+        if after_id is not None:
+            conditions.append("id > ?")
+            params.append(after_id)
+        if before_id is not None:
+            conditions.append("id < ?")
+            params.append(before_id)
+
+        query = f"""
+            SELECT id, is_user, content, timestamp, vector_id
+            FROM messages
+            WHERE {" AND ".join(conditions)}
+        """
+        if limit is not None:
+            query += " ORDER BY id DESC LIMIT ?"
+            params.append(limit)
+        else:
+            query += " ORDER BY id"
+
+        conn = self.connect()
+        cursor = conn.cursor()
+        if after_id is None:
+            # Opening an archived chat brings its messages back first
+            cursor.execute("SELECT archived_at FROM chats WHERE id = ?", (chat_id,))
+            chat = cursor.fetchone()
+            if chat and chat["archived_at"]:
+                from .retention import rehydrate_chat
+                rehydrate_chat(chat_id, self)
+        cursor.execute(query, params)
+        messages = [Message.from_row(row) for row in cursor.fetchall()]
+        conn.close()
+
+        if limit is not None:
+            messages.reverse()
+        return messages
+
+    def get_all_user_messages(self, user_id):
+        """Get all messages across all chats for a user."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT m.id, m.chat_id, m.content, m.is_user, m.timestamp, m.vector_id
+            FROM messages m
+            JOIN chats c ON m.chat_id = c.id
+            WHERE c.user_id = ?
+            ORDER BY m.timestamp, m.id
+        """, (user_id,))
+
+        messages = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return messages
+
+    @instrumented("search_messages_fts")
+    def search_messages_fts(self, user_id, query_text, limit=10, chat_ids=None, history_window=None):
+        """
+        Lexical search over a user's messages using the FTS5 index.
+
+        Args:
+            user_id: The ID of the user whose messages to search
+            query_text: Free text; every word is matched as a separate term
+            limit: Maximum number of results to return
+            chat_ids: Only search these chats (None for all of them)
+            history_window: (chat_id, first message id) of the history already
+                in the prompt; those messages are skipped
+
+        Returns:
+            List of message dicts ordered by BM25 relevance (best first)
+        """
+        match_query = build_fts_query(query_text)
+        if not match_query:
+            return []
+
+        conditions = ["messages_fts MATCH ?", "m.user_id = ?"]
+        params = [match_query, user_id]
+        if chat_ids is not None:
+            chat_ids = list(chat_ids)
+            if not chat_ids:
+                return []
+            conditions.append(f"m.chat_id IN ({', '.join('?' for _ in chat_ids)})")
+            params.extend(chat_ids)
+        if history_window is not None:
+            conditions.append("NOT (m.chat_id = ? AND m.id >= ?)")
+            params.extend(history_window)
+
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute(f"""
+            SELECT m.id AS message_id, m.chat_id, m.is_user, m.content,
+                   bm25(messages_fts) AS score
+            FROM messages_fts
+            JOIN messages m ON m.id = messages_fts.rowid
+            WHERE {" AND ".join(conditions)}
+            ORDER BY score
+            LIMIT ?
+        """, params + [limit])
+
+        messages = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return messages
+
+    @instrumented("get_messages_by_ids")
+    def get_messages_by_ids(self, message_ids):
+        """
+        Fetch several messages in one query.
+
+        Args:
+            message_ids: Iterable of message IDs
+
+        Returns:
+            Dict mapping message ID to message dict; unknown IDs are omitted
+        """
+        message_ids = list(message_ids)
+        if not message_ids:
+            return {}
+
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        placeholders = ", ".join("?" for _ in message_ids)
+        cursor.execute(f"""
+            SELECT id, chat_id, is_user, content, timestamp
+            FROM messages
+            WHERE id IN ({placeholders})
+        """, message_ids)
+
+        messages = {row["id"]: dict(row) for row in cursor.fetchall()}
+        conn.close()
+
+        return messages
+
+    @instrumented("count_user_chats_with_messages")
+    def count_user_chats_with_messages(self, user_id):
+        """Count how many of a user's chats contain at least one message, archived chats included."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT COUNT(*) FROM chats c
+            WHERE c.user_id = ?
+              AND (c.archived_message_count > 0
+                   OR EXISTS (SELECT 1 FROM messages m WHERE m.chat_id = c.id))
+        """, (user_id,))
+        count = cursor.fetchone()[0]
+        conn.close()
+
+        return count
+
+    @instrumented("update_message_vector_id")
+    def update_message_vector_id(self, message_id, vector_id):
+        """Update the vector_id for a message."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute(
+            "UPDATE messages SET vector_id = ? WHERE id = ?",
+            (vector_id, message_id)
+        )
+        conn.commit()
+        conn.close()
+
+    def add_document_terms(self, documents):
+        """
+        Count each document's distinct terms into the corpus document frequencies.
+
+        Args:
+            documents: List of term lists, one per document
+        """
+        counts = {}
+        for terms in documents:
+            for term in set(terms):
+                counts[term] = counts.get(term, 0) + 1
+
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.executemany("""
+            INSERT INTO term_document_frequency (term, df) VALUES (?, ?)
+            ON CONFLICT (term) DO UPDATE SET df = df + excluded.df
+        """, counts.items())
+        cursor.execute("""
+            INSERT INTO corpus_stats (name, value) VALUES ('documents', ?)
+            ON CONFLICT (name) DO UPDATE SET value = value + excluded.value
+        """, (len(documents),))
+        conn.commit()
+        conn.close()
+
+    def get_document_frequencies(self, terms):
+        """Return (number of documents, {term: df}) for the given terms."""
+        terms = list(terms)
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT value FROM corpus_stats WHERE name = 'documents'")
+        row = cursor.fetchone()
+        frequencies = {}
+        if terms:
+            placeholders = ", ".join("?" for _ in terms)
+            cursor.execute(
+                f"SELECT term, df FROM term_document_frequency WHERE term IN ({placeholders})", terms)
+            frequencies = {r["term"]: r["df"] for r in cursor.fetchall()}
+        conn.close()
+
+        return (row["value"] if row else 0), frequencies
+
+    def get_max_message_id(self):
+        """Get the highest message id, or 0 if there are no messages."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM messages")
+        max_id = cursor.fetchone()[0]
+        conn.close()
+
+        return max_id
+
+    def iter_message_contents(self, max_id, batch_size=500):
+        """Yield batches of message contents up to max_id, in id order, without loading them all."""
+        last_id = 0
+        while True:
+            conn = self.connect()
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, content FROM messages WHERE id > ? AND id <= ? ORDER BY id LIMIT ?",
+                (last_id, max_id, batch_size)
+            )
+            rows = cursor.fetchall()
+            conn.close()
+            if not rows:
+                return
+            last_id = rows[-1]["id"]
+            yield [r["content"] for r in rows]
+
+    def get_memory_items(self, user_id):
+        """Get a user's memory items, most recently updated first."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT id, kind, key, content, embedding, source_message_id, updated_at
+            FROM user_memory
+            WHERE user_id = ?
+            ORDER BY updated_at DESC, id DESC
+        """, (user_id,))
+        items = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return items
+
+    def upsert_memory_items(self, user_id, items, max_items):
+        """
+        Insert or replace memory items by key, keeping the user's newest `max_items`.
+
+        Args:
+            user_id: The ID of the user the items describe
+            items: Dicts with kind, key, content, embedding and source_message_id
+            max_items: Items kept per user; the least recently updated go first
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        # REPLACE gives a replaced item a new id, so ids order writes made within the same second
+        cursor.executemany("""
+            INSERT OR REPLACE INTO user_memory (user_id, kind, key, content, embedding, source_message_id, updated_at)
+            VALUES (:user_id, :kind, :key, :content, :embedding, :source_message_id, CURRENT_TIMESTAMP)
+        """, [dict(item, user_id=user_id) for item in items])
+        cursor.execute("""
+            DELETE FROM user_memory
+            WHERE user_id = ? AND id NOT IN (
+                SELECT id FROM user_memory WHERE user_id = ? ORDER BY updated_at DESC, id DESC LIMIT ?
+            )
+        """, (user_id, user_id, max_items))
+        conn.commit()
+        conn.close()
+
+    def delete_memory_items(self, user_id, keys=None):
+        """Delete the user's memory items with these keys, or all of them."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        if keys is None:
+            cursor.execute("DELETE FROM user_memory WHERE user_id = ?", (user_id,))
+        else:
+            cursor.executemany(
+                "DELETE FROM user_memory WHERE user_id = ? AND key = ?", [(user_id, key) for key in keys])
+        conn.commit()
+        conn.close()
+
+    def record_cache_queries(self, namespace, queries):
+        """Count one ask of each (query_key, query) pair."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.executemany("""
+            INSERT INTO answer_cache (namespace, query_key, query, hits, last_asked_at)
+            VALUES (?, ?, ?, 1, CURRENT_TIMESTAMP)
+            ON CONFLICT (namespace, query_key) DO UPDATE SET
+                hits = hits + 1, last_asked_at = excluded.last_asked_at
+        """, [(namespace, key, query) for key, query in queries])
+        conn.commit()
+        conn.close()
+
+    def get_frequent_queries(self, namespace, limit, min_hits=1):
+        """Get the most asked queries of a namespace, answered or not."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT query_key, query, hits, refreshed_at
+            FROM answer_cache
+            WHERE namespace = ? AND hits >= ?
+            ORDER BY hits DESC, id
+            LIMIT ?
+        """, (namespace, min_hits, limit))
+        queries = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return queries
+
+    def get_cached_answers(self, namespace):
+        """Get every answered query of a namespace."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT query_key, query, answer, embedding, refreshed_at
+            FROM answer_cache
+            WHERE namespace = ? AND answer IS NOT NULL
+        """, (namespace,))
+        answers = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return answers
+
+    def save_cached_answers(self, namespace, entries):
+        """
+        Store generated answers, keeping the ask counts of queries already recorded.
+
+        Args:
+            namespace: The persona the answers were generated for
+            entries: Dicts with query_key, query, answer and embedding
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.executemany("""
+            INSERT INTO answer_cache (namespace, query_key, query, answer, embedding, refreshed_at)
+            VALUES (:namespace, :query_key, :query, :answer, :embedding, CURRENT_TIMESTAMP)
+            ON CONFLICT (namespace, query_key) DO UPDATE SET
+                answer = excluded.answer, embedding = excluded.embedding, refreshed_at = excluded.refreshed_at
+        """, [dict(entry, namespace=namespace) for entry in entries])
+        conn.commit()
+        conn.close()
+
+    def prune_answer_cache(self, days):
+        """Delete cached queries not asked for in `days`, returning how many were deleted."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute(
+            "DELETE FROM answer_cache WHERE last_asked_at < datetime('now', ?)", (f"-{int(days)} days",))
+        deleted = cursor.rowcount
+        conn.commit()
+        conn.close()
+
+        return deleted
+
+    def get_user_for_export(self, username):
+        """Get a user's full row, password hash included, or None."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute(
+            "SELECT id, username, email, password_hash, created_at FROM users WHERE username = ?",
+            (username,)
+        )
+        user = cursor.fetchone()
+        conn.close()
+
+        return dict(user) if user else None
+
+    def get_user_chats_page(self, user_id, after_id, max_id, limit):
+        """Get up to `limit` of a user's chats with after_id < id <= max_id, in id order."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT id, title, created_at, archived_at
+            FROM chats
+            WHERE user_id = ? AND id > ? AND id <= ?
+            ORDER BY id
+            LIMIT ?
+        """, (user_id, after_id, max_id, limit))
+        chats = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return chats
+
+    def get_user_messages_page(self, user_id, after_id, max_id, limit):
+        """Get up to `limit` of a user's messages with after_id < id <= max_id, in id order."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT id, chat_id, is_user, content, timestamp, vector_id
+            FROM messages
+            WHERE user_id = ? AND id > ? AND id <= ?
+            ORDER BY id
+            LIMIT ?
+        """, (user_id, after_id, max_id, limit))
+        messages = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return messages
+
+    def get_user_max_ids(self, user_id):
+        """Get the highest chat id and message id of a user, 0 where there are none."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM chats WHERE user_id = ?", (user_id,))
+        max_chat_id = cursor.fetchone()[0]
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM messages WHERE user_id = ?", (user_id,))
+        max_message_id = cursor.fetchone()[0]
+        conn.close()
+
+        return max_chat_id, max_message_id
+
+    def import_user(self, username, email, password_hash, created_at):
+        """Insert a user exactly as exported, or return None if the username or email is taken."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        try:
+            cursor.execute(
+                "INSERT INTO users (username, email, password_hash, created_at) VALUES (?, ?, ?, ?)",
+                (username, email, password_hash, created_at)
+            )
+            conn.commit()
+            return cursor.lastrowid
+        except sqlite3.IntegrityError:
+            return None
+        finally:
+            conn.close()
+
+    def import_chats(self, user_id, chats):
+        """
+        Insert exported chats for a user in one transaction.
+
+        Args:
+            user_id: The ID of the user who owns the chats
+            chats: Dicts with the exported id, title and created_at
+
+        Returns:
+            Dict mapping each exported chat ID to its new ID
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        new_ids = {}
+        counters = {}
+        for chat in chats:
+            cursor.execute(
+                "INSERT INTO chats (user_id, title, created_at) VALUES (?, ?, ?)",
+                (user_id, chat["title"], chat["created_at"])
+            )
+            new_ids[chat["id"]] = cursor.lastrowid
+            base_title, suffix = split_chat_title(chat["title"])
+            counters[base_title] = max(counters.get(base_title, 0), suffix + 1)
+
+        # Keep create_chat from handing out a title an imported chat already has
+        cursor.executemany("""
+            INSERT INTO chat_title_counters (user_id, base_title, next_suffix) VALUES (?, ?, ?)
+            ON CONFLICT (user_id, base_title) DO UPDATE SET next_suffix = MAX(next_suffix, excluded.next_suffix)
+        """, [(user_id, base_title, next_suffix) for base_title, next_suffix in counters.items()])
+        conn.commit()
+        conn.close()
+
+        return new_ids
+
+    def import_messages(self, user_id, messages):
+        """
+        Insert exported messages in one transaction.
+
+        Args:
+            user_id: The ID of the user who owns the messages
+            messages: Dicts with the new chat_id, is_user, content and timestamp
+
+        Returns:
+            List of the new message IDs, in the same order
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        new_ids = []
+        for msg in messages:
+            cursor.execute(
+                "INSERT INTO messages (chat_id, user_id, is_user, content, timestamp) VALUES (?, ?, ?, ?, ?)",
+                (msg["chat_id"], user_id, msg["is_user"], msg["content"], msg["timestamp"])
+            )
+            new_ids.append(cursor.lastrowid)
+        conn.commit()
+        conn.close()
+
+        return new_ids
+
+    def update_message_vector_ids(self, pairs):
+        """Set vector_id for many messages; pairs are (message_id, vector_id)."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.executemany(
+            "UPDATE messages SET vector_id = ? WHERE id = ?",
+            [(vector_id, message_id) for message_id, vector_id in pairs]
+        )
+        conn.commit()
+        conn.close()
+
+    def find_inactive_chats(self, days, after_id=0, limit=100):
+        """
+        Get ids of unarchived chats whose last message is older than `days`.
+
+        Chats are scanned in id order from after_id; the newest message of each
+        is found through the (chat_id, id) index.
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT c.id
+            FROM chats c
+            WHERE c.id > ? AND c.archived_at IS NULL
+              AND (SELECT timestamp FROM messages WHERE chat_id = c.id ORDER BY id DESC LIMIT 1)
+                  < datetime('now', ?)
+            ORDER BY c.id
+            LIMIT ?
+        """, (after_id, f"-{int(days)} days", limit))
+        chat_ids = [row["id"] for row in cursor.fetchall()]
+        conn.close()
+
+        return chat_ids
+
+    def get_messages_for_archive(self, chat_id):
+        """Get every column of a chat's messages, in id order."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT id, chat_id, user_id, is_user, content, timestamp, vector_id
+            FROM messages
+            WHERE chat_id = ?
+            ORDER BY id
+        """, (chat_id,))
+        messages = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return messages
+
+    def save_archived_messages(self, messages):
+        """Write message rows, each with an embedding (bytes or None), to the archive database."""
+        conn = self.connect_archive()
+        cursor = conn.cursor()
+
+        cursor.executemany("""
+            INSERT OR REPLACE INTO archived_messages
+                (id, chat_id, user_id, is_user, content, timestamp, vector_id, embedding)
+            VALUES (:id, :chat_id, :user_id, :is_user, :content, :timestamp, :vector_id, :embedding)
+        """, messages)
+        conn.commit()
+        conn.close()
+
+    def mark_chat_archived(self, chat_id, last_message_id, message_count):
+        """
+        Remove an archived chat's messages from the hot database.
+
+        Fails, changing nothing, if a message newer than last_message_id
+        arrived since the chat was copied to the archive.
+
+        Returns:
+            True if the chat is now archived
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT 1 FROM messages WHERE chat_id = ? AND id > ? LIMIT 1", (chat_id, last_message_id))
+        if cursor.fetchone():
+            conn.rollback()
+            conn.close()
+            return False
+
+        cursor.execute("DELETE FROM messages WHERE chat_id = ?", (chat_id,))
+        cursor.execute(
+            "UPDATE chats SET archived_at = CURRENT_TIMESTAMP, archived_message_count = ? WHERE id = ?",
+            (message_count, chat_id)
+        )
+        conn.commit()
+        conn.close()
+
+        return True
+
+    def get_archived_messages(self, chat_id):
+        """Get a chat's rows from the archive database, in id order."""
+        conn = self.connect_archive()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT id, chat_id, user_id, is_user, content, timestamp, vector_id, embedding
+            FROM archived_messages
+            WHERE chat_id = ?
+            ORDER BY id
+        """, (chat_id,))
+        messages = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return messages
+
+    def get_archived_messages_page(self, user_id, after_id, limit):
+        """Get up to `limit` of a user's archived rows with id > after_id, in id order."""
+        conn = self.connect_archive()
+        cursor = conn.cursor()
+
+        cursor.execute("""
+            SELECT id, chat_id, is_user, content, timestamp, embedding
+            FROM archived_messages
+            WHERE user_id = ? AND id > ?
+            ORDER BY id
+            LIMIT ?
+        """, (user_id, after_id, limit))
+        messages = [dict(row) for row in cursor.fetchall()]
+        conn.close()
+
+        return messages
+
+    def restore_archived_messages(self, chat_id, messages):
+        """
+        Put an archived chat's messages back in the hot database, keeping their ids.
+
+        Returns:
+            True if this call restored the chat, False if it was not archived
+            (for example because another session restored it first)
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT archived_at FROM chats WHERE id = ?", (chat_id,))
+        chat = cursor.fetchone()
+        if not chat or not chat["archived_at"]:
+            conn.rollback()
+            conn.close()
+            return False
+
+        cursor.executemany("""
+            INSERT OR IGNORE INTO messages (id, chat_id, user_id, is_user, content, timestamp, vector_id)
+            VALUES (:id, :chat_id, :user_id, :is_user, :content, :timestamp, :vector_id)
+        """, messages)
+        cursor.execute(
+            "UPDATE chats SET archived_at = NULL, archived_message_count = NULL WHERE id = ?", (chat_id,))
+        conn.commit()
+        conn.close()
+
+        return True
+
+    def delete_archived_messages(self, chat_id):
+        """Delete a chat's rows from the archive database."""
+        conn = self.connect_archive()
+        cursor = conn.cursor()
+
+        cursor.execute("DELETE FROM archived_messages WHERE chat_id = ?", (chat_id,))
+        conn.commit()
+        conn.close()
+
+    def get_restored_chats_with_archive_rows(self, limit=100):
+        """Get ids of chats that are back in the hot database but still have archive rows."""
+        conn = self.connect_archive()
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT chat_id FROM archived_messages ORDER BY chat_id")
+        chat_ids = [row["chat_id"] for row in cursor.fetchall()]
+        conn.close()
+        if not chat_ids:
+            return []
+
+        conn = self.connect()
+        cursor = conn.cursor()
+        restored = []
+        for start in range(0, len(chat_ids), 500):
+            batch = chat_ids[start:start + 500]
+            placeholders = ", ".join("?" for _ in batch)
+            cursor.execute(
+                f"SELECT id FROM chats WHERE id IN ({placeholders}) AND archived_at IS NULL", batch)
+            restored.extend(row["id"] for row in cursor.fetchall())
+            if len(restored) >= limit:
+                break
+        conn.close()
+
+        return restored[:limit]
+
+    # SQLite-only maintenance, used by the retention worker
+
+    def database_files(self):
+        """Backup name -> path of each database file."""
+        return {"chat_app": self.db_path, "chat_archive": self.archive_path}
+
+    def incremental_vacuum(self, pages):
+        """
+        Return up to `pages` free pages of each database to the filesystem.
+
+        Returns:
+            Dict of pages freed per database, None for one that is not in
+            incremental auto-vacuum mode
+        """
+        freed = {}
+        for name, connect in (("chat_app", self.connect), ("chat_archive", self.connect_archive)):
+            conn = connect()
+            try:
+                if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                    freed[name] = None
+                    continue
+                before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+                freed[name] = before - conn.execute("PRAGMA freelist_count").fetchone()[0]
+            finally:
+                conn.close()
+        return freed
+
+    def convert_to_incremental_vacuum(self):
+        """
+        Switch an existing hot database to incremental auto-vacuum.
+
+        Needs a full VACUUM, which blocks writers while it rewrites the file.
+        """
+        conn = self.connect()
+        try:
+            conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            conn.execute("VACUUM")
+            return conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+        finally:
+            conn.close()
+
+    def ensure_default_admin(self):
+        """Ensure an admin user with username=admin and password=admin exists."""
+        conn = self.connect()
+        cursor = conn.cursor()
+
+        cursor.execute("SELECT id FROM users WHERE username = 'admin'")
+        if not cursor.fetchone():
+            password_hash = hash_password("admin")
+            cursor.execute("INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
+                           ("admin", "admin@example.com", password_hash))
+            conn.commit()
+        conn.close()
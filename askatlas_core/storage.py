@@ -0,0 +1,98 @@
+"""
+Users, chats and messages for every front-end, stored by the backend named
+in STORAGE_BACKEND:
+
+- sqlite (default): data/chat_app.db, shared by the app processes of one host
+- postgres: POSTGRES_DSN, shared by any number of app replicas
+
+Callers use the functions below and never name a backend; see
+repository.Repository for what each one does.
+"""
+import os
+from .repository import Message, Repository
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+
+
+def create_repository(backend=STORAGE_BACKEND, **kwargs):
+    """Create a storage backend by name; keyword arguments go to its constructor."""
+    if backend == "sqlite":
+        from .sqlite_repository import SQLiteRepository
+        return SQLiteRepository(**kwargs)
+    if backend == "postgres":
+        from .postgres_repository import PostgresRepository
+        return PostgresRepository(**kwargs)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+# Creates the schema and default admin on first import
+repository = create_repository()
+ping = repository.ping
+
+# Users
+create_user = repository.create_user
+verify_user = repository.verify_user
+get_user_by_id = repository.get_user_by_id
+get_or_create_service_user = repository.get_or_create_service_user
+ensure_default_admin = repository.ensure_default_admin
+revoke_token_id = repository.revoke_token_id
+get_revoked_token_ids = repository.get_revoked_token_ids
+
+# Chats
+create_chat = repository.create_chat
+delete_chat = repository.delete_chat
+update_chat_title = repository.update_chat_title
+get_user_chats = repository.get_user_chats
+get_chat_titles = repository.get_chat_titles
+
+# Messages
+save_message = repository.save_message
+get_chat_messages = repository.get_chat_messages
+get_all_user_messages = repository.get_all_user_messages
+search_messages_fts = repository.search_messages_fts
+get_messages_by_ids = repository.get_messages_by_ids
+count_user_chats_with_messages = repository.count_user_chats_with_messages
+update_message_vector_id = repository.update_message_vector_id
+update_message_vector_ids = repository.update_message_vector_ids
+get_max_message_id = repository.get_max_message_id
+iter_message_contents = repository.iter_message_contents
+
+# Auto-titling corpus
+add_document_terms = repository.add_document_terms
+get_document_frequencies = repository.get_document_frequencies
+
+# User memory
+get_memory_items = repository.get_memory_items
+upsert_memory_items = repository.upsert_memory_items
+delete_memory_items = repository.delete_memory_items
+
+# Answer cache
+record_cache_queries = repository.record_cache_queries
+get_frequent_queries = repository.get_frequent_queries
+get_cached_answers = repository.get_cached_answers
+save_cached_answers = repository.save_cached_answers
+prune_answer_cache = repository.prune_answer_cache
+
+# Export and import
+get_user_for_export = repository.get_user_for_export
+get_user_chats_page = repository.get_user_chats_page
+get_user_messages_page = repository.get_user_messages_page
+get_user_max_ids = repository.get_user_max_ids
+import_user = repository.import_user
+import_chats = repository.import_chats
+import_messages = repository.import_messages
+
+# Retention
+find_inactive_chats = repository.find_inactive_chats
+get_messages_for_archive = repository.get_messages_for_archive
+save_archived_messages = repository.save_archived_messages
+mark_chat_archived = repository.mark_chat_archived
+get_archived_messages = repository.get_archived_messages
+get_archived_messages_page = repository.get_archived_messages_page
+restore_archived_messages = repository.restore_archived_messages
+delete_archived_messages = repository.delete_archived_messages
+get_restored_chats_with_archive_rows = repository.get_restored_chats_with_archive_rows
+
+# Raw connections for SQLite-only tooling (benchmarks, maintenance)
+if repository.name == "sqlite":
+    get_db_connection = repository.connect
@@ -0,0 +1,505 @@
+"""
+Conformance checks every storage backend must pass.
+
+Each check exercises one area of the Repository interface against a live
+backend and fails with an AssertionError describing the first difference
+from the expected behaviour. Usernames carry a random run tag, so the
+checks can also run against a database that already holds data.
+
+    python -m askatlas_core.storage_conformance --backend sqlite
+    python -m askatlas_core.storage_conformance --backend postgres --dsn postgresql://localhost/askatlas_test
+    python -m askatlas_core.storage_conformance --backend postgres --start-postgres
+
+--start-postgres runs a throwaway server from the initdb and pg_ctl on the
+PATH for the length of the run.
+"""
+import os
+import sys
+import time
+import uuid
+import shutil
+import atexit
+import tempfile
+import argparse
+import subprocess
+import traceback
+from datetime import datetime
+
+
+def _tag():
+    return uuid.uuid4().hex[:8]
+
+
+def _user(repo, prefix):
+    name = f"{prefix}_{_tag()}"
+    return repo.create_user(name, f"{name}@example.com", "secret"), name
+
+
+def check_users(repo):
+    repo.ping()
+    user_id, name = _user(repo, "users")
+    assert isinstance(user_id, int), f"create_user returned {user_id!r}"
+    assert repo.create_user(name, f"other_{name}@example.com", "x") is None, "duplicate username accepted"
+    assert repo.create_user(f"other_{name}", f"{name}@example.com", "x") is None, "duplicate email accepted"
+
+    assert repo.verify_user(name, "secret") == user_id
+    assert repo.verify_user(name, "wrong") is None
+    assert repo.verify_user(f"missing_{name}", "secret") is None
+
+    user = repo.get_user_by_id(user_id)
+    assert {k: user[k] for k in ("id", "username", "email")} == \
+        {"id": user_id, "username": name, "email": f"{name}@example.com"}, user
+    datetime.fromisoformat(user["created_at"])
+    assert repo.get_user_by_id(-1) is None
+
+    service_id = repo.get_or_create_service_user(f"service_{name}")
+    assert repo.get_or_create_service_user(f"service_{name}") == service_id
+    assert repo.get_user_by_id(service_id)["email"] == f"service_{name}@localhost"
+
+    repo.ensure_default_admin()
+    repo.ensure_default_admin()
+    assert repo.verify_user("admin", "admin") is not None
+
+
+def check_revoked_tokens(repo):
+    now = int(time.time())
+    live, expired = os.urandom(8), os.urandom(8)
+    repo.revoke_token_id(live, now + 3600)
+    repo.revoke_token_id(expired, now - 10)
+    revoked = repo.get_revoked_token_ids(now)
+    assert revoked.get(live) == now + 3600, "revoked token id missing or not bytes"
+    assert expired not in revoked
+
+    # Revoking again extends the expiry
+    repo.revoke_token_id(live, now + 7200)
+    assert repo.get_revoked_token_ids(now)[live] == now + 7200
+
+
+def check_chats(repo):
+    user_id, _ = _user(repo, "chats")
+    first = repo.create_chat(user_id)
+    second = repo.create_chat(user_id)
+    named = repo.create_chat(user_id, "Trip plans")
+    named_again = repo.create_chat(user_id, "Trip plans")
+
+    titles = dict(repo.get_chat_titles(user_id))
+    assert titles == {first: "New Chat", second: "New Chat (1)",
+                      named: "Trip plans", named_again: "Trip plans (1)"}, titles
+    assert [chat_id for chat_id, _ in repo.get_chat_titles(user_id, limit=2)] == [named_again, named]
+
+    repo.update_chat_title(first, "Renamed")
+    repo.save_message(second, user_id, "hello")
+    repo.save_message(second, user_id, "hi", is_user=False)
+    chats = repo.get_user_chats(user_id)
+    assert [c["id"] for c in chats] == [named_again, named, second, first], "chats not newest first"
+    by_id = {c["id"]: c for c in chats}
+    assert by_id[first]["title"] == "Renamed"
+    assert by_id[second]["message_count"] == 2 and by_id[first]["message_count"] == 0
+    assert not any(c["archived"] for c in chats)
+    assert repo.count_user_chats_with_messages(user_id) == 1
+
+    repo.delete_chat(second)
+    assert second not in dict(repo.get_chat_titles(user_id))
+    assert repo.get_chat_messages(second) == []
+
+    # Renames and explicit suffixes go through the same allocation, so titles stay unique
+    repo.update_chat_title(named, "Renamed")
+    repo.update_chat_title(first, "Renamed")
+    suffixed = repo.create_chat(user_id, "Trip plans (5)")
+    after = repo.create_chat(user_id, "Trip plans")
+    repo.update_chat_title(named_again, "Trip plans (5)")
+    titles = dict(repo.get_chat_titles(user_id))
+    assert titles[named] == "Renamed (1)" and titles[first] == "Renamed", titles
+    assert titles[suffixed] == "Trip plans (5)" and titles[after] == "Trip plans (6)", titles
+    assert len(set(titles.values())) == len(titles), titles
+
+
+def check_messages(repo):
+    user_id, _ = _user(repo, "messages")
+    chat_id = repo.create_chat(user_id)
+    ids = [repo.save_message(chat_id, user_id, f"message {i}", is_user=i % 2 == 0) for i in range(10)]
+    assert ids == sorted(ids) and len(set(ids)) == 10
+
+    messages = repo.get_chat_messages(chat_id)
+    assert [m.id for m in messages] == ids
+    assert messages[0].is_user is True and messages[1].is_user is False
+    assert messages[1].role == "assistant" and messages[0].content == "message 0"
+    assert isinstance(messages[0].timestamp, datetime)
+
+    assert [m.id for m in repo.get_chat_messages(chat_id, after_id=ids[6])] == ids[7:]
+    assert [m.id for m in repo.get_chat_messages(chat_id, before_id=ids[3])] == ids[:3]
+    assert [m.id for m in repo.get_chat_messages(chat_id, limit=4)] == ids[6:], "limit must keep the newest"
+    assert [m.id for m in repo.get_chat_messages(chat_id, before_id=ids[6], limit=2)] == ids[4:6]
+    assert repo.get_chat_messages(chat_id, after_id=ids[-1]) == []
+
+    found = repo.get_messages_by_ids([ids[2], ids[5], -1])
+    assert set(found) == {ids[2], ids[5]}
+    assert found[ids[2]]["content"] == "message 2" and found[ids[2]]["chat_id"] == chat_id
+    assert repo.get_messages_by_ids([]) == {}
+
+    repo.update_message_vector_id(ids[0], "vec-0")
+    repo.update_message_vector_ids([(ids[1], "vec-1"), (ids[2], "vec-2")])
+    repo.update_message_vector_ids([])
+    assert [m.vector_id for m in repo.get_chat_messages(chat_id, limit=10)[:4]] == ["vec-0", "vec-1", "vec-2", None]
+
+    everything = repo.get_all_user_messages(user_id)
+    assert [m["id"] for m in everything] == ids
+    assert everything[0]["vector_id"] == "vec-0"
+
+    assert repo.get_max_message_id() >= ids[-1]
+    batches = list(repo.iter_message_contents(ids[-1], batch_size=4))
+    contents = [c for batch in batches for c in batch]
+    assert all(len(batch) <= 4 for batch in batches)
+    assert contents[-10:] == [f"message {i}" for i in range(10)]
+
+
+def check_search(repo):
+    user_id, _ = _user(repo, "search")
+    other_id, _ = _user(repo, "search")
+    chat_id = repo.create_chat(user_id)
+    other_chat = repo.create_chat(other_id)
+    word = f"zebra{_tag()}"
+    both = repo.save_message(chat_id, user_id, f"The {word} crossed the river quickly")
+    one = repo.save_message(chat_id, user_id, f"A {word} in a field")
+    repo.save_message(chat_id, user_id, "Nothing relevant here")
+    repo.save_message(other_chat, other_id, f"Another {word} by the river")
+
+    results = repo.search_messages_fts(user_id, f"{word.upper()} river?")
+    assert [r["message_id"] for r in results] == [both, one], "expected any-word match, best first"
+    assert results[0]["score"] <= results[1]["score"], "lower scores must be better"
+    assert results[0]["chat_id"] == chat_id and results[0]["content"].startswith("The ")
+    assert len(repo.search_messages_fts(user_id, word, limit=1)) == 1
+    assert repo.search_messages_fts(user_id, " ?! ") == []
+    assert repo.search_messages_fts(user_id, "what is in the") == [], "stop words alone must not match"
+    assert {r["message_id"] for r in repo.search_messages_fts(user_id, f"what about the {word} in a")} == {both, one}
+    assert repo.search_messages_fts(user_id, "'; DROP TABLE messages; --") == []
+
+    # Scopes and the history window are applied before the limit
+    second_chat = repo.create_chat(user_id)
+    elsewhere = repo.save_message(second_chat, user_id, f"{word} river river")
+    assert [r["message_id"] for r in repo.search_messages_fts(user_id, word, chat_ids=[second_chat])] == [elsewhere]
+    assert repo.search_messages_fts(user_id, word, chat_ids=[]) == []
+    assert [r["message_id"] for r in repo.search_messages_fts(
+        user_id, word, limit=1, history_window=(second_chat, elsewhere))] != [elsewhere]
+    assert {r["message_id"] for r in repo.search_messages_fts(
+        user_id, word, history_window=(chat_id, one))} == {both, elsewhere}
+
+
+def check_corpus(repo):
+    a, b = f"alpha{_tag()}", f"beta{_tag()}"
+    before, _ = repo.get_document_frequencies([])
+    repo.add_document_terms([[a, a, b], [a]])
+    documents, frequencies = repo.get_document_frequencies([a, b, "missing" + _tag()])
+    assert documents == before + 2
+    assert frequencies == {a: 2, b: 1}, frequencies
+
+
+def check_memory(repo):
+    user_id, _ = _user(repo, "memory")
+    other_id, _ = _user(repo, "memory_other")
+    vector = bytes(range(16))
+
+    def item(key, content, embedding=None):
+        return {"kind": key.split(":")[0], "key": key, "content": content,
+                "embedding": embedding, "source_message_id": None}
+
+    repo.upsert_memory_items(user_id, [item("home", "Lives in Lisbon", vector), item("diet:vegan", "Diet: vegan")], 3)
+    repo.upsert_memory_items(other_id, [item("home", "Lives in Oslo")], 3)
+    items = {i["key"]: i for i in repo.get_memory_items(user_id)}
+    assert set(items) == {"home", "diet:vegan"}, items
+    assert bytes(items["home"]["embedding"]) == vector
+    assert items["diet:vegan"]["embedding"] is None
+    assert items["home"]["updated_at"] and items["home"]["kind"] == "home"
+
+    # Same key replaces; past max_items the least recently updated go first
+    repo.upsert_memory_items(user_id, [item("home", "Lives in Porto")], 3)
+    repo.upsert_memory_items(user_id, [item("pref:a", "Likes a"), item("pref:b", "Likes b")], 3)
+    items = repo.get_memory_items(user_id)
+    assert [i["key"] for i in items] == ["pref:b", "pref:a", "home"], items
+    assert items[2]["content"] == "Lives in Porto"
+
+    repo.delete_memory_items(user_id, ["pref:a", "missing"])
+    assert [i["key"] for i in repo.get_memory_items(user_id)] == ["pref:b", "home"]
+    repo.delete_memory_items(user_id)
+    assert repo.get_memory_items(user_id) == []
+    assert [i["content"] for i in repo.get_memory_items(other_id)] == ["Lives in Oslo"]
+
+
+def check_answer_cache(repo):
+    ns, other = f"ns_{_tag()}", f"ns_{_tag()}"
+    repo.record_cache_queries(ns, [("rome", "Rome?"), ("paris", "Paris"), ("rome", "rome")])
+    repo.record_cache_queries(ns, [("rome", "ROME")])
+    repo.record_cache_queries(other, [("rome", "Rome")])
+    frequent = repo.get_frequent_queries(ns, 10)
+    assert [(q["query_key"], q["query"], q["hits"]) for q in frequent] == [("rome", "Rome?", 3), ("paris", "Paris", 1)]
+    assert frequent[0]["refreshed_at"] is None
+    assert [q["query_key"] for q in repo.get_frequent_queries(ns, 10, min_hits=2)] == ["rome"]
+    assert repo.get_cached_answers(ns) == []
+
+    vector = bytes(range(16))
+    repo.save_cached_answers(ns, [{"query_key": "rome", "query": "Rome?", "answer": "Colosseum", "embedding": vector},
+                                  {"query_key": "oslo", "query": "Oslo", "answer": "Fjords", "embedding": None}])
+    answers = {a["query_key"]: a for a in repo.get_cached_answers(ns)}
+    assert set(answers) == {"rome", "oslo"}, answers
+    assert answers["rome"]["answer"] == "Colosseum" and bytes(answers["rome"]["embedding"]) == vector
+    assert answers["oslo"]["embedding"] is None and answers["oslo"]["refreshed_at"]
+    # Saving keeps the ask count; a refresh replaces the answer
+    repo.save_cached_answers(ns, [{"query_key": "rome", "query": "Rome?", "answer": "Forum", "embedding": None}])
+    assert repo.get_frequent_queries(ns, 1)[0]["hits"] == 3
+    assert {a["query_key"]: a["answer"] for a in repo.get_cached_answers(ns)}["rome"] == "Forum"
+    assert repo.get_cached_answers(other) == []
+
+    repo.prune_answer_cache(1)
+    assert len(repo.get_frequent_queries(ns, 10)) == 2
+
+
+def check_export_pages(repo):
+    user_id, name = _user(repo, "export")
+    chat_ids = [repo.create_chat(user_id, f"Chat {i}") for i in range(3)]
+    message_ids = [repo.save_message(chat_ids[i % 3], user_id, f"m{i}") for i in range(7)]
+
+    user = repo.get_user_for_export(name)
+    assert user["id"] == user_id and user["password_hash"] and user["email"] == f"{name}@example.com"
+    assert repo.get_user_for_export(f"missing_{name}") is None
+    assert repo.get_user_max_ids(user_id) == (chat_ids[-1], message_ids[-1])
+    assert repo.get_user_max_ids(-1) == (0, 0)
+
+    page = repo.get_user_chats_page(user_id, 0, chat_ids[-1], 2)
+    assert [c["id"] for c in page] == chat_ids[:2] and page[0]["archived_at"] is None
+    assert [c["id"] for c in repo.get_user_chats_page(user_id, chat_ids[1], chat_ids[1], 2)] == []
+
+    seen = []
+    after_id = 0
+    while True:
+        page = repo.get_user_messages_page(user_id, after_id, message_ids[-2], 3)
+        if not page:
+            break
+        seen += [m["id"] for m in page]
+        after_id = page[-1]["id"]
+    assert seen == message_ids[:-1], "keyset pages must stop at max_id"
+    datetime.fromisoformat(repo.get_user_messages_page(user_id, 0, message_ids[0], 1)[0]["timestamp"])
+
+
+def check_import(repo):
+    name = f"import_{_tag()}"
+    user_id = repo.import_user(name, f"{name}@example.com", "imported-hash", "2020-01-02 03:04:05")
+    assert user_id is not None
+    assert repo.import_user(name, f"x{name}@example.com", "h", "2020-01-02 03:04:05") is None
+    assert repo.get_user_by_id(user_id)["created_at"] == "2020-01-02 03:04:05"
+
+    mapping = repo.import_chats(user_id, [
+        {"id": 501, "title": "Topic (3)", "created_at": "2020-01-03 00:00:00"},
+        {"id": 502, "title": "Other", "created_at": "2020-01-04 00:00:00"},
+    ])
+    assert set(mapping) == {501, 502} and len(set(mapping.values())) == 2
+    assert repo.import_chats(user_id, []) == {}
+    # Imported "(n)" suffixes are never handed out again
+    topic, other = repo.create_chat(user_id, "Topic"), repo.create_chat(user_id, "Other")
+    titles = dict(repo.get_chat_titles(user_id))
+    assert titles[topic] == "Topic (4)" and titles[other] == "Other (1)", titles
+    assert titles[mapping[502]] == "Other"
+
+    new_ids = repo.import_messages(user_id, [
+        {"chat_id": mapping[501], "is_user": True, "content": "old question", "timestamp": "2020-01-03 00:00:01"},
+        {"chat_id": mapping[501], "is_user": False, "content": "old answer", "timestamp": "2020-01-03 00:00:02"},
+    ])
+    assert len(new_ids) == 2 and new_ids[0] < new_ids[1]
+    assert repo.import_messages(user_id, []) == []
+    messages = repo.get_chat_messages(mapping[501])
+    assert [m.id for m in messages] == new_ids
+    assert messages[1].timestamp == datetime(2020, 1, 3, 0, 0, 2) and messages[1].is_user is False
+
+
+def _old_chat(repo, user_id, count=3):
+    """A chat whose messages are ten years old, so the retention scan picks it up."""
+    chat_id = repo.create_chat(user_id)
+    ids = repo.import_messages(user_id, [
+        {"chat_id": chat_id, "is_user": i % 2 == 0, "content": f"old {i}", "timestamp": f"2015-01-01 00:00:0{i}"}
+        for i in range(count)
+    ])
+    return chat_id, ids
+
+
+def _copy_to_archive(repo, chat_id, embedding=None):
+    """Copy a chat's rows to the archive as retention.archive_chat does; the first gets `embedding`."""
+    rows = repo.get_messages_for_archive(chat_id)
+    for row in rows:
+        row["embedding"] = None
+    rows[0]["embedding"] = embedding
+    repo.save_archived_messages(rows)
+    return rows
+
+
+def check_archive(repo):
+    user_id, _ = _user(repo, "archive")
+    chat_id, ids = _old_chat(repo, user_id)
+    recent = repo.create_chat(user_id)
+    repo.save_message(recent, user_id, "still active")
+
+    assert repo.find_inactive_chats(365, chat_id - 1, limit=1) == [chat_id]
+    assert recent not in repo.find_inactive_chats(365, recent - 1, limit=1)
+
+    embedding = b"\x00\x00\x80?\x00\x00\x00@"
+    rows = _copy_to_archive(repo, chat_id, embedding)
+    assert [r["id"] for r in rows] == ids and rows[0]["user_id"] == user_id
+    # A retried copy replaces the first
+    _copy_to_archive(repo, chat_id, embedding)
+
+    # A message arriving after the copy aborts the archive
+    late = repo.save_message(chat_id, user_id, "late reply")
+    assert repo.mark_chat_archived(chat_id, ids[-1], len(ids)) is False
+    assert [m.id for m in repo.get_chat_messages(chat_id)] == ids + [late]
+    repo.delete_archived_messages(chat_id)
+    assert repo.get_archived_messages(chat_id) == []
+
+    rows = _copy_to_archive(repo, chat_id, embedding)
+    assert repo.mark_chat_archived(chat_id, late, len(rows)) is True
+    assert chat_id not in repo.find_inactive_chats(365, chat_id - 1, limit=1)
+
+    chat = {c["id"]: c for c in repo.get_user_chats(user_id)}[chat_id]
+    assert chat["archived"] and chat["message_count"] == len(rows), chat
+    assert repo.get_user_chats_page(user_id, chat_id - 1, chat_id, 1)[0]["archived_at"] is not None
+    # Archived chats still count as past chats for the retrieval gate
+    assert repo.count_user_chats_with_messages(user_id) == 2
+    assert late not in [m["id"] for m in repo.get_user_messages_page(user_id, 0, late, 100)], \
+        "archived messages still hot"
+
+    archived = repo.get_archived_messages(chat_id)
+    assert [r["id"] for r in archived] == ids + [late]
+    assert bytes(archived[0]["embedding"]) == embedding and archived[1]["embedding"] is None
+    page = repo.get_archived_messages_page(user_id, ids[0], 2)
+    assert [r["id"] for r in page] == ids[1:3]
+
+    # Restoring puts the messages back with their ids, once
+    assert repo.restore_archived_messages(chat_id, archived) is True
+    assert repo.restore_archived_messages(chat_id, archived) is False
+    restored = repo.get_chat_messages(chat_id)
+    assert [m.id for m in restored] == ids + [late] and restored[0].content == "old 0"
+    assert restored[0].timestamp == datetime(2015, 1, 1, 0, 0, 0)
+    assert chat_id in repo.get_restored_chats_with_archive_rows(limit=10_000)
+    repo.delete_archived_messages(chat_id)
+    assert chat_id not in repo.get_restored_chats_with_archive_rows(limit=10_000)
+
+
+def check_rehydrate_on_open(repo):
+    user_id, _ = _user(repo, "rehydrate")
+    chat_id, ids = _old_chat(repo, user_id)
+    _copy_to_archive(repo, chat_id)
+    assert repo.mark_chat_archived(chat_id, ids[-1], len(ids))
+
+    # Opening the chat brings it back and clears its archive rows
+    assert [m.id for m in repo.get_chat_messages(chat_id, limit=2)] == ids[1:]
+    assert not {c["id"]: c for c in repo.get_user_chats(user_id)}[chat_id]["archived"]
+    assert repo.get_archived_messages(chat_id) == []
+
+    # Deleting an archived chat also deletes its archive rows
+    _copy_to_archive(repo, chat_id)
+    assert repo.mark_chat_archived(chat_id, ids[-1], len(ids))
+    repo.delete_chat(chat_id)
+    assert repo.get_archived_messages(chat_id) == []
+    assert chat_id not in dict(repo.get_chat_titles(user_id))
+
+
+CHECKS = [
+    check_users,
+    check_revoked_tokens,
+    check_chats,
+    check_messages,
+    check_search,
+    check_corpus,
+    check_memory,
+    check_answer_cache,
+    check_export_pages,
+    check_import,
+    check_archive,
+    check_rehydrate_on_open,
+]
+
+
+def run(repo, checks=CHECKS, verbose=False):
+    """
+    Run conformance checks against a repository.
+
+    Returns:
+        List of (check name, traceback or None) pairs
+    """
+    results = []
+    for check in checks:
+        try:
+            check(repo)
+            results.append((check.__name__, None))
+        except Exception:
+            results.append((check.__name__, traceback.format_exc()))
+        if verbose:
+            name, error = results[-1]
+            print(f"{'ok  ' if error is None else 'FAIL'} {name}")
+            if error:
+                print(error)
+    return results
+
+
+def start_postgres():
+    """Start a throwaway PostgreSQL server with initdb and pg_ctl; returns its DSN."""
+    initdb, pg_ctl = shutil.which("initdb"), shutil.which("pg_ctl")
+    if not initdb or not pg_ctl:
+        raise SystemExit("--start-postgres needs initdb and pg_ctl on the PATH")
+    if hasattr(os, "geteuid") and os.geteuid() == 0:
+        raise SystemExit("PostgreSQL will not run as root; start a server yourself and pass --dsn")
+    data_dir = tempfile.mkdtemp(prefix="askatlas_pg_")
+    subprocess.run([initdb, "-D", data_dir, "-U", "postgres", "--auth=trust"],
+                   check=True, stdout=subprocess.DEVNULL)
+    # Unix socket in the data directory only, so it cannot clash with a running server
+    subprocess.run([pg_ctl, "-D", data_dir, "-l", os.path.join(data_dir, "server.log"), "-w",
+                    "-o", f"-k {data_dir} -c listen_addresses=''", "start"],
+                   check=True, stdout=subprocess.DEVNULL)
+
+    def stop():
+        subprocess.run([pg_ctl, "-D", data_dir, "-m", "immediate", "stop"], stdout=subprocess.DEVNULL)
+        shutil.rmtree(data_dir, ignore_errors=True)
+    atexit.register(stop)
+    return f"postgresql://postgres@/postgres?host={data_dir}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the storage conformance checks against a backend")
+    parser.add_argument("--backend", choices=["sqlite", "postgres"], default="sqlite")
+    parser.add_argument("--dsn", help="PostgreSQL database to test in (a fresh schema is created)")
+    parser.add_argument("--start-postgres", action="store_true", help="start a throwaway server for the run")
+    args = parser.parse_args()
+
+    # Rehydration goes through retention, which imports the configured storage
+    # module; point it at scratch files so the run leaves the working tree alone
+    scratch = tempfile.mkdtemp(prefix="askatlas_conformance_")
+    os.environ["ASKATLAS_DATA_DIR"] = scratch
+    os.environ["STORAGE_BACKEND"] = "sqlite"
+    atexit.register(shutil.rmtree, scratch, True)
+
+    if args.backend == "sqlite":
+        from .sqlite_repository import SQLiteRepository
+        repo = SQLiteRepository(db_path=os.path.join(scratch, "conformance.db"),
+                                archive_path=os.path.join(scratch, "conformance_archive.db"))
+    else:
+        from .postgres_repository import PostgresRepository
+        dsn = start_postgres() if args.start_postgres else args.dsn
+        if not dsn:
+            parser.error("--backend postgres needs --dsn or --start-postgres")
+        repo = PostgresRepository(dsn, min_size=1, max_size=4, schema=f"conformance_{_tag()}")
+
+    started = time.perf_counter()
+    try:
+        results = run(repo, verbose=True)
+    finally:
+        if args.backend == "postgres" and not args.start_postgres:
+            # Leave the shared database as it was
+            with repo.connect() as conn:
+                conn.execute(f"DROP SCHEMA {repo.schema} CASCADE")
+        repo.close()
+
+    failed = [name for name, error in results if error]
+    print(f"{len(results) - len(failed)}/{len(results)} checks passed against {args.backend} "
+          f"in {time.perf_counter() - started:.1f}s")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
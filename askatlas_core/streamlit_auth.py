@@ -0,0 +1,259 @@
+import streamlit as st
+import streamlit.components.v1 as components
+import re
+import logging
+from .config import ADMIN_USERNAMES, TRUSTED_PROXY_COUNT
+from .storage import create_user, verify_user
+from .passwords import PasswordPoolBusy
+from .login_throttle import check_login_allowed, record_login_result
+from .sessions import issue_token, authenticate_token, revoke_token, mark_active, SESSION_TTL
+
+logger = logging.getLogger(__name__)
+
+# Throttling bucket shared by every login whose client address is unknown
+UNKNOWN_CLIENT = "unknown"
+_warned_unknown_client = False
+
+# Cookie holding the session token; never put in the URL, where history, Referer headers and logs would keep it
+SESSION_COOKIE = "askatlas_session"
+
+# Session restore reads cookies from st.context (Streamlit 1.37+) and login throttling reads
+# st.context.ip_address (1.45+); without them both would quietly stop working
+if not hasattr(getattr(st, "context", None), "ip_address"):
+    raise RuntimeError(
+        f"streamlit {getattr(st, '__version__', '?')} has no st.context; install streamlit>=1.45")
+
+def init_session_state():
+    """Initialize session state variables if they don't exist."""
+    if 'logged_in' not in st.session_state:
+        st.session_state.logged_in = False
+    if 'user_id' not in st.session_state:
+        st.session_state.user_id = None
+    if 'username' not in st.session_state:
+        st.session_state.username = None
+    if 'current_chat_id' not in st.session_state:
+        st.session_state.current_chat_id = None
+    if 'use_context' not in st.session_state:
+        st.session_state.use_context = False
+    if 'session_token' not in st.session_state:
+        st.session_state.session_token = None
+
+    # Links from older versions carried the token in the URL; drop it unread
+    if "session" in st.query_params:
+        del st.query_params["session"]
+
+    # Restore a session after a browser refresh or reconnect without bcrypt.
+    # The token is rotated on every restore, so a copied cookie is good for one use.
+    if not st.session_state.logged_in:
+        token = get_cookie(SESSION_COOKIE)
+        user = authenticate_token(token) if token else None
+        if user:
+            revoke_token(token)
+            st.session_state.logged_in = True
+            st.session_state.user_id = user["id"]
+            st.session_state.username = user["username"]
+            st.session_state.session_token = issue_token(user["id"])
+            st.session_state.pending_cookie = st.session_state.session_token
+        elif token:
+            st.session_state.pending_cookie = ""
+
+def get_cookie(name):
+    """A cookie sent with the browser's connection, or None."""
+    return st.context.cookies.get(name)
+
+def write_pending_cookie():
+    """
+    Set or clear the session cookie queued by login, restore or logout.
+
+    Streamlit can read cookies but not set them, so a zero-height component
+    sets it from the browser. It is written on the next full run, because a
+    component rendered just before st.rerun() is discarded. A cookie set from
+    JavaScript cannot be HttpOnly, so any script running on the page can read
+    the token; it is SameSite=Strict, rotated on every restore and revoked on
+    logout, which limits what a stolen copy is good for.
+    """
+    token = st.session_state.pop("pending_cookie", None)
+    if token is None:
+        return
+    max_age = SESSION_TTL if token else 0
+    components.html(
+        "<script>"
+        f"parent.document.cookie = '{SESSION_COOKIE}={token}; Max-Age={max_age}; Path=/; SameSite=Strict'"
+        " + (parent.location.protocol === 'https:' ? '; Secure' : '');"
+        "</script>",
+        height=0,
+    )
+
+def is_valid_email(email):
+    """Validate email format."""
+    email_pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
+    return bool(re.match(email_pattern, email))
+
+def is_valid_username(username):
+    """Validate username format."""
+    # Alphanumeric and underscore, 3-20 characters
+    username_pattern = r'^[a-zA-Z0-9_]{3,20}$'
+    return bool(re.match(username_pattern, username))
+
+def is_valid_password(password):
+    """Validate password strength."""
+    # At least 8 characters
+    # return len(password) >= 3
+    return True
+
+def get_client_ip():
+    """
+    The client's address for login throttling.
+
+    X-Forwarded-For is only read behind TRUSTED_PROXY_COUNT proxies. Each of
+    them appends the address it was connected from, so the entry that many
+    places from the right was written by the outermost one; anything left of
+    it came from the client and may be forged. When no address is known, all
+    such logins share the UNKNOWN_CLIENT bucket rather than skip the limit.
+    """
+    global _warned_unknown_client
+    address = st.context.ip_address
+    if TRUSTED_PROXY_COUNT > 0:
+        hops = [hop.strip() for hop in st.context.headers.get("X-Forwarded-For", "").split(",") if hop.strip()]
+        if len(hops) >= TRUSTED_PROXY_COUNT:
+            address = hops[-TRUSTED_PROXY_COUNT]
+    if address:
+        return address
+    if not _warned_unknown_client:
+        _warned_unknown_client = True
+        logger.warning("client address unknown; throttling such logins together as %r", UNKNOWN_CLIENT)
+    return UNKNOWN_CLIENT
+
+def login_form():
+    """Display and process the login form."""
+    st.subheader("Login")
+    
+    with st.form("login_form"):
+        username = st.text_input("Username")
+        password = st.text_input("Password", type="password")
+        submit = st.form_submit_button("Login")
+        
+        if submit:
+            if not username or not password:
+                st.error("Please fill in all fields.")
+                return
+            
+            allowed, retry_after = check_login_allowed(username, get_client_ip())
+            if not allowed:
+                st.error(f"Too many login attempts. Please try again in {retry_after} seconds.")
+                return
+            
+            try:
+                user_id = verify_user(username, password)
+            except PasswordPoolBusy:
+                st.error("The server is busy. Please try again in a moment.")
+                return
+            record_login_result(username, success=bool(user_id))
+            
+            if user_id:
+                st.session_state.logged_in = True
+                st.session_state.user_id = user_id
+                st.session_state.username = username
+                st.session_state.session_token = issue_token(user_id)
+                st.session_state.pending_cookie = st.session_state.session_token
+                st.success("Login successful!")
+                st.rerun()
+            else:
+                st.error("Invalid username or password.")
+
+def signup_form():
+    """Display and process the signup form."""
+    st.subheader("Sign Up")
+    
+    with st.form("signup_form"):
+        username = st.text_input("Username")
+        email = st.text_input("Email")
+        password = st.text_input("Password", type="password")
+        password_confirm = st.text_input("Confirm Password", type="password")
+        submit = st.form_submit_button("Sign Up")
+        
+        if submit:
+            # Validate inputs
+            if not all([username, email, password, password_confirm]):
+                st.error("Please fill in all fields.")
+                return
+            
+            if not is_valid_username(username):
+                st.error("Username must be 3-20 characters and contain only letters, numbers, and underscores.")
+                return
+                
+            if not is_valid_email(email):
+                st.error("Please enter a valid email address.")
+                return
+                
+            if not is_valid_password(password):
+                st.error("Password must be at least 8 characters.")
+                return
+                
+            if password != password_confirm:
+                st.error("Passwords do not match.")
+                return
+            
+            # Create user
+            try:
+                user_id = create_user(username, email, password)
+            except PasswordPoolBusy:
+                st.error("The server is busy. Please try again in a moment.")
+                return
+            
+            if user_id:
+                st.success("Account created successfully! Please log in.")
+                st.session_state.show_login = True
+                st.rerun()
+            else:
+                st.error("Username or email already exists.")
+
+def is_admin():
+    """Whether the logged-in user may see admin-only pages."""
+    return bool(st.session_state.get("logged_in")) and st.session_state.get("username") in ADMIN_USERNAMES
+
+def logout():
+    """Log the user out and reset session state."""
+    if st.session_state.get("session_token"):
+        revoke_token(st.session_state.session_token)
+    st.session_state.session_token = None
+    st.session_state.pending_cookie = ""
+    st.session_state.logged_in = False
+    st.session_state.user_id = None
+    st.session_state.username = None
+    st.session_state.current_chat_id = None
+    st.session_state.pop("chat_history", None)
+    st.rerun()
+
+def auth_page(title="Chat Application"):
+    """Display the authentication page (login/signup) under the given title."""
+    init_session_state()
+    write_pending_cookie()
+    
+    st.title(title)
+    
+    if st.session_state.logged_in:
+        mark_active(st.session_state.user_id)
+        return True
+    
+    # Toggle between login and signup
+    if 'show_login' not in st.session_state:
+        st.session_state.show_login = True
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        if st.button("Login", use_container_width=True, 
+                    type="primary" if st.session_state.show_login else "secondary"):
+            st.session_state.show_login = True
+    
+    with col2:
+        if st.button("Sign Up", use_container_width=True,
+                    type="primary" if not st.session_state.show_login else "secondary"):
+            st.session_state.show_login = False
+    
+    if st.session_state.show_login:
+        login_form()
+    else:
+        signup_form()
+    
+    return False
\ No newline at end of file
@@ -0,0 +1,27 @@
+"""
+Word-level helpers shared by lexical search and auto-titling.
+
+Standard library only and nothing runs at import, so storage backends can
+use them without pulling in the rest of the core.
+"""
+import re
+
+# Words too common to say what a message is about
+STOP_WORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been
+before being below between both but by can could did do does doing down during each
+few for from further get got had has have having he her here hers herself him himself
+his how i if in into is it its itself just know like me more most my myself need no
+nor not now of off on once only or other our ours ourselves out over own please same
+she should so some such tell than thanks that the their theirs them themselves then
+there these they this those through to too under until up us very want was we were
+what when where which while who whom why will with would you your yours yourself
+yourselves
+""".split())
+
+TOKEN = re.compile(r"[a-z][a-z'-]+")
+
+
+def tokenize(text):
+    """Lower-cased words of three letters or more, without stop words."""
+    return [t for t in TOKEN.findall(text.lower()) if len(t) > 2 and t not in STOP_WORDS]
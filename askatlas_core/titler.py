@@ -0,0 +1,92 @@
+import math
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .text import tokenize
+from .storage import (
+    add_document_terms, get_document_frequencies, update_chat_title,
+    get_max_message_id, iter_message_contents
+)
+
+logger = logging.getLogger(__name__)
+
+# A single worker keeps IDF updates ordered and off the Streamlit script thread
+_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="titler")
+_started = False
+_start_lock = threading.Lock()
+
+
+def extract_title(text, num_tags=3):
+    """Pick the highest TF-IDF terms of a message using the corpus-level IDF table."""
+    terms = tokenize(text)
+    if not terms:
+        return None
+
+    tf = {}
+    for term in terms:
+        tf[term] = tf.get(term, 0) + 1
+    documents, df = get_document_frequencies(tf)
+
+    # Smoothed IDF, as scikit-learn computes it
+    scores = {term: count * (math.log((1 + documents) / (1 + df.get(term, 0))) + 1)
+              for term, count in tf.items()}
+    top = sorted(scores, key=lambda term: (-scores[term], terms.index(term)))[:num_tags]
+
+    # Keep the chosen words in the order they appear in the message
+    return " ".join(sorted(top, key=terms.index))
+
+
+def _bootstrap(max_id):
+    """Build the IDF table from existing messages the first time it is needed."""
+    documents, _ = get_document_frequencies([])
+    if documents:
+        return
+    for batch in iter_message_contents(max_id):
+        add_document_terms([tokenize(content) for content in batch])
+
+
+def _record(text):
+    add_document_terms([tokenize(text)])
+
+
+def _title(chat_id, text):
+    title = extract_title(text)
+    if title:
+        update_chat_title(chat_id, title)
+
+
+def _log_failure(future):
+    if future.exception() is not None:
+        logger.error("auto-titling job failed", exc_info=future.exception())
+
+
+def _submit(fn, *args):
+    start_titler()
+    _worker.submit(fn, *args).add_done_callback(_log_failure)
+
+
+def start_titler():
+    """
+    Queue the IDF bootstrap, once per process, ahead of every other job.
+
+    Apps that title chats call this at startup so the corpus scan runs before
+    the first chat; the first record_message or schedule_title also calls it.
+    Messages saved after this point are counted by their own record_message jobs.
+    """
+    global _started
+    with _start_lock:
+        if _started:
+            return
+        _started = True
+        _worker.submit(_bootstrap, get_max_message_id()).add_done_callback(_log_failure)
+
+
+def record_message(text):
+    """Add a message to the corpus IDF table in the background."""
+    _submit(_record, text)
+
+
+def schedule_title(chat_id, text):
+    """Title a chat from its first message in the background."""
+    _submit(_title, chat_id, text)
@@ -0,0 +1,306 @@
+import os
+import json
+import time
+import queue
+import random
+import atexit
+import logging
+import secrets
+import functools
+import threading
+import contextvars
+import urllib.request
+from .config import DATA_DIR
+
+logger = logging.getLogger(__name__)
+
+# "off", "jsonl" (append spans to TRACE_FILE) or "otlp" (OTLP/HTTP JSON to a collector)
+TRACE_EXPORT = os.getenv("TRACE_EXPORT", "off").lower()
+
+# Fraction of traces that are recorded; the decision is made once, at the root span
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.05"))
+
+TRACE_FILE = os.getenv("TRACE_FILE", os.path.join(DATA_DIR, "traces.jsonl"))
+
+OTLP_ENDPOINT = os.getenv("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318").rstrip("/") + "/v1/traces"
+SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "askatlas")
+
+# Finished spans waiting for the exporter; spans are dropped rather than block a chat turn
+MAX_QUEUED_SPANS = 10_000
+EXPORT_BATCH_SIZE = 512
+EXPORT_INTERVAL = 2.0
+
+# Marks a trace that lost the sampling draw, so its children skip recording cheaply
+_UNSAMPLED = object()
+
+_current = contextvars.ContextVar("askatlas_span", default=None)
+_queue = queue.Queue(maxsize=MAX_QUEUED_SPANS)
+_exporter_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_exporter = None
+_stats = {"exported": 0, "dropped": 0, "failed": 0}
+
+
+class _NoopSpan:
+    """Returned for untraced work; every method is a no-op."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def set(self, key, value):
+        pass
+
+
+_NOOP = _NoopSpan()
+
+
+class _UnsampledTrace:
+    """Root of a trace that is not recorded; marks the context so nested spans are skipped."""
+
+    def __enter__(self):
+        self._token = _current.set(_UNSAMPLED)
+        return _NOOP
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        return False
+
+
+class Span:
+    """A timed stage of a trace, exported when it ends."""
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start_ns", "attributes", "_token")
+
+    def __init__(self, name, parent=None, attributes=None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.attributes = attributes or {}
+        self._token = None
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self._token)
+        self.finish(exc)
+        return False
+
+    def set(self, key, value):
+        self.attributes[key] = value
+
+    def finish(self, exc=None):
+        record = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": time.time_ns(),
+            "attributes": self.attributes,
+            "error": type(exc).__name__ if exc is not None else None,
+        }
+        _ensure_exporter()
+        try:
+            _queue.put_nowait(record)
+        except queue.Full:
+            _stats["dropped"] += 1
+
+
+def start_trace(name, **attributes):
+    """
+    Start a trace for a unit of work (a chat turn, a page render).
+
+    Inside an active trace this is an ordinary child span, so a turn that
+    happens during a render is recorded as part of it.
+
+    Args:
+        name: Span name, e.g. "chat.turn"
+        **attributes: Attributes recorded on the root span
+
+    Returns:
+        A context manager yielding the span (or a no-op stand-in)
+    """
+    if TRACE_EXPORT == "off":
+        return _NOOP
+    parent = _current.get()
+    if parent is not None:
+        return _NOOP if parent is _UNSAMPLED else Span(name, parent, attributes)
+    if random.random() >= TRACE_SAMPLE_RATE:
+        return _UnsampledTrace()
+    return Span(name, None, attributes)
+
+
+def span(name, **attributes):
+    """Time a stage of the current trace; a no-op when there is no sampled trace."""
+    parent = _current.get()
+    if parent is None or parent is _UNSAMPLED:
+        return _NOOP
+    return Span(name, parent, attributes)
+
+
+def current_span():
+    """The span of the current trace, for adding attributes; a no-op stand-in if untraced."""
+    current = _current.get()
+    return _NOOP if current is None or current is _UNSAMPLED else current
+
+
+def traced(name):
+    """Decorator recording each call of a function as a span of the current trace."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            parent = _current.get()
+            if parent is None or parent is _UNSAMPLED:
+                return func(*args, **kwargs)
+            with Span(name, parent):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_stream(name, chunks, **attributes):
+    """
+    Yield from a streamed response, recording it as a span with time to first chunk.
+
+    Args:
+        name: Span name, e.g. "llm.stream"
+        chunks: Iterable of response chunks
+        **attributes: Attributes recorded on the span
+
+    Yields:
+        The chunks, unchanged
+    """
+    parent = _current.get()
+    if parent is None or parent is _UNSAMPLED:
+        yield from chunks
+        return
+
+    # Not made current: the consumer runs its own code between chunks
+    stream_span = Span(name, parent, attributes)
+    count = 0
+    error = None
+    try:
+        for chunk in chunks:
+            if not count:
+                stream_span.set("time_to_first_chunk_ms",
+                                round((time.time_ns() - stream_span.start_ns) / 1e6, 3))
+            count += 1
+            yield chunk
+    except BaseException as exc:
+        error = exc
+        raise
+    finally:
+        stream_span.set("chunks", count)
+        stream_span.finish(error)
+
+
+def bind(func):
+    """Wrap a function so it runs in the caller's trace when submitted to another thread."""
+    context = contextvars.copy_context()
+    return functools.partial(context.run, func)
+
+
+def get_tracing_stats():
+    """Counts of exported, dropped and failed spans since start-up."""
+    return dict(_stats, queued=_queue.qsize())
+
+
+def _ensure_exporter():
+    global _exporter
+    if _exporter is not None:
+        return
+    with _exporter_lock:
+        if _exporter is None:
+            _exporter = threading.Thread(target=_export_loop, name="trace-exporter", daemon=True)
+            _exporter.start()
+            atexit.register(flush)
+
+
+def _export_loop():
+    while True:
+        time.sleep(EXPORT_INTERVAL)
+        flush()
+
+
+def flush():
+    """Export every queued span now, on the calling thread."""
+    with _flush_lock:
+        while True:
+            batch = []
+            while len(batch) < EXPORT_BATCH_SIZE:
+                try:
+                    batch.append(_queue.get_nowait())
+                except queue.Empty:
+                    break
+            if not batch:
+                return
+            _export(batch)
+
+
+def _export(batch):
+    try:
+        if TRACE_EXPORT == "otlp":
+            _export_otlp(batch)
+        else:
+            _export_jsonl(batch)
+        _stats["exported"] += len(batch)
+    except Exception as e:
+        # Tracing must never take a chat turn down with it
+        _stats["failed"] += len(batch)
+        logger.warning("Dropped %d spans: %s", len(batch), e)
+
+
+def _export_jsonl(batch):
+    with open(TRACE_FILE, "a", encoding="utf-8") as f:
+        for record in batch:
+            record = dict(record, duration_ms=round((record["end_ns"] - record["start_ns"]) / 1e6, 3))
+            f.write(json.dumps(record, default=str) + "\n")
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items()]
+
+
+def _export_otlp(batch):
+    spans = []
+    for record in batch:
+        otlp_span = {
+            "traceId": record["trace_id"],
+            "spanId": record["span_id"],
+            "name": record["name"],
+            "kind": 1,
+            "startTimeUnixNano": str(record["start_ns"]),
+            "endTimeUnixNano": str(record["end_ns"]),
+            "attributes": _otlp_attributes(record["attributes"]),
+            "status": {"code": 2, "message": record["error"]} if record["error"] else {"code": 1},
+        }
+        if record["parent_id"]:
+            otlp_span["parentSpanId"] = record["parent_id"]
+        spans.append(otlp_span)
+
+    payload = {"resourceSpans": [{
+        "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+        "scopeSpans": [{"scope": {"name": "askatlas_core"}, "spans": spans}],
+    }]}
+    request = urllib.request.Request(
+        OTLP_ENDPOINT, data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"}, method="POST")
+    with urllib.request.urlopen(request, timeout=5) as response:
+        response.read()
@@ -0,0 +1,412 @@
+import os
+import chromadb
+from chromadb.config import Settings
+import uuid
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from .config import DATA_DIR
+from .storage import search_messages_fts, get_messages_by_ids, get_chat_titles
+from .context_builder import assemble_context, NO_CONTEXT
+from . import metrics
+from .embeddings import load_embedder, EMBEDDING_ENGINE
+from .tracing import span, traced, bind, current_span
+
+# Initialize the model for creating embeddings (EMBEDDING_ENGINE=torch|onnx)
+model = load_embedder()
+
+# Initialize ChromaDB client
+VECTOR_DB_PATH = os.path.join(DATA_DIR, "vector_db")
+os.makedirs(VECTOR_DB_PATH, exist_ok=True)
+client = chromadb.PersistentClient(
+    path=VECTOR_DB_PATH, settings=Settings(anonymized_telemetry=False))
+
+# Ensure collection exists or create it
+collection = client.get_or_create_collection("chat_messages")
+
+# Reciprocal rank fusion constant; 60 is the value from the original RRF paper
+RRF_K = 60
+
+# Total time the hybrid retriever may spend before falling back to lexical hits
+HYBRID_LATENCY_BUDGET_MS = int(os.getenv("HYBRID_LATENCY_BUDGET_MS", "300"))
+
+# Chats retrieval searches: all, chat (the current one only) or recent (the user's newest chats)
+RETRIEVAL_SCOPE = os.getenv("RETRIEVAL_SCOPE", "all")
+RETRIEVAL_RECENT_CHATS = int(os.getenv("RETRIEVAL_RECENT_CHATS", "10"))
+SCOPES = ("all", "chat", "recent")
+
+# Multiplier on the fused score of hits from the current chat; 1 leaves the ranking as is
+RETRIEVAL_CHAT_BOOST = float(os.getenv("RETRIEVAL_CHAT_BOOST", "1.0"))
+
+# Runs the dense leg of hybrid search so it can be abandoned when over budget
+SEARCH_WORKERS = 2
+_search_executor = ThreadPoolExecutor(max_workers=SEARCH_WORKERS, thread_name_prefix="vector-search")
+
+# One slot per worker: an abandoned search keeps running, so when every worker
+# is busy a new search skips the vector leg instead of queueing behind it
+_dense_slots = threading.BoundedSemaphore(SEARCH_WORKERS)
+
+EMBEDDING_SECONDS = metrics.histogram(
+    "askatlas_embedding_seconds", "Time to embed one batch of texts", ["engine"]).labels(EMBEDDING_ENGINE)
+EMBEDDING_BATCH_SIZE = metrics.histogram(
+    "askatlas_embedding_batch_size", "Texts per embedding call", ["engine"],
+    buckets=metrics.SIZE_BUCKETS).labels(EMBEDDING_ENGINE)
+VECTOR_SECONDS = metrics.histogram(
+    "askatlas_vector_seconds", "Chroma call duration", ["op"])
+DENSE_TIMEOUTS = metrics.counter(
+    "askatlas_hybrid_dense_timeouts_total", "Hybrid searches that dropped the vector leg for being over budget")
+DENSE_SHED = metrics.counter(
+    "askatlas_hybrid_dense_shed_total", "Hybrid searches that skipped the vector leg as every search worker was busy")
+LEXICAL_SCORING_TIMEOUTS = metrics.counter(
+    "askatlas_hybrid_lexical_scoring_timeouts_total",
+    "Hybrid searches whose lexical-only hits could not be scored within the latency budget")
+
+# Distance given to lexical-only hits that could not be scored in time, so the relevance cutoff drops them
+UNSCORED_DISTANCE = float("inf")
+
+
+@traced("embedding.encode")
+def generate_embedding(text):
+    """Generate an embedding vector for the given text (or vectors for a list of texts)."""
+    EMBEDDING_BATCH_SIZE.observe(1 if isinstance(text, str) else len(text))
+    with EMBEDDING_SECONDS.time():
+        return model.encode(text).tolist()
+
+
+def add_message_to_vector_store(message_content, user_id, message_id, chat_id, is_user):
+    """
+    Add a message to the vector store.
+
+    Args:
+        message_content: The text content of the message
+        user_id: ID of the user who owns this message
+        message_id: ID of the message in the SQL database
+        chat_id: ID of the chat this message belongs to
+        is_user: Boolean indicating if this is a user message or AI response
+
+    Returns:
+        The ID of the document in the vector store
+    """
+    doc_id = str(uuid.uuid4())
+
+    # Only ids and filterable fields; the text lives in the messages table
+    metadata = {
+        "user_id": user_id,
+        "message_id": message_id,
+        "chat_id": chat_id,
+        "is_user": is_user
+    }
+
+    embedding = generate_embedding(message_content)
+
+    # Add document to the collection
+    with span("chroma.add"), VECTOR_SECONDS.labels("add").time():
+        collection.add(
+            ids=[doc_id],
+            embeddings=[embedding],
+            metadatas=[metadata]
+        )
+
+    return doc_id
+
+
+def add_messages_to_vector_store(messages, user_id, embeddings=None):
+    """
+    Add many messages to the vector store in one Chroma call.
+
+    Args:
+        messages: Dicts with message_id, chat_id, is_user and content
+        user_id: ID of the user who owns the messages
+        embeddings: Precomputed vectors in the same order, or None to embed the contents
+
+    Returns:
+        The vector store document IDs, in the same order
+    """
+    if not messages:
+        return []
+    if embeddings is None:
+        embeddings = generate_embedding([msg["content"] for msg in messages])
+
+    doc_ids = [str(uuid.uuid4()) for _ in messages]
+    metadatas = [{
+        "user_id": user_id,
+        "message_id": msg["message_id"],
+        "chat_id": msg["chat_id"],
+        "is_user": bool(msg["is_user"])
+    } for msg in messages]
+
+    with span("chroma.add", documents=len(messages)), VECTOR_SECONDS.labels("add").time():
+        collection.add(ids=doc_ids, embeddings=embeddings, metadatas=metadatas)
+
+    return doc_ids
+
+
+def get_embeddings(vector_ids):
+    """Stored vectors for the given document IDs as {vector_id: vector}; unknown IDs are omitted."""
+    vector_ids = list(vector_ids)
+    if not vector_ids:
+        return {}
+    with span("chroma.get", ids=len(vector_ids)), VECTOR_SECONDS.labels("get").time():
+        result = collection.get(ids=vector_ids, include=["embeddings"])
+    return dict(zip(result["ids"], result["embeddings"]))
+
+
+def delete_vectors(vector_ids):
+    """Remove documents from the vector store."""
+    vector_ids = list(vector_ids)
+    if not vector_ids:
+        return
+    with span("chroma.delete", ids=len(vector_ids)), VECTOR_SECONDS.labels("delete").time():
+        collection.delete(ids=vector_ids)
+
+
+def scope_chat_ids(user_id, chat_id=None, scope=RETRIEVAL_SCOPE):
+    """
+    Chats a retrieval scope covers.
+
+    Args:
+        user_id: The ID of the user
+        chat_id: The chat being answered in, if any
+        scope: "all", "chat" or "recent"
+
+    Returns:
+        List of chat IDs, or None for all of the user's chats
+    """
+    if scope not in SCOPES:
+        raise ValueError(f"Unknown retrieval scope: {scope}")
+    if scope == "chat" and chat_id is not None:
+        return [chat_id]
+    if scope == "recent":
+        chat_ids = [recent_id for recent_id, _ in get_chat_titles(user_id, RETRIEVAL_RECENT_CHATS)]
+        if chat_id is not None and chat_id not in chat_ids:
+            chat_ids.append(chat_id)
+        return chat_ids
+    return None
+
+
+def _where(user_id, chat_ids=None, history_window=None):
+    """Chroma metadata filter for a user's messages in chat_ids, outside the history window."""
+    clauses = [{"user_id": user_id}]
+    if chat_ids is not None:
+        clauses.append({"chat_id": {"$in": list(chat_ids)}})
+    if history_window is not None:
+        window_chat_id, first_id = history_window
+        clauses.append({"$or": [{"chat_id": {"$ne": window_chat_id}}, {"message_id": {"$lt": first_id}}]})
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def search_user_messages(query_text, user_id, n_results=5, chat_ids=None, history_window=None,
+                         query_embedding=None):
+    """
+    Search for relevant messages from a user's history.
+
+    Args:
+        query_text: The query text to search for
+        user_id: The ID of the user whose messages to search
+        n_results: Maximum number of results to return
+        chat_ids: Only search these chats (None for all of them)
+        history_window: (chat_id, first message id) of the history already in
+            the prompt; those messages are filtered out by Chroma, so they
+            never take a slot in the top n_results
+        query_embedding: The query's vector, if already computed
+
+    Returns:
+        List of relevant message contents and their metadata
+    """
+    if chat_ids is not None and not chat_ids:
+        return []
+
+    # Generate embedding for the query
+    if query_embedding is None:
+        query_embedding = generate_embedding(query_text)
+
+    # Search the collection
+    with span("chroma.query", n_results=n_results), VECTOR_SECONDS.labels("query").time():
+        results = collection.query(
+            query_embeddings=[query_embedding],
+            n_results=n_results,
+            where=_where(user_id, chat_ids, history_window),
+            include=["metadatas", "distances", "embeddings"]
+        )
+
+    # Format the results, hydrating message text from SQLite in one query
+    formatted_results = []
+    if results and 'metadatas' in results and results['metadatas']:
+        stored = get_messages_by_ids(m["message_id"] for m in results['metadatas'][0])
+        for metadata, distance, embedding in zip(results['metadatas'][0],
+                                                 results['distances'][0],
+                                                 results['embeddings'][0]):
+            # Skip vectors whose message has since been deleted
+            if metadata["message_id"] not in stored:
+                continue
+            formatted_results.append({
+                "content": stored[metadata["message_id"]]["content"],
+                "is_user": metadata["is_user"],
+                "chat_id": metadata["chat_id"],
+                "message_id": metadata["message_id"],
+                "distance": distance,
+                "embedding": list(embedding)
+            })
+
+    return formatted_results
+
+
+def _vector_matches(query_embedding, user_id, message_ids):
+    """
+    Distances and vectors of specific messages to a query, as
+    {message_id: (distance, embedding)}; messages without a vector are omitted.
+    """
+    message_ids = list(message_ids)
+    with span("chroma.query", n_results=len(message_ids)), VECTOR_SECONDS.labels("query").time():
+        results = collection.query(
+            query_embeddings=[query_embedding],
+            n_results=len(message_ids),
+            where={"$and": [{"user_id": user_id}, {"message_id": {"$in": message_ids}}]},
+            include=["metadatas", "distances", "embeddings"]
+        )
+    return {metadata["message_id"]: (distance, list(embedding))
+            for metadata, distance, embedding in zip(results["metadatas"][0],
+                                                     results["distances"][0],
+                                                     results["embeddings"][0])}
+
+
+@traced("retrieval.hybrid")
+def hybrid_search_user_messages(query_text, user_id, n_results=5,
+                                latency_budget_ms=HYBRID_LATENCY_BUDGET_MS,
+                                chat_ids=None, history_window=None, boost_chat_id=None,
+                                query_embedding=None):
+    """
+    Search a user's history with both BM25 and vector similarity.
+
+    The two rankings are merged with reciprocal rank fusion, so exact names,
+    places and addresses found by the FTS index rank alongside semantically
+    similar messages. The dense search runs in the background and is dropped
+    if it does not finish within the latency budget, or skipped if every
+    search worker is still busy. Hits found only lexically are then given
+    their vector distance within what is left of the budget, or
+    UNSCORED_DISTANCE if that runs out, so the caller can filter every hit
+    by relevance.
+
+    Args:
+        query_text: The query text to search for
+        user_id: The ID of the user whose messages to search
+        n_results: Maximum number of fused results to return
+        latency_budget_ms: Time allowed for both searches, in milliseconds
+        chat_ids: Only search these chats (None for all of them)
+        history_window: (chat_id, first message id) of the history already in
+            the prompt; both searches skip those messages
+        boost_chat_id: Multiply the fused score of this chat's hits by
+            RETRIEVAL_CHAT_BOOST
+        query_embedding: The query's vector, if already computed
+
+    Returns:
+        List of relevant message contents and their metadata, best first
+    """
+    started = time.perf_counter()
+    candidates = n_results * 2
+
+    def dense():
+        embedding = query_embedding if query_embedding is not None else generate_embedding(query_text)
+        return embedding, search_user_messages(
+            query_text, user_id, candidates, chat_ids, history_window, query_embedding=embedding)
+
+    vector_future = None
+    if _dense_slots.acquire(blocking=False):
+        vector_future = _search_executor.submit(bind(dense))
+        vector_future.add_done_callback(lambda _: _dense_slots.release())
+    else:
+        current_span().set("dense_shed", True)
+        DENSE_SHED.inc()
+    lexical_results = search_messages_fts(
+        user_id, query_text, limit=candidates, chat_ids=chat_ids, history_window=history_window)
+
+    dense_embedding, vector_results = None, []
+    if vector_future is not None:
+        remaining = latency_budget_ms / 1000 - (time.perf_counter() - started)
+        try:
+            dense_embedding, vector_results = vector_future.result(timeout=max(remaining, 0))
+        except FutureTimeoutError:
+            vector_future.cancel()
+            current_span().set("dense_timed_out", True)
+            DENSE_TIMEOUTS.inc()
+
+    scores = {}
+    messages = {}
+    for ranking in (lexical_results, vector_results):
+        for rank, msg in enumerate(ranking):
+            key = msg["message_id"]
+            scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+            merged = messages.setdefault(key, {
+                "content": msg["content"],
+                "is_user": msg["is_user"],
+                "chat_id": msg["chat_id"],
+                "message_id": msg["message_id"],
+                "distance": None,
+                "embedding": None
+            })
+            # Lexical hits carry no distance/embedding; take them from the dense leg
+            for field in ("distance", "embedding"):
+                if msg.get(field) is not None:
+                    merged[field] = msg[field]
+
+    if boost_chat_id is not None and RETRIEVAL_CHAT_BOOST != 1.0:
+        for key, msg in messages.items():
+            if msg["chat_id"] == boost_chat_id:
+                scores[key] *= RETRIEVAL_CHAT_BOOST
+
+    ranked = [messages[key] for key in sorted(scores, key=scores.get, reverse=True)[:n_results]]
+
+    # Give hits found only by FTS a distance too, so the relevance cutoff in
+    # assemble_context applies to them; without the dense leg they keep None.
+    # The lookup shares the latency budget: hits it cannot score in time are dropped.
+    lexical_only = [msg["message_id"] for msg in ranked if msg["distance"] is None]
+    if lexical_only and dense_embedding is not None:
+        matches = None
+        if _dense_slots.acquire(blocking=False):
+            match_future = _search_executor.submit(bind(_vector_matches), dense_embedding, user_id, lexical_only)
+            match_future.add_done_callback(lambda _: _dense_slots.release())
+            remaining = latency_budget_ms / 1000 - (time.perf_counter() - started)
+            try:
+                matches = match_future.result(timeout=max(remaining, 0))
+            except FutureTimeoutError:
+                match_future.cancel()
+        if matches is None:
+            current_span().set("lexical_scoring_timed_out", True)
+            LEXICAL_SCORING_TIMEOUTS.inc()
+            matches = dict.fromkeys(lexical_only, (UNSCORED_DISTANCE, None))
+        for msg in ranked:
+            if msg["message_id"] in matches:
+                msg["distance"], msg["embedding"] = matches[msg["message_id"]]
+    return ranked
+
+
+def get_chat_context(user_id, query_text, chat_id=None, history_window=None, scope=RETRIEVAL_SCOPE,
+                     query_embedding=None):
+    """
+    Get relevant context from user's past conversations.
+
+    Args:
+        user_id: The ID of the user
+        query_text: The current query text
+        chat_id: The chat being answered in; used by the "chat" and "recent"
+            scopes and boosted by RETRIEVAL_CHAT_BOOST
+        history_window: (chat_id, first message id) of the chat history sent
+            with the prompt, which retrieval then never returns
+        scope: "all", "chat" or "recent" (RETRIEVAL_SCOPE by default)
+        query_embedding: The query's vector, if already computed
+
+    Returns:
+        A formatted string containing relevant context
+    """
+    chat_ids = scope_chat_ids(user_id, chat_id, scope)
+    current_span().set("scope", scope)
+    relevant_messages = hybrid_search_user_messages(
+        query_text, user_id, n_results=10,
+        chat_ids=chat_ids, history_window=history_window, boost_chat_id=chat_id,
+        query_embedding=query_embedding)
+
+    with span("retrieval.assemble") as assemble_span:
+        context, stats = assemble_context(relevant_messages)
+        assemble_span.set("kept", stats["kept"])
+    return context or NO_CONTEXT
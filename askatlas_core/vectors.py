@@ -0,0 +1,26 @@
+"""
+Float32 packing of embedding vectors, for the databases and archives that store them.
+
+Standard library only and nothing runs at import, so the CLIs that store
+vectors do not start the workers of the modules that produce them.
+"""
+import sys
+from array import array
+
+
+def pack_vectors(vectors):
+    """Pack equal-length vectors into little-endian float32 bytes."""
+    packed = array("f")
+    for vector in vectors:
+        packed.extend(float(x) for x in vector)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return packed.tobytes()
+
+
+def unpack_vectors(data, dim):
+    packed = array("f")
+    packed.frombytes(data)
+    if sys.byteorder == "big":
+        packed.byteswap()
+    return [packed[i:i + dim].tolist() for i in range(0, len(packed), dim)]
@@ -0,0 +1,48 @@
+"""
+Chat creation cost as a user accumulates chats.
+
+Creates chats for one user with the default title and reports the mean
+create_chat latency per block of chats; it should stay flat as n grows.
+
+    python benchmarks/bench_create_chat.py --chats 2000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="create_chat scaling benchmark")
+    parser.add_argument("--chats", type=int, default=2000)
+    parser.add_argument("--block", type=int, default=250)
+    args = parser.parse_args()
+
+    # The core creates its database on import, so point it at a scratch directory first
+    os.environ["ASKATLAS_DATA_DIR"] = tempfile.mkdtemp(prefix="bench_create_chat_")
+    os.environ.pop("CHAT_DB_PATH", None)
+    sys.path.insert(0, ROOT_DIR)
+    from askatlas_core import storage as database
+
+    user_id = database.create_user("bench", "bench@example.com", "password")
+
+    blocks = []
+    for start in range(0, args.chats, args.block):
+        started = time.perf_counter()
+        for _ in range(args.block):
+            database.create_chat(user_id)
+        elapsed = time.perf_counter() - started
+        blocks.append({
+            "chats_before": start,
+            "mean_ms": round(elapsed / args.block * 1000, 3),
+        })
+
+    print(json.dumps({"chats": args.chats, "blocks": blocks}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
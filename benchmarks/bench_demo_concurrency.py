@@ -0,0 +1,63 @@
+"""
+Throughput of the Taipy demo's LLM path as concurrent users grow.
+
+Every simulated user sends --turns messages one after another, each waiting
+for its streamed answer from the fake backend. "blocking" runs all calls on
+a single worker, as when they ran inside the GUI callback; "executor" uses
+the demo's background pool of LLM_WORKERS threads.
+
+    python benchmarks/bench_demo_concurrency.py --users 1,2,4,8,16,32
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("LLM_BACKEND", "fake")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from askatlas_core import llm
+
+
+def answer(history, message):
+    return "".join(llm.get_backend().stream(history, message))
+
+
+def run(users, turns, workers):
+    pool = ThreadPoolExecutor(max_workers=workers)
+
+    def user_session(user):
+        history = []
+        for turn in range(turns):
+            message = f"user {user} message {turn}"
+            reply = pool.submit(answer, history, message).result()
+            history += [{"role": "user", "parts": [message]}, {"role": "model", "parts": [reply]}]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=users) as sessions:
+        list(sessions.map(user_session, range(users)))
+    elapsed = time.perf_counter() - started
+    pool.shutdown()
+    return round(users * turns / elapsed, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Demo LLM concurrency benchmark")
+    parser.add_argument("--users", default="1,2,4,8,16")
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("LLM_WORKERS", "16")))
+    args = parser.parse_args()
+
+    report = {"turns_per_user": args.turns, "workers": args.workers, "turns_per_second": []}
+    for users in [int(u) for u in args.users.split(",")]:
+        report["turns_per_second"].append({
+            "users": users,
+            "blocking": run(users, args.turns, workers=1),
+            "executor": run(users, args.turns, workers=args.workers),
+        })
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Compare the PyTorch and ONNX (fp32 / int8) embedding engines: model load
+time, peak RSS and sentences per second.
+
+Each engine runs in its own subprocess so load time and RSS are not
+polluted by the others. Export the ONNX model first:
+
+    python -m askatlas_core.embeddings export
+    python benchmarks/bench_embeddings.py
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SENTENCES = [
+    "What are the opening hours of the Louvre?",
+    "Suggest a vegetarian restaurant near Shibuya station.",
+    "How long does it take to walk from the Colosseum to the Pantheon?",
+    "Is the Sagrada Familia worth visiting in the evening, and do I need tickets in advance?",
+    "thanks!",
+    "Plan a two day itinerary for Lisbon with a focus on viewpoints and seafood.",
+]
+
+ENGINES = {
+    "torch": {"EMBEDDING_ENGINE": "torch"},
+    "onnx-fp32": {"EMBEDDING_ENGINE": "onnx", "ONNX_QUANTIZED": "0"},
+    "onnx-int8": {"EMBEDDING_ENGINE": "onnx", "ONNX_QUANTIZED": "1"},
+}
+
+
+def run_engine(sentences, batch_size):
+    """Measure the engine selected by the environment; runs inside the subprocess."""
+    sys.path.insert(0, ROOT_DIR)
+    started = time.perf_counter()
+    from askatlas_core.embeddings import load_embedder
+    embedder = load_embedder()
+    embedder.encode(sentences[0])
+    load_seconds = time.perf_counter() - started
+
+    # Single-sentence calls, as generate_embedding makes them
+    started = time.perf_counter()
+    for sentence in sentences:
+        embedder.encode(sentence)
+    single_rate = len(sentences) / (time.perf_counter() - started)
+
+    started = time.perf_counter()
+    for start in range(0, len(sentences), batch_size):
+        embedder.encode(sentences[start:start + batch_size])
+    batch_rate = len(sentences) / (time.perf_counter() - started)
+
+    return {
+        "load_seconds": round(load_seconds, 3),
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        "sentences_per_second_single": round(single_rate, 1),
+        "sentences_per_second_batched": round(batch_rate, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding engine benchmark")
+    parser.add_argument("--sentences", type=int, default=600)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--engines", default=",".join(ENGINES))
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sentences = (SENTENCES * (args.sentences // len(SENTENCES) + 1))[:args.sentences]
+
+    if args.worker:
+        print(json.dumps(run_engine(sentences, args.batch_size)))
+        return
+
+    report = {}
+    for name in args.engines.split(","):
+        env = dict(os.environ, **ENGINES[name])
+        completed = subprocess.run(
+            [sys.executable, __file__, "--worker", name,
+             "--sentences", str(args.sentences), "--batch-size", str(args.batch_size)],
+            env=env, capture_output=True, text=True, cwd=ROOT_DIR)
+        if completed.returncode != 0:
+            report[name] = {"error": completed.stderr.strip().splitlines()[-1:]}
+            continue
+        report[name] = json.loads(completed.stdout.strip().splitlines()[-1])
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
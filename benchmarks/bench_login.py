@@ -0,0 +1,67 @@
+"""
+Login throughput under a burst of concurrent sessions.
+
+Runs verify_user from many threads against a scratch database and reports
+logins/s and latency percentiles. Compare pool sizes and cost factors with
+the environment, e.g.
+
+    BCRYPT_WORKERS=1 python benchmarks/bench_login.py
+    BCRYPT_WORKERS=4 BCRYPT_ROUNDS=10 python benchmarks/bench_login.py
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Login throughput benchmark")
+    parser.add_argument("--sessions", type=int, default=32, help="concurrent login threads")
+    parser.add_argument("--logins", type=int, default=200, help="total logins")
+    parser.add_argument("--users", type=int, default=20)
+    args = parser.parse_args()
+
+    # The core creates its database on import, so point it at a scratch directory first
+    os.environ["ASKATLAS_DATA_DIR"] = tempfile.mkdtemp(prefix="bench_login_")
+    os.environ.pop("CHAT_DB_PATH", None)
+    sys.path.insert(0, ROOT_DIR)
+    from askatlas_core import passwords, storage as database
+
+    usernames = [f"user{i}" for i in range(args.users)]
+    for username in usernames:
+        database.create_user(username, f"{username}@example.com", "correct horse")
+
+    def login(i):
+        started = time.perf_counter()
+        try:
+            ok = database.verify_user(usernames[i % len(usernames)], "correct horse") is not None
+        except passwords.PasswordPoolBusy:
+            ok = None
+        return ok, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        results = list(pool.map(login, range(args.logins)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for ok, latency in results if ok)
+    print(json.dumps({
+        "bcrypt_rounds": passwords.BCRYPT_ROUNDS,
+        "bcrypt_workers": passwords.BCRYPT_WORKERS,
+        "sessions": args.sessions,
+        "logins": args.logins,
+        "succeeded": len(latencies),
+        "shed": sum(1 for ok, _ in results if ok is None),
+        "logins_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 1) if latencies else None,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
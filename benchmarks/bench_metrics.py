@@ -0,0 +1,80 @@
+"""
+Cost of recording metrics on the hot path.
+
+Times counter increments and histogram observations from one thread and
+from many threads at once (to show recording does not contend), plus one
+scrape of the registry, and compares the metric calls a chat turn makes
+with a typical turn latency:
+
+    python benchmarks/bench_metrics.py --ops 200000 --threads 8
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Counter increments and histogram observations made by one process_message call with context
+RECORDS_PER_TURN = 30
+
+
+def per_op_ns(fn, ops):
+    started = time.perf_counter()
+    for _ in range(ops):
+        fn()
+    return (time.perf_counter() - started) / ops * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Metrics recording overhead benchmark")
+    parser.add_argument("--ops", type=int, default=200000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--turn-ms", type=float, default=1500,
+                        help="typical end-to-end turn latency the overhead is compared to")
+    args = parser.parse_args()
+
+    os.environ["ASKATLAS_DATA_DIR"] = tempfile.mkdtemp(prefix="bench_metrics_")
+    sys.path.insert(0, ROOT_DIR)
+    from askatlas_core import metrics
+
+    counter = metrics.counter("bench_ops_total", "Benchmark counter", ["op"])
+    histogram = metrics.histogram("bench_seconds", "Benchmark histogram", ["op"])
+    series = histogram.labels("query")
+
+    def timed_block():
+        with series.time():
+            pass
+
+    report = {
+        "counter_inc_labelled_ns": round(per_op_ns(lambda: counter.labels("query").inc(), args.ops), 1),
+        "histogram_observe_ns": round(per_op_ns(lambda: series.observe(0.012), args.ops), 1),
+        "histogram_time_ns": round(per_op_ns(timed_block, args.ops), 1),
+    }
+
+    def worker(_):
+        return per_op_ns(lambda: series.observe(0.012), args.ops // args.threads)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        list(pool.map(worker, range(args.threads)))
+    elapsed = time.perf_counter() - started
+    report["threads"] = args.threads
+    report["histogram_observe_contended_ns"] = round(elapsed / (args.ops // args.threads * args.threads) * 1e9, 1)
+
+    started = time.perf_counter()
+    text = metrics.render()
+    report["scrape_ms"] = round((time.perf_counter() - started) * 1000, 3)
+    report["scrape_bytes"] = len(text)
+
+    turn_ns = RECORDS_PER_TURN * max(report["counter_inc_labelled_ns"], report["histogram_observe_ns"])
+    report["per_turn_us"] = round(turn_ns / 1000, 2)
+    report["overhead_pct"] = round(turn_ns / 1e6 / args.turn_ms * 100, 5)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Memory held by rendered chat history across many Streamlit sessions.
+
+Each session opens one chat and keeps its history between reruns:
+
+- dicts: the previous representation, the sqlite3 rows copied into dicts
+  plus the formatted dicts built for display, both kept
+- records: the whole chat as slotted Message records
+- capped: a ChatHistory, the recent tail under SESSION_HISTORY_MAX_BYTES
+
+Each mode runs in its own process so RSS growth is measured from a clean
+baseline:
+
+    python benchmarks/bench_session_memory.py --sessions 2000 --messages 1000
+"""
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+MODES = ["dicts", "records", "capped"]
+
+
+def current_rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def load_as_dicts(storage, chat_id):
+    """The pre-compaction path: raw row dicts plus formatted dicts, both held by the session."""
+    conn = storage.get_db_connection()
+    rows = [dict(row) for row in conn.execute(
+        "SELECT id, is_user, content, timestamp, vector_id FROM messages WHERE chat_id = ? ORDER BY id",
+        (chat_id,))]
+    conn.close()
+    formatted = [{"id": m["id"], "role": "user" if m["is_user"] else "assistant",
+                  "content": m["content"], "timestamp": m["timestamp"]} for m in rows]
+    return rows, formatted
+
+
+def measure(mode, sessions, chats):
+    """Open `sessions` sessions round-robin over `chats` and report the RSS they add."""
+    from askatlas_core import storage
+    from askatlas_core.chat_handler import load_chat_history, SESSION_HISTORY_MAX_BYTES
+
+    chat_ids = chats["chat_ids"]
+    # Warm up imports, the connection path and the allocator before the baseline
+    load = {
+        "dicts": lambda chat_id: load_as_dicts(storage, chat_id),
+        "records": storage.get_chat_messages,
+        "capped": load_chat_history,
+    }[mode]
+    load(chat_ids[0])
+    gc.collect()
+    baseline = current_rss_mb()
+
+    started = time.perf_counter()
+    held = []
+    for i in range(sessions):
+        chat_id = chat_ids[i % len(chat_ids)]
+        held.append(load(chat_id))
+    elapsed = time.perf_counter() - started
+    gc.collect()
+
+    added = current_rss_mb() - baseline
+    report = {
+        "mode": mode,
+        "sessions": sessions,
+        "rss_added_mb": round(added, 1),
+        "kb_per_session": round(added * 1024 / sessions, 1),
+        "load_ms_per_session": round(elapsed / sessions * 1000, 3),
+    }
+    if mode == "capped":
+        report["messages_kept_per_session"] = round(sum(len(h) for h in held) / sessions, 1)
+        report["max_bytes_per_session"] = SESSION_HISTORY_MAX_BYTES
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Session history RSS benchmark")
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--chats", type=int, default=50, help="distinct chats the sessions open")
+    parser.add_argument("--messages", type=int, default=1000, help="messages per chat")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    parser.add_argument("--data-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT_DIR)
+    if args.mode:
+        os.environ["ASKATLAS_DATA_DIR"] = args.data_dir
+        from synthetic_data import load_dataset
+        dataset = load_dataset()
+        chat_ids = [c for ids in dataset["chat_ids"].values() for c in ids]
+        print(json.dumps(measure(args.mode, args.sessions, {"chat_ids": chat_ids})))
+        return
+
+    data_dir = tempfile.mkdtemp(prefix="bench_session_memory_")
+    os.environ["ASKATLAS_DATA_DIR"] = data_dir
+    from synthetic_data import populate
+    populate(users=1, chats=args.chats, messages=args.messages, log_every=0)
+
+    results = []
+    for mode in MODES:
+        out = subprocess.run(
+            [sys.executable, __file__, "--mode", mode, "--data-dir", data_dir,
+             "--sessions", str(args.sessions)],
+            stdout=subprocess.PIPE, text=True, check=True)
+        results.append(json.loads(out.stdout.strip().splitlines()[-1]))
+
+    baseline = results[0]["rss_added_mb"]
+    for result in results[1:]:
+        result["rss_reduction_pct"] = round((1 - result["rss_added_mb"] / baseline) * 100, 1) if baseline else None
+    print(json.dumps({"messages_per_chat": args.messages, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
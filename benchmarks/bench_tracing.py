@@ -0,0 +1,72 @@
+"""
+Cost of the tracing layer on a chat turn.
+
+Replays the span structure of process_message (one root plus the DB,
+embedding, Chroma, history and LLM stages) around no-op work and reports
+the added time per turn with tracing off, sampled and always on, as a
+share of a typical turn:
+
+    python benchmarks/bench_tracing.py --turns 20000 --turn-ms 1500
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Spans recorded by one turn with use_context=True
+STAGES = [
+    "db.save_message", "embedding.encode", "chroma.add", "db.update_message_vector_id",
+    "db.get_chat_messages", "history.format", "retrieval.context", "retrieval.hybrid",
+    "db.search_messages_fts", "embedding.encode", "chroma.query", "db.get_messages_by_ids",
+    "retrieval.assemble", "db.save_message", "embedding.encode", "chroma.add",
+    "db.update_message_vector_id",
+]
+
+
+def run_turns(tracing, turns):
+    chunks = ["word "] * 40
+    started = time.perf_counter()
+    for _ in range(turns):
+        with tracing.start_trace("chat.turn", user_id=1, chat_id=1, use_context=True):
+            for name in STAGES:
+                with tracing.span(name):
+                    pass
+            for _ in tracing.traced_stream("llm.stream", chunks, model="bench"):
+                pass
+    return (time.perf_counter() - started) / turns
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tracing overhead benchmark")
+    parser.add_argument("--turns", type=int, default=20000)
+    parser.add_argument("--turn-ms", type=float, default=1500,
+                        help="typical end-to-end turn latency the overhead is compared to")
+    args = parser.parse_args()
+
+    os.environ["ASKATLAS_DATA_DIR"] = tempfile.mkdtemp(prefix="bench_tracing_")
+    sys.path.insert(0, ROOT_DIR)
+    from askatlas_core import tracing
+
+    tracing.TRACE_FILE = os.path.join(os.environ["ASKATLAS_DATA_DIR"], "traces.jsonl")
+    configs = [("off", "off", 0.0), ("jsonl-5%", "jsonl", 0.05), ("jsonl-100%", "jsonl", 1.0)]
+
+    report = {"spans_per_turn": len(STAGES) + 2, "turn_ms": args.turn_ms}
+    for name, export, rate in configs:
+        tracing.TRACE_EXPORT = export
+        tracing.TRACE_SAMPLE_RATE = rate
+        per_turn = run_turns(tracing, args.turns)
+        tracing.flush()
+        report[name] = {
+            "us_per_turn": round(per_turn * 1e6, 2),
+            "overhead_pct": round(per_turn * 1000 / args.turn_ms * 100, 4),
+        }
+    report["export"] = tracing.get_tracing_stats()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
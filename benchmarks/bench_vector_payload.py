@@ -0,0 +1,145 @@
+"""
+Compare a Chroma collection that stores message text in its metadata with
+one that keeps only ids and compact metadata (text hydrated from SQLite).
+
+Reports on-disk size and filtered query latency for both layouts.
+
+    python benchmarks/bench_vector_payload.py --messages 20000
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import string
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+from chromadb.config import Settings
+
+DIM = 384  # all-MiniLM-L6-v2
+
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def random_text(rng, min_words, max_words):
+    words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+             for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words)
+
+
+def build_messages(count, users, seed):
+    rng = random.Random(seed)
+    messages = []
+    for message_id in range(1, count + 1):
+        is_user = message_id % 2 == 1
+        # Assistant replies are much longer than user questions
+        text = random_text(rng, 5, 25) if is_user else random_text(rng, 80, 400)
+        messages.append({
+            "message_id": message_id,
+            "user_id": rng.randint(1, users),
+            "chat_id": rng.randint(1, users * 20),
+            "is_user": is_user,
+            "content": text,
+        })
+    return messages
+
+
+def build_sqlite(path, messages):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE messages (id INTEGER PRIMARY KEY, content TEXT NOT NULL)")
+    conn.executemany("INSERT INTO messages (id, content) VALUES (?, ?)",
+                     [(m["message_id"], m["content"]) for m in messages])
+    conn.commit()
+    return conn
+
+
+def build_collection(path, messages, embeddings, with_content):
+    client = chromadb.PersistentClient(path=path, settings=Settings(anonymized_telemetry=False))
+    collection = client.create_collection("chat_messages")
+    batch = 1000
+    for start in range(0, len(messages), batch):
+        chunk = messages[start:start + batch]
+        metadatas = []
+        for m in chunk:
+            metadata = {k: m[k] for k in ("user_id", "message_id", "chat_id", "is_user")}
+            if with_content:
+                metadata["content"] = m["content"]
+            metadatas.append(metadata)
+        collection.add(
+            ids=[str(m["message_id"]) for m in chunk],
+            embeddings=embeddings[start:start + batch].tolist(),
+            metadatas=metadatas,
+        )
+    return collection
+
+
+def time_queries(collection, queries, users, n_results, conn=None):
+    rng = random.Random(1)
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        results = collection.query(
+            query_embeddings=[query.tolist()],
+            n_results=n_results,
+            where={"user_id": rng.randint(1, users)},
+        )
+        if conn is not None:
+            ids = [m["message_id"] for m in results["metadatas"][0]]
+            placeholders = ", ".join("?" for _ in ids)
+            conn.execute(f"SELECT id, content FROM messages WHERE id IN ({placeholders})",
+                         ids).fetchall()
+        else:
+            [m["content"] for m in results["metadatas"][0]]
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--n-results", type=int, default=10)
+    args = parser.parse_args()
+
+    messages = build_messages(args.messages, args.users, seed=42)
+    rng = np.random.default_rng(42)
+    embeddings = rng.standard_normal((args.messages, DIM)).astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    queries = rng.standard_normal((args.queries, DIM)).astype(np.float32)
+
+    workdir = tempfile.mkdtemp(prefix="bench_vector_payload_")
+    try:
+        conn = build_sqlite(os.path.join(workdir, "chat_app.db"), messages)
+        report = {"messages": args.messages, "users": args.users}
+        for name, with_content in (("content_in_metadata", True), ("slim", False)):
+            path = os.path.join(workdir, name)
+            collection = build_collection(path, messages, embeddings, with_content)
+            report[name] = {
+                "disk_bytes": dir_size(path),
+                **time_queries(collection, queries, args.users, args.n_results,
+                               conn=None if with_content else conn),
+            }
+        report["disk_saved_bytes"] = (report["content_in_metadata"]["disk_bytes"]
+                                      - report["slim"]["disk_bytes"])
+        print(json.dumps(report, indent=2))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
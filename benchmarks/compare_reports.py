@@ -0,0 +1,67 @@
+"""
+Compare two run_suite.py reports, e.g. from the base and head of a branch.
+
+Prints throughput and latency percentiles side by side for every scenario
+(and replayed operation) present in both reports, and exits non-zero when
+a p95 latency regressed by more than --threshold percent:
+
+    python benchmarks/compare_reports.py before.json after.json --threshold 10
+"""
+import argparse
+import json
+import sys
+
+METRICS = ["throughput_per_second", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb"]
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def results(report):
+    """Flatten a report into {name: summary} for the closed-loop and replayed operations."""
+    flat = {name: summary for name, summary in report.get("scenarios", {}).items() if "ops" in summary}
+    replay = report.get("replay")
+    if replay:
+        flat["replay"] = replay["overall"]
+        for op, summary in replay["ops"].items():
+            flat[f"replay.{op}"] = summary
+    return flat
+
+
+def change(old, new):
+    if old in (None, 0) or new is None:
+        return None
+    return (new - old) / old * 100
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark suite reports")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=10.0,
+                        help="fail if any p95 grows by more than this many percent")
+    args = parser.parse_args()
+
+    before, after = load(args.before), load(args.after)
+    old, new = results(before), results(after)
+    print(f"before: {before['meta'].get('commit')}  after: {after['meta'].get('commit')}")
+
+    regressions = []
+    for name in sorted(set(old) & set(new)):
+        print(f"\n{name}")
+        for metric in METRICS:
+            delta = change(old[name].get(metric), new[name].get(metric))
+            shown = f"{delta:+.1f}%" if delta is not None else "n/a"
+            print(f"  {metric:<22} {old[name].get(metric)!s:>12} -> {new[name].get(metric)!s:>12}  {shown}")
+            if metric == "p95_ms" and delta is not None and delta > args.threshold:
+                regressions.append(f"{name} p95 {delta:+.1f}%")
+
+    if regressions:
+        print("\nregressions over threshold: " + ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Local load test for the production demo-chatbot profile.
+
+With --spawn, starts one serve.py worker on the fake LLM backend and
+records its startup time (until /healthz answers) and RSS, then loads it.
+Without --spawn, loads an already running deployment, e.g. the container
+started from demo-chatbot/Dockerfile:
+
+    python benchmarks/loadtest_demo.py --spawn
+    python benchmarks/loadtest_demo.py --url http://127.0.0.1:5000 --concurrency 64
+
+With --spawn the report also compares the worker with the per-process budget
+in demo-chatbot/README.md, and the exit status is 1 if any of it is exceeded.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEMO_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "demo-chatbot")
+
+# Per-worker budget from demo-chatbot/README.md; keep the two in step
+BUDGET = {
+    "startup_seconds": 10,
+    "rss_mb_idle": 250,
+    "rss_mb_after_load": 300,
+}
+
+
+def rss_mb(pid):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return round(int(line.split()[1]) / 1024, 1)
+    return None
+
+
+def get(url, timeout=10):
+    started = time.perf_counter()
+    with urllib.request.urlopen(url, timeout=timeout) as response:
+        response.read()
+        status = response.status
+    return status, time.perf_counter() - started
+
+
+def wait_healthy(url, deadline):
+    while time.perf_counter() < deadline:
+        try:
+            if get(url + "/healthz", timeout=1)[0] == 200:
+                return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def load(url, path, requests, concurrency):
+    def one(_):
+        try:
+            return get(url + path)
+        except OSError:
+            return None, None
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for status, latency in results if status == 200)
+    pick = lambda q: round(latencies[min(len(latencies) - 1, int(len(latencies) * q))] * 1000, 1)
+    return {
+        "path": path,
+        "ok": len(latencies),
+        "errors": requests - len(latencies),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": pick(0.5) if latencies else None,
+        "p95_ms": pick(0.95) if latencies else None,
+        "p99_ms": pick(0.99) if latencies else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="demo-chatbot load test")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--spawn", action="store_true", help="start a local serve.py worker")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    report = {}
+    worker = None
+    if args.spawn:
+        port = args.url.rsplit(":", 1)[1]
+        env = dict(os.environ, LLM_BACKEND="fake",
+                   PYTHONPATH=os.path.dirname(DEMO_DIR),
+                   CHAT_DB_PATH=os.path.join(tempfile.mkdtemp(), "chat_app.db"))
+        started = time.perf_counter()
+        worker = subprocess.Popen([sys.executable, "serve.py", "--port", port],
+                                  cwd=DEMO_DIR, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if not wait_healthy(args.url, started + 60):
+            worker.kill()
+            sys.exit("worker did not become healthy within 60s")
+        report["startup_seconds"] = round(time.perf_counter() - started, 2)
+        report["rss_mb_idle"] = rss_mb(worker.pid)
+
+    try:
+        report["load"] = [load(args.url, path, args.requests, args.concurrency)
+                          for path in ("/healthz", "/")]
+        if worker:
+            report["rss_mb_after_load"] = rss_mb(worker.pid)
+    finally:
+        if worker:
+            worker.terminate()
+            worker.wait()
+
+    if worker:
+        report["over_budget"] = [key for key, limit in BUDGET.items()
+                                 if report.get(key) is None or report[key] > limit]
+
+    print(json.dumps(report, indent=2))
+    if report.get("over_budget"):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
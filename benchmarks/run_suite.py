@@ -0,0 +1,345 @@
+"""
+End-to-end benchmark suite against a synthetic population and the fake LLM.
+
+Populates a scratch database (or reuses one with --data-dir --reuse), then
+drives the core entry points closed-loop with --concurrency workers:
+
+- auth_login: verify_user (bcrypt)
+- auth_token: authenticate_token (signed session token)
+- get_user_chats, get_chat_messages
+- search_user_messages (needs chromadb and an embedding engine)
+- process_message, with and without past-chat context (same requirement)
+
+and optionally replays a request trace open-loop, at the recorded arrival
+times. A trace is either the JSONL written by synthetic_data.py --trace or
+a TRACE_EXPORT=jsonl span file from a real deployment, whose chat.turn and
+ui.render roots are replayed against the synthetic users.
+
+Prints (or writes with --output) one JSON report with throughput,
+p50/p95/p99 latency and RSS per scenario, tagged with the git commit, so
+reports from two commits can be diffed with compare_reports.py:
+
+    python benchmarks/run_suite.py --output before.json
+    python benchmarks/run_suite.py --replay trace.jsonl --speed 2 --output after.json
+    python benchmarks/compare_reports.py before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import synthetic_data
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = ["auth_login", "auth_token", "get_user_chats", "get_chat_messages",
+             "search_user_messages", "process_message", "process_message_context"]
+
+# Scenarios that import the vector store, and so need chromadb and an embedding model
+NEEDS_VECTORS = {"search_user_messages", "process_message", "process_message_context"}
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def current_rss_mb():
+    try:
+        with open("/proc/self/statm") as f:
+            return round(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20, 1)
+    except (OSError, ValueError):
+        return None
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (2**20 if sys.platform == "darwin" else 1024), 1)
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    ms = lambda value: round(value * 1000, 3) if value is not None else None
+    return {
+        "ops": len(latencies),
+        "errors": errors,
+        "throughput_per_second": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+        "rss_mb": current_rss_mb(),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Workload:
+    """Builds the callable for each operation against the synthetic dataset."""
+
+    def __init__(self, dataset, seed, vector_users):
+        from askatlas_core import storage, sessions
+
+        self.storage = storage
+        self.sessions = sessions
+        self.user_ids = dataset["user_ids"]
+        self.chat_ids = dataset["chat_ids"]
+        self.vector_users = self.user_ids[:vector_users] or self.user_ids
+        self.usernames = {user_id: f"bench{i}" for i, user_id in enumerate(self.user_ids)}
+        self.tokens = {user_id: sessions.issue_token(user_id) for user_id in self.user_ids}
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+
+    def pick(self, user=None, chat=None):
+        with self.rng_lock:
+            user_id = self.user_ids[user % len(self.user_ids)] if user is not None else self.rng.choice(self.user_ids)
+            chats = self.chat_ids[user_id]
+            chat_id = chats[chat % len(chats)] if chat is not None else self.rng.choice(chats)
+            return user_id, chat_id
+
+    def question(self):
+        with self.rng_lock:
+            return synthetic_data.make_question(self.rng)
+
+    def op(self, name, user=None, chat=None, text=None):
+        """Return a zero-argument callable performing one operation."""
+        user_id, chat_id = self.pick(user, chat)
+        if name == "auth_login":
+            username = self.usernames[user_id]
+            return lambda: self.storage.verify_user(username, synthetic_data.PASSWORD)
+        if name == "auth_token":
+            return lambda: self.sessions.authenticate_token(self.tokens[user_id])
+        if name == "get_user_chats":
+            return lambda: self.storage.get_user_chats(user_id)
+        if name == "get_chat_messages":
+            return lambda: self.storage.get_chat_messages(chat_id)
+
+        text = text or self.question()
+        if name == "search_user_messages":
+            from askatlas_core.vector_store import search_user_messages
+            with self.rng_lock:
+                user_id = self.rng.choice(self.vector_users)
+            return lambda: search_user_messages(text, user_id)
+        if name in ("process_message", "process_message_context"):
+            from askatlas_core.chat_handler import process_message
+            use_context = name == "process_message_context"
+            return lambda: process_message(user_id, chat_id, text, use_context=use_context)
+        raise ValueError(f"unknown operation {name}")
+
+
+def run_closed_loop(workload, name, ops, concurrency):
+    latencies = []
+    errors = 0
+
+    def one(_):
+        call = workload.op(name)
+        started = time.perf_counter()
+        try:
+            call()
+        except Exception:
+            return None
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for latency in pool.map(one, range(ops)):
+            if latency is None:
+                errors += 1
+            else:
+                latencies.append(latency)
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+def load_events(path, seed):
+    """
+    Read a trace as a list of {t, op, user, chat, text?} events, sorted by time.
+
+    Span files from askatlas_core.tracing are converted: chat.turn roots
+    become process_message(_context) and ui.render roots get_chat_messages,
+    keyed by their recorded user and chat ids.
+    """
+    events = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                events.append(json.loads(line))
+    if not events or "op" in events[0]:
+        return sorted(events, key=lambda e: e["t"])
+
+    rng = random.Random(seed)
+    roots = [e for e in events if e.get("parent_id") is None and e["name"] in ("chat.turn", "ui.render")]
+    if not roots:
+        return []
+    first = min(e["start_ns"] for e in roots)
+    converted = []
+    for root in roots:
+        attributes = root.get("attributes", {})
+        if root["name"] == "chat.turn":
+            op = "process_message_context" if attributes.get("use_context") else "process_message"
+        else:
+            op = "get_chat_messages"
+        converted.append({
+            "t": (root["start_ns"] - first) / 1e9,
+            "op": op,
+            "user": int(attributes.get("user_id") or 0),
+            "chat": int(attributes.get("chat_id") or 0),
+            "text": synthetic_data.make_question(rng),
+        })
+    return sorted(converted, key=lambda e: e["t"])
+
+
+def replay(workload, events, speed, concurrency, skip_ops):
+    """
+    Issue each event at its recorded offset (divided by speed). Latency is
+    measured from the scheduled time, so queueing behind a slow pool counts.
+    """
+    per_op = {}
+    lock = threading.Lock()
+    max_lag = 0.0
+
+    def one(event, scheduled):
+        try:
+            workload.op(event["op"], event["user"], event["chat"], event.get("text"))()
+            ok = True
+        except Exception:
+            ok = False
+        latency = time.perf_counter() - scheduled
+        with lock:
+            latencies, errors = per_op.setdefault(event["op"], ([], [0]))
+            if ok:
+                latencies.append(latency)
+            else:
+                errors[0] += 1
+
+    events = [e for e in events if e["op"] not in skip_ops]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for event in events:
+            scheduled = started + event["t"] / speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                max_lag = max(max_lag, -delay)
+            pool.submit(one, event, scheduled)
+    elapsed = time.perf_counter() - started
+
+    everything = [latency for latencies, _ in per_op.values() for latency in latencies]
+    report = {
+        "events": len(events),
+        "speed": speed,
+        "max_dispatch_lag_ms": round(max_lag * 1000, 3),
+        "overall": summarize(everything, sum(errors[0] for _, errors in per_op.values()), elapsed),
+        "ops": {op: summarize(latencies, errors[0], elapsed) for op, (latencies, errors) in sorted(per_op.items())},
+    }
+    return report
+
+
+def vectors_available():
+    try:
+        import chromadb  # noqa: F401
+    except ImportError as e:
+        return str(e)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AskAtlas end-to-end benchmark suite")
+    parser.add_argument("--data-dir", help="database directory (default: a new temp dir)")
+    parser.add_argument("--reuse", action="store_true", help="use the dataset already in --data-dir")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=40)
+    parser.add_argument("--vector-users", type=int, default=5)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--ops", type=int, default=500, help="operations per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--replay", help="trace to replay after the scenarios")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay time compression factor")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    # Everything below must be configured before the core is imported
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="askatlas_suite_")
+    os.environ["ASKATLAS_DATA_DIR"] = data_dir
+    os.environ.pop("CHAT_DB_PATH", None)
+    os.environ["LLM_BACKEND"] = "fake"
+    os.environ.setdefault("FAKE_LLM_FIRST_CHUNK_DELAY", "0.05")
+    os.environ.setdefault("FAKE_LLM_CHUNK_DELAY", "0.002")
+    sys.path.insert(0, ROOT_DIR)
+
+    if args.reuse:
+        dataset = synthetic_data.load_dataset()
+    else:
+        dataset = synthetic_data.populate(args.users, args.chats, args.messages, args.seed)
+    if not dataset["user_ids"]:
+        sys.exit(f"no synthetic users in {data_dir}")
+
+    missing_vectors = vectors_available()
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+            "env": {k: os.environ[k] for k in ("FAKE_LLM_FIRST_CHUNK_DELAY", "FAKE_LLM_CHUNK_DELAY",
+                                               "BCRYPT_ROUNDS", "EMBEDDING_ENGINE") if k in os.environ},
+        },
+        "dataset": {
+            "users": len(dataset["user_ids"]),
+            "chats": sum(len(c) for c in dataset["chat_ids"].values()),
+            "populate_seconds": dataset["seconds"],
+        },
+        "scenarios": {},
+    }
+
+    if missing_vectors is None and not args.reuse and args.vector_users:
+        report["dataset"]["vectors"] = synthetic_data.index_vectors(dataset["user_ids"][:args.vector_users])
+
+    workload = Workload(dataset, args.seed, args.vector_users)
+    for name in args.scenarios.split(","):
+        if name in NEEDS_VECTORS and missing_vectors:
+            report["scenarios"][name] = {"skipped": missing_vectors}
+            continue
+        print(f"running {name}", file=sys.stderr)
+        report["scenarios"][name] = run_closed_loop(workload, name, args.ops, args.concurrency)
+
+    if args.replay:
+        print(f"replaying {args.replay}", file=sys.stderr)
+        events = load_events(args.replay, args.seed)
+        skip = NEEDS_VECTORS if missing_vectors else set()
+        report["replay"] = replay(workload, events, args.speed, args.concurrency, skip)
+        if skip:
+            report["replay"]["skipped_ops"] = sorted(skip)
+
+    report["peak_rss_mb"] = peak_rss_mb()
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
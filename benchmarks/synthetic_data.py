@@ -0,0 +1,224 @@
+"""
+Synthetic users, chats, messages and request traces for the benchmark suite.
+
+Populates the database configured by ASKATLAS_DATA_DIR / CHAT_DB_PATH with
+users who all share one password, chats titled the way create_chat titles
+them, and alternating user/assistant messages about travel. Messages are
+bulk-inserted in one transaction per user, so the FTS triggers and indexes
+do the same work they do in production.
+
+The full-scale dataset is 1,000 users x 100 chats x 200 messages (20M
+messages, several GB of SQLite); the defaults are a quick local profile.
+
+    ASKATLAS_DATA_DIR=/tmp/askatlas-bench python benchmarks/synthetic_data.py \\
+        --users 1000 --chats 100 --messages 200 --trace /tmp/askatlas-bench/trace.jsonl
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PASSWORD = "correct horse battery staple"
+
+CITIES = ["Lisbon", "Kyoto", "Marrakesh", "Reykjavik", "Cusco", "Hanoi", "Istanbul", "Cape Town",
+          "Vancouver", "Tbilisi", "Oaxaca", "Seville", "Hobart", "Bergen", "Penang", "Valparaiso"]
+SIGHTS = ["old town", "night market", "cathedral", "harbour", "botanical garden", "fortress",
+          "food hall", "viewpoint", "museum", "hot springs", "lighthouse", "tea house"]
+TOPICS = ["vegetarian food", "a rainy day", "two days", "a family with kids", "a tight budget",
+          "public transport", "sunset photos", "a day trip", "late-night snacks", "a first visit"]
+QUESTIONS = [
+    "What should I see in {city} with {topic}?",
+    "Is the {sight} in {city} worth it?",
+    "How do I get from the airport to the {sight} in {city}?",
+    "Plan {topic} in {city} around the {sight}.",
+    "Remember the {sight} you suggested in {city}? What is near it?",
+    "thanks!",
+]
+ANSWERS = [
+    "In {city}, start at the {sight} early, then walk to the {sight2} for lunch. For {topic}, "
+    "book ahead and keep the afternoon loose.",
+    "The {sight} in {city} is worth a half day. Combine it with the {sight2}; both are easy on "
+    "{topic}.",
+    "Take the metro towards the {sight}, change once, and you are there in 40 minutes. The "
+    "{sight2} is a short walk away.",
+]
+
+# Request mix of a generated trace: operation, weight
+TRACE_MIX = [
+    ("process_message", 0.45),
+    ("process_message_context", 0.15),
+    ("get_chat_messages", 0.15),
+    ("get_user_chats", 0.1),
+    ("search_user_messages", 0.1),
+    ("auth_token", 0.05),
+]
+
+
+def make_question(rng):
+    return rng.choice(QUESTIONS).format(city=rng.choice(CITIES), sight=rng.choice(SIGHTS),
+                                        topic=rng.choice(TOPICS))
+
+
+def make_answer(rng):
+    return rng.choice(ANSWERS).format(city=rng.choice(CITIES), sight=rng.choice(SIGHTS),
+                                      sight2=rng.choice(SIGHTS), topic=rng.choice(TOPICS))
+
+
+def chat_title(index):
+    return f"New Chat ({index})" if index else "New Chat"
+
+
+def populate(users, chats, messages, seed=0, log_every=50):
+    """
+    Insert the synthetic dataset into the core database.
+
+    Returns:
+        Dict with the user ids, the chat ids per user and the time taken
+    """
+    from askatlas_core import storage
+    from askatlas_core.passwords import hash_password
+
+    rng = random.Random(seed)
+    password_hash = hash_password(PASSWORD)
+    started = time.perf_counter()
+    user_ids = []
+    chat_ids = {}
+
+    conn = storage.get_db_connection()
+    try:
+        for u in range(users):
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO users (username, email, password_hash) VALUES (?, ?, ?)",
+                (f"bench{u}", f"bench{u}@example.com", password_hash))
+            user_id = cursor.lastrowid
+
+            ids = []
+            for c in range(chats):
+                cursor.execute("INSERT INTO chats (user_id, title) VALUES (?, ?)", (user_id, chat_title(c)))
+                ids.append(cursor.lastrowid)
+            cursor.execute(
+                "INSERT INTO chat_title_counters (user_id, base_title, next_suffix) VALUES (?, ?, ?)",
+                (user_id, "New Chat", chats))
+
+            rows = []
+            for chat_id in ids:
+                for m in range(messages):
+                    is_user = m % 2 == 0
+                    rows.append((chat_id, user_id, is_user, make_question(rng) if is_user else make_answer(rng)))
+            cursor.executemany(
+                "INSERT INTO messages (chat_id, user_id, is_user, content) VALUES (?, ?, ?, ?)", rows)
+            conn.commit()
+
+            user_ids.append(user_id)
+            chat_ids[user_id] = ids
+            if log_every and (u + 1) % log_every == 0:
+                print(f"populated {u + 1}/{users} users", file=sys.stderr)
+    finally:
+        conn.close()
+
+    return {"user_ids": user_ids, "chat_ids": chat_ids,
+            "seconds": round(time.perf_counter() - started, 2)}
+
+
+def load_dataset():
+    """Read back the user and chat ids of a previously populated database."""
+    from askatlas_core import storage
+
+    conn = storage.get_db_connection()
+    try:
+        rows = conn.execute("""
+            SELECT u.id AS user_id, c.id AS chat_id
+            FROM users u JOIN chats c ON c.user_id = u.id
+            WHERE u.username LIKE 'bench%'
+            ORDER BY u.id, c.id
+        """).fetchall()
+    finally:
+        conn.close()
+
+    chat_ids = {}
+    for row in rows:
+        chat_ids.setdefault(row["user_id"], []).append(row["chat_id"])
+    return {"user_ids": list(chat_ids), "chat_ids": chat_ids, "seconds": 0.0}
+
+
+def index_vectors(user_ids, batch_size=64):
+    """
+    Embed the user messages of the given users into the Chroma collection.
+
+    Embedding the full dataset is impractical, so the suite indexes a few
+    users and runs vector search against them.
+    """
+    from askatlas_core import storage, vector_store
+
+    started = time.perf_counter()
+    indexed = 0
+    for user_id in user_ids:
+        rows = [m for m in storage.get_all_user_messages(user_id) if m["is_user"]]
+        for start in range(0, len(rows), batch_size):
+            batch = rows[start:start + batch_size]
+            embeddings = vector_store.generate_embedding([m["content"] for m in batch])
+            vector_store.collection.add(
+                ids=[f"bench-{m['id']}" for m in batch],
+                embeddings=embeddings,
+                metadatas=[{"user_id": user_id, "message_id": m["id"], "chat_id": m["chat_id"],
+                            "is_user": True} for m in batch])
+            indexed += len(batch)
+    return {"vectors": indexed, "seconds": round(time.perf_counter() - started, 2)}
+
+
+def generate_trace(path, users, chats, duration, rate, seed=0):
+    """
+    Write a request trace: Poisson arrivals at `rate` requests per second for
+    `duration` seconds, drawn from TRACE_MIX. User and chat are indexes into
+    the synthetic dataset, so the trace replays against any population size.
+    """
+    rng = random.Random(seed)
+    ops, weights = zip(*TRACE_MIX)
+    t = 0.0
+    count = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while True:
+            t += rng.expovariate(rate)
+            if t >= duration:
+                break
+            op = rng.choices(ops, weights)[0]
+            event = {"t": round(t, 4), "op": op, "user": rng.randrange(users), "chat": rng.randrange(chats)}
+            if op.startswith("process_message") or op == "search_user_messages":
+                event["text"] = make_question(rng)
+            f.write(json.dumps(event) + "\n")
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Populate a benchmark database")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--chats", type=int, default=20)
+    parser.add_argument("--messages", type=int, default=40)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--vector-users", type=int, default=0,
+                        help="embed the messages of this many users into Chroma")
+    parser.add_argument("--trace", help="also write a generated request trace to this path")
+    parser.add_argument("--trace-seconds", type=float, default=60)
+    parser.add_argument("--trace-rate", type=float, default=20, help="requests per second")
+    args = parser.parse_args()
+
+    sys.path.insert(0, ROOT_DIR)
+    dataset = populate(args.users, args.chats, args.messages, args.seed)
+    report = {"users": args.users, "chats": args.chats, "messages": args.messages,
+              "populate_seconds": dataset["seconds"]}
+    if args.vector_users:
+        report["vectors"] = index_vectors(dataset["user_ids"][:args.vector_users])
+    if args.trace:
+        report["trace_events"] = generate_trace(
+            args.trace, args.users, args.chats, args.trace_seconds, args.trace_rate, args.seed)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
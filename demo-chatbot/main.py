@@ -1,14 +1,43 @@
 import os
 import sys
+import time
+import secrets
+from concurrent.futures import ThreadPoolExecutor
 
-from taipy.gui import Gui, State, notify
-import google.generativeai as genai
-from dotenv import load_dotenv
+from flask import Flask, Response, jsonify
+from taipy.gui import Gui, State, notify, get_state_id, invoke_callback
 
-client = None
-context = "The following is a conversation with an AI assistant. The assistant is helpful, creative, clever, and very friendly.\n\nHuman: Hello, who are you?\nAI: I am an AI created by Google. How can I help you today? "
+from askatlas_core import metrics, storage
+from askatlas_core.llm import get_backend
+
+SYSTEM_INSTRUCTION = "The following is a conversation with an AI assistant. The assistant is helpful, creative, clever, and very friendly."
+GREETING = ["Who are you?", "Hi! I am Gemini 1.5 Pro. How can I help you today?"]
+
+# Number of most recent turns (user + AI message pairs) sent with each request
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW", "10"))
+
+# LLM calls run here so GUI callbacks return immediately
+LLM_WORKERS = int(os.getenv("LLM_WORKERS", "16"))
+executor = ThreadPoolExecutor(max_workers=LLM_WORKERS, thread_name_prefix="llm")
+
+# Conversations in the demo are not tied to a login. Each browser session gets its own
+# service account, created with its first saved message, so visitors never see each other's chats
+DEMO_USER_PREFIX = "taipy-demo-"
+
+TURN_SECONDS = metrics.histogram(
+    "askatlas_demo_turn_seconds", "Time from a message being queued to its answer being saved")
+SESSIONS = metrics.counter("askatlas_demo_sessions_total", "Browser sessions initialised")
+ANSWERS_STARTED = metrics.counter("askatlas_demo_answers_started_total", "Answers queued on the LLM executor")
+ANSWERS_FINISHED = metrics.counter("askatlas_demo_answers_finished_total", "Answers completed or failed", ["result"])
+
+gui = None
+owner = None
+user_id = None
+chat_id = None
+pending = False
+history = []
 conversation = {
-    "Conversation": ["Who are you?", "Hi! I am Gemini 1.5 Pro. How can I help you today?"]
+    "Conversation": list(GREETING)
 }
 current_user_message = ""
 past_conversations = []
@@ -20,48 +49,120 @@ def on_init(state: State) -> None:
     """
     Initialize the app.
     """
-    state.context = "The following is a conversation with an AI assistant. The assistant is helpful, creative, clever, and very friendly.\n\nHuman: Hello, who are you?\nAI: I am an AI created by Google. How can I help you today? "
+    state.history = history_from_conversation(GREETING)
     state.conversation = {
-        "Conversation": ["Who are you?", "Hi! I am Gemini 1.5 Pro. How can I help you today?"]
+        "Conversation": list(GREETING)
     }
     state.current_user_message = ""
+    state.owner = secrets.token_hex(16)
+    state.user_id = None
+    state.chat_id = None
+    state.pending = False
     state.past_conversations = []
     state.selected_conv = None
     state.selected_row = [1]
+    SESSIONS.inc()
+
+
+def list_conversations(state: State) -> list:
+    """
+    List the chats of this browser session only.
+    """
+    return storage.get_chat_titles(state.user_id) if state.user_id is not None else []
+
+
+def history_from_conversation(messages: list) -> list:
+    """
+    Convert the alternating user/AI conversation column to Gemini chat history.
+    """
+    return [
+        {"role": "user" if i % 2 == 0 else "model", "parts": [text]}
+        for i, text in enumerate(messages)
+    ]
+
+
+def set_last_answer(state: State, text: str) -> None:
+    """
+    Replace the answer being streamed in the last row of the conversation.
+    """
+    conv = state.conversation._dict.copy()
+    conv["Conversation"] = conv["Conversation"][:-1] + [text]
+    state.conversation = conv
 
 
-def request(state: State, prompt: str) -> str:
+def finish_answer(state: State, user_id: int, chat_id: int, message: str, answer: str) -> None:
     """
-    Send a prompt to Gemini API and return the response.
+    Record a completed answer in the state once the background call is done.
     """
-    model = genai.GenerativeModel('gemini-2.0-flash')
-    chat = model.start_chat(history=[])
-    response = chat.send_message(prompt)
-    return response.text.strip()
+    set_last_answer(state, answer)
+    state.history = list(state.history) + [
+        {"role": "user", "parts": [message]},
+        {"role": "model", "parts": [answer]},
+    ]
+    state.user_id = user_id
+    if state.chat_id != chat_id:
+        state.chat_id = chat_id
+        state.past_conversations = list_conversations(state)
+    state.pending = False
+    notify(state, "success", "Response received!")
+
+
+def fail_answer(state: State, error: str) -> None:
+    """
+    Report a failed background call and unlock the input.
+    """
+    set_last_answer(state, "")
+    state.pending = False
+    notify(state, "error", f"An error occurred while generating the answer: {error}")
 
 
-def update_context(state: State) -> None:
+def generate_answer(state_id: str, owner: str, user_id, chat_id, history: list, message: str,
+                    queued_at: float) -> None:
     """
-    Update the context with the user's message and the AI's response.
+    Stream an answer on the executor, pushing partial text back to the user's state.
     """
-    state.context += f"Human: \n {state.current_user_message}\n\n AI:"
-    answer = request(state, state.context).replace("\n", "")
-    state.context += answer
-    state.selected_row = [len(state.conversation["Conversation"]) + 1]
-    return answer
+    try:
+        parts = []
+        backend = get_backend(SYSTEM_INSTRUCTION)
+        for chunk in backend.stream(history[-2 * HISTORY_WINDOW:], message):
+            parts.append(chunk)
+            invoke_callback(gui, state_id, set_last_answer, ["".join(parts)])
+        answer = "".join(parts).strip()
+
+        if user_id is None:
+            user_id = storage.get_or_create_service_user(DEMO_USER_PREFIX + owner)
+        if chat_id is None:
+            chat_id = storage.create_chat(user_id, message[:50])
+        storage.save_message(chat_id, user_id, message, is_user=True)
+        storage.save_message(chat_id, user_id, answer, is_user=False)
+    except Exception as ex:
+        ANSWERS_FINISHED.labels("error").inc()
+        invoke_callback(gui, state_id, fail_answer, [str(ex)])
+        return
+    TURN_SECONDS.observe(time.perf_counter() - queued_at)
+    ANSWERS_FINISHED.labels("ok").inc()
+    invoke_callback(gui, state_id, finish_answer, [user_id, chat_id, message, answer])
 
 
 def send_message(state: State) -> None:
     """
-    Send the user's message to the API and update the context.
+    Queue the user's message for the LLM and return without waiting for the answer.
     """
+    if state.pending:
+        notify(state, "warning", "Please wait for the current answer to finish.")
+        return
     notify(state, "info", "Sending message...")
-    answer = update_context(state)
+    message = state.current_user_message
     conv = state.conversation._dict.copy()
-    conv["Conversation"] += [state.current_user_message, answer]
+    conv["Conversation"] = conv["Conversation"] + [message, ""]
     state.current_user_message = ""
     state.conversation = conv
-    notify(state, "success", "Response received!")
+    state.selected_row = [len(conv["Conversation"]) + 1]
+    state.pending = True
+
+    ANSWERS_STARTED.inc()
+    executor.submit(generate_answer, get_state_id(state), state.owner, state.user_id, state.chat_id,
+                    list(state.history), message, time.perf_counter())
 
 
 def style_conv(state: State, idx: int, row: int) -> str:
@@ -87,34 +188,40 @@ def reset_chat(state: State) -> None:
     """
     Reset the chat by clearing the conversation.
     """
-    state.past_conversations = state.past_conversations + [
-        [len(state.past_conversations), state.conversation]
-    ]
+    if state.pending:
+        notify(state, "warning", "Please wait for the current answer to finish.")
+        return
+    state.chat_id = None
+    state.past_conversations = list_conversations(state)
     state.conversation = {
-        "Conversation": ["Who are you?", "Hi! I am Gemini 1.5 Pro. How can I help you today?"]
+        "Conversation": list(GREETING)
     }
+    state.history = history_from_conversation(GREETING)
 
 
 def tree_adapter(item: list) -> list[str]:
     """
-    Converts element of past_conversations to id and displayed string
+    Converts an [id, title] element of past_conversations to id and displayed string
     """
-    identifier = item[0]
-    if len(item[1]["Conversation"]) > 3:
-        return (identifier, item[1]["Conversation"][2][:50] + "...")
-    return (item[0], "Empty conversation")
+    return (str(item[0]), item[1] or "Empty conversation")
 
 
 def select_conv(state: State, var_name: str, value) -> None:
     """
-    Select conversation from past_conversations
+    Select conversation from past_conversations, loading its messages from storage
     """
-    state.conversation = state.past_conversations[value[0][0]][1]
-    state.context = "The following is a conversation with an AI assistant. The assistant is helpful, creative, clever, and very friendly.\n\nHuman: Hello, who are you?\nAI: I am an AI created by Google. How can I help you today? "
-    for i in range(2, len(state.conversation["Conversation"]), 2):
-        state.context += f"Human: \n {state.conversation['Conversation'][i]}\n\n AI:"
-        state.context += state.conversation["Conversation"][i + 1]
-    state.selected_row = [len(state.conversation["Conversation"]) + 1]
+    if state.pending:
+        notify(state, "warning", "Please wait for the current answer to finish.")
+        return
+    chat_id = int(value[0][0])
+    if chat_id not in {row[0] for row in list_conversations(state)}:
+        notify(state, "error", "Conversation not found.")
+        return
+    state.chat_id = chat_id
+    messages = list(GREETING) + [m.content for m in storage.get_chat_messages(state.chat_id)]
+    state.conversation = {"Conversation": messages}
+    state.history = history_from_conversation(messages)
+    state.selected_row = [len(messages) + 1]
 
 
 past_prompts = []
@@ -137,11 +244,29 @@ page = """
 |>
 """
 
-if __name__ == "__main__":
-    load_dotenv()
+# Taipy serves the GUI on this Flask app, so extra routes can live beside it
+app = Flask(__name__)
 
-    # Note: NOT OpenAI key now
-    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
-    Gui(page).run(debug=True, dark_mode=True, use_reloader=True,
-                  title="💬 Taipy Chat with Gemini 1.5 Pro")
+@app.route("/healthz")
+def healthz():
+    """
+    Liveness/readiness probe for load balancers: checks the database is reachable.
+    """
+    storage.ping()
+    return jsonify(status="ok", pid=os.getpid())
+
+
+@app.route("/metrics")
+def metrics_endpoint():
+    """
+    Prometheus scrape endpoint for this worker process.
+    """
+    return Response(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+gui = Gui(page, flask=app)
+
+if __name__ == "__main__":
+    gui.run(debug=True, dark_mode=True, use_reloader=True,
+            title="💬 Taipy Chat with Gemini 1.5 Pro")
@@ -0,0 +1,23 @@
+import argparse
+import os
+
+from main import gui
+
+TITLE = "💬 Taipy Chat with Gemini 1.5 Pro"
+
+
+def main() -> None:
+    """
+    Production entry point: one server process, no debug mode or reloader.
+    """
+    parser = argparse.ArgumentParser(description="Run one production demo-chatbot worker")
+    parser.add_argument("--host", default=os.getenv("HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("PORT", "5000")))
+    args = parser.parse_args()
+
+    gui.run(host=args.host, port=args.port, debug=False, use_reloader=False,
+            run_browser=False, dark_mode=True, title=TITLE)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+#!/bin/bash
+# Start WORKERS demo-chatbot processes behind nginx.
+# nginx pins each client to one worker (ip_hash) because Taipy keeps session
+# state and the websocket inside the process that served the page.
+set -eu
+
+WORKERS="${WORKERS:-$(nproc)}"
+PORT="${PORT:-5000}"
+FIRST_WORKER_PORT="${FIRST_WORKER_PORT:-5001}"
+
+upstreams=""
+i=0
+while [ "$i" -lt "$WORKERS" ]; do
+    worker_port=$((FIRST_WORKER_PORT + i))
+    python serve.py --host 127.0.0.1 --port "$worker_port" &
+    upstreams="${upstreams}        server 127.0.0.1:${worker_port} max_fails=3 fail_timeout=10s;
+"
+    i=$((i + 1))
+done
+
+sed -e "s|@PORT@|${PORT}|" nginx.conf.template > /etc/nginx/nginx.conf
+printf '%s' "$upstreams" > /etc/nginx/upstreams.conf
+
+nginx -g 'daemon off;' &
+
+# Exit as soon as any process dies so the container runtime restarts us
+wait -n
+exit 1
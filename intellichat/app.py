@@ -3,10 +3,14 @@ import streamlit as st
 from datetime import datetime
 import time
 
-# Import custom modules
-from auth import auth_page, init_session_state, logout
-from database import create_chat, get_user_chats, get_chat_messages
-from chat_handler import process_message, get_formatted_chat_history
+# Import the shared core
+from askatlas_core.streamlit_auth import auth_page, init_session_state, logout, is_admin
+from askatlas_core.storage import create_chat, get_user_chats
+from askatlas_core.chat_handler import process_message, load_chat_history, get_earlier_messages
+from askatlas_core.tracing import start_trace
+from askatlas_core.metrics import start_metrics_server
+from askatlas_core.retention import start_retention_worker
+from askatlas_core import profiling
 
 # Load custom CSS
 
@@ -21,13 +25,14 @@ def load_css():
         st.warning(f"CSS file not found: {css_file}")
 
 
-def format_time(timestamp_str):
+def format_time(timestamp):
     """Format timestamp for display."""
-    try:
-        dt = datetime.fromisoformat(timestamp_str.replace('Z', '+00:00'))
-        return dt.strftime("%H:%M")
-    except:
-        return ""
+    return timestamp.strftime("%H:%M") if timestamp else ""
+
+
+def render_message(msg):
+    speaker = "You" if msg.is_user else "Gemini"
+    st.markdown(f"**{speaker}** ({format_time(msg.timestamp)}): {msg.content}")
 
 
 def display_chat_interface():
@@ -70,15 +75,28 @@ def display_chat_interface():
 
         st.checkbox("Use context from previous chats", key="use_context")
 
-        messages = get_formatted_chat_history(st.session_state.current_chat_id)
-
-        for msg in messages:
-            if msg["role"] == "user":
-                st.markdown(
-                    f"**You** ({format_time(msg['timestamp'])}): {msg['content']}")
-            else:
-                st.markdown(
-                    f"**Gemini** ({format_time(msg['timestamp'])}): {msg['content']}")
+        # Time the history re-render, flagged when it is the rerun that follows a turn
+        with start_trace("ui.render", chat_id=st.session_state.current_chat_id,
+                         after_turn=st.session_state.pop("after_turn", False)) as render_span:
+            # Only messages added since the last rerun are fetched; the kept tail is capped in size
+            cached = st.session_state.get("chat_history")
+            history = load_chat_history(st.session_state.current_chat_id, cached)
+            if history is not cached:
+                st.session_state.earlier_pages = 0
+            st.session_state.chat_history = history
+            render_span.set("messages", len(history))
+
+            if history.has_earlier:
+                if st.button("Load earlier messages"):
+                    st.session_state.earlier_pages = st.session_state.get("earlier_pages", 0) + 1
+                # Earlier pages are rendered from a fresh query and not kept in the session
+                pages = st.session_state.get("earlier_pages", 0)
+                if pages:
+                    for msg in get_earlier_messages(history, limit=50 * pages):
+                        render_message(msg)
+
+            for msg in history:
+                render_message(msg)
 
         user_input = st.text_input("Type your message...", key="user_input")
         if st.button("Send", use_container_width=True):
@@ -90,18 +108,59 @@ def display_chat_interface():
                     use_context=st.session_state.use_context
                 )
                 st.session_state.user_input = ""
+                st.session_state.after_turn = True
+                st.rerun()
+
+
+def display_profiling_page():
+    """Admin-only controls for the sampling profiler, slow-turn captures and allocation tracking."""
+    st.title("Profiling")
+    status = profiling.get_profiler_status()
+    st.json(status)
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if status["sampler_running"]:
+            if st.button("Stop sampler", use_container_width=True):
+                profiling.stop_sampler()
                 st.rerun()
+        elif st.button("Start sampler", use_container_width=True):
+            profiling.start_sampler()
+            st.rerun()
+    with col2:
+        if st.button("Write samples now", use_container_width=True):
+            if not profiling.flush_samples():
+                st.info("No samples collected yet.")
+    with col3:
+        if status["tracemalloc"]:
+            if st.button("Diff allocations", use_container_width=True):
+                if not profiling.snapshot_allocations():
+                    st.info("No allocation growth since the last snapshot.")
+        elif st.button("Track allocations", use_container_width=True):
+            profiling.start_allocation_tracking()
+            st.rerun()
+
+    st.subheader("Captured profiles")
+    st.caption("Collapsed stacks open in speedscope or flamegraph.pl; .prof files in snakeviz.")
+    for name in profiling.list_profiles()[:20]:
+        with open(os.path.join(profiling.PROFILE_DIR, name), "rb") as f:
+            st.download_button(name, f.read(), file_name=name, key=f"profile_{name}")
 
 # Main App Entry
 
 
 def main():
     st.set_page_config(page_title="Gemini Chat", layout="wide")
+    start_metrics_server()
+    start_retention_worker()
     load_css()
     init_session_state()
 
     if auth_page():
-        display_chat_interface()
+        if is_admin() and st.sidebar.checkbox("Profiling", key="show_profiling"):
+            display_profiling_page()
+        else:
+            display_chat_interface()
 
 
 if __name__ == "__main__":
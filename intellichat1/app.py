@@ -1,30 +1,34 @@
 import streamlit as st
-import google.generativeai as genai
-from dotenv import load_dotenv
-import os
-from sklearn.feature_extraction.text import TfidfVectorizer
-import numpy as np
-
-from auth import auth_page, logout
-from database import (
+from datetime import datetime
+
+from askatlas_core.llm import get_backend
+from askatlas_core.streamlit_auth import auth_page, logout
+from askatlas_core.storage import (
     get_user_chats, get_chat_messages,
-    create_chat, save_message, delete_chat, get_db_connection
+    create_chat, save_message, delete_chat, update_message_vector_id
 )
-from chroma_store import retrieve_similar_context
+from askatlas_core.vector_store import add_message_to_vector_store
+from askatlas_core.memory import record_user_message, get_context
+from askatlas_core.context_builder import NO_CONTEXT
+from askatlas_core.retrieval_gate import gated_retrieve, invalidate_corpus_size
+from askatlas_core.titler import record_message, schedule_title, start_titler
+from askatlas_core.metrics import start_metrics_server
+from askatlas_core.retention import start_retention_worker
 
 # Set page layout
 st.set_page_config(layout="wide")
 
-# Load API Key
-load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
+# Prometheus scrape endpoint, started once per process
+start_metrics_server()
+
+# Archiving and backups, only where RETENTION_WORKER=1
+start_retention_worker()
 
-# Configure Gemini
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel("gemini-2.0-flash")
+# Corpus IDF table for auto-titling, built in the background if missing
+start_titler()
 
 # Authenticate user
-if not auth_page():
+if not auth_page(title="IntelliChat "):
     st.stop()
 
 # Sidebar - User Info
@@ -36,7 +40,8 @@ chats = get_user_chats(st.session_state.user_id)
 
 # Create New Chat Button
 if st.sidebar.button("\u2795 New Chat", key="new_chat"):
-    new_chat_id = create_chat(st.session_state.user_id)
+    new_chat_id = create_chat(
+        st.session_state.user_id, title=f"Chat {datetime.now().strftime('%Y-%m-%d %H:%M')}")
     st.session_state.current_chat_id = new_chat_id
     st.rerun()
 
@@ -92,10 +97,10 @@ st.markdown('</div>', unsafe_allow_html=True)
 st.markdown('<div class="chat-body">', unsafe_allow_html=True)
 messages = get_chat_messages(st.session_state.current_chat_id)
 for msg in messages:
-    if msg["is_user"]:
-        st.markdown(f"**You:** {msg['content']}")
+    if msg.is_user:
+        st.markdown(f"**You:** {msg.content}")
     else:
-        st.markdown(f"**Gemini:** {msg['content']}")
+        st.markdown(f"**Gemini:** {msg.content}")
 
 # Context toggle appears after all messages
 toggle = st.toggle("Include previous knowledge", key="use_context")
@@ -104,40 +109,40 @@ st.markdown('</div>', unsafe_allow_html=True)
 
 # Handle user input and generate response
 if user_input and user_input.strip():
-    save_message(
+    message_id = save_message(
         chat_id=st.session_state.current_chat_id,
         user_id=st.session_state.user_id,
         content=user_input,
         is_user=True
     )
 
-    # Only update chat title if it's the first user message
-    messages = get_chat_messages(st.session_state.current_chat_id)
-    if len(messages) == 1 and messages[0]["is_user"]:
-        def extract_tags(text, num_tags=3):
-            vectorizer = TfidfVectorizer(stop_words='english')
-            X = vectorizer.fit_transform([text])
-            scores = np.asarray(X.sum(axis=0)).flatten()
-            words = np.array(vectorizer.get_feature_names_out())
-            sorted_indices = scores.argsort()[::-1]
-            return " ".join(words[sorted_indices[:num_tags]])
-
-        tag = extract_tags(user_input)
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("UPDATE chats SET title = ? WHERE id = ?",
-                       (tag, st.session_state.current_chat_id))
-        conn.commit()
-        conn.close()
+    # Embed and store only user messages
+    vector_id = add_message_to_vector_store(
+        user_input, st.session_state.user_id, message_id,
+        st.session_state.current_chat_id, is_user=True)
+    update_message_vector_id(message_id, vector_id)
+
+    record_message(user_input)
+    record_user_message(st.session_state.user_id, message_id, user_input)
+
+    # Title the chat from its first message, off the request path
+    if not messages:
+        invalidate_corpus_size(st.session_state.user_id)
+        schedule_title(st.session_state.current_chat_id, user_input)
 
     prompt = user_input
     if st.session_state.use_context:
-        rag_context = retrieve_similar_context(
-            user_input, st.session_state.user_id)
-        prompt = f"{rag_context}\nYou: {user_input}"
+        rag_context = gated_retrieve(
+            st.session_state.user_id, user_input,
+            # No history is sent, so only the message just saved would be redundant
+            lambda: get_context(
+                st.session_state.user_id, user_input, chat_id=st.session_state.current_chat_id,
+                history_window=(st.session_state.current_chat_id, message_id)))
+        if rag_context and rag_context != NO_CONTEXT:
+            prompt = f"{rag_context}\nYou: {user_input}"
 
     try:
-        gemini_reply = model.generate_content(prompt).text
+        gemini_reply = get_backend().send([], prompt)
     except Exception as e:
         gemini_reply = f"Error: {str(e)}"
 
@@ -147,6 +152,7 @@ if user_input and user_input.strip():
         content=gemini_reply,
         is_user=False
     )
+    record_message(gemini_reply)
 
     st.rerun()
 